@@ -5,6 +5,7 @@ import logging
 
 from services.message_processor import process_message_for_api
 from services.session_service import get_session, clear_session
+from utils import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -93,6 +94,11 @@ async def health_check():
         "version": "1.0.0"
     }
 
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Métricas en memoria de este proceso (cachés, latencias, etc.)."""
+    return metrics.snapshot()
+
 @app.get("/session/{contact_id}", 
         tags=["Session Management"]
         )
@@ -1,13 +1,27 @@
 # Cliente de Azure para acceder a los recursos en nube para la app RAG
-import pandas as pd
-from typing import Dict, List, Optional
+import asyncio
+from typing import Dict, List, Optional, Tuple
+import aiohttp
 from azure.core.credentials import AzureKeyCredential
+from azure.core.exceptions import HttpResponseError, ServiceRequestError, ServiceResponseError
+from azure.core.pipeline.transport import AioHttpTransport
 from azure.search.documents import SearchClient
+from azure.search.documents.aio import SearchClient as AsyncSearchClient
+from clients.debt_snapshot import DebtSnapshot
 from config.settings import settings
+from models.search_result import SearchResult
+from utils import deadline, metrics
+from utils.cache import LRUCache
+from utils.circuit_breaker import CircuitBreaker, CircuitOpenError
 import logging
 
 logger = logging.getLogger(__name__)
 
+
+class SearchTimeoutError(Exception):
+    """La búsqueda no respondió a tiempo: no significa que la clave no exista."""
+
+
 # Campos base que se requieren para las consultas de deuda.
 _DEFAULT_DEBT_FIELDS = [
     "Firstname",
@@ -36,9 +50,32 @@ _DEFAULT_DEBT_RENAME = {
     "PenaltyCharge": "Penalidad",
 }
 
+# Un solo circuito para el servicio de búsqueda (todos los índices comparten endpoint).
+search_breaker = CircuitBreaker("azure_search")
+
+# Errores que indican que Azure Search no está disponible; de los HTTP solo los 5xx y 429
+# (un 4xx es un filtro o consulta mal formados y no debe abrir el circuito para todos).
+SEARCH_FAILURES = (
+    asyncio.TimeoutError,
+    ServiceRequestError,
+    ServiceResponseError,
+    aiohttp.ClientError,
+    HttpResponseError,
+)
+
+
+def _is_search_outage(error: BaseException) -> bool:
+    if isinstance(error, HttpResponseError):
+        status = error.status_code or 0
+        return status >= 500 or status == 429
+    return True
+
 # Cacheamos clientes por índice para reutilizarlos sin reconstruirlos en cada petición.
 _SEARCH_CLIENTS: Dict[str, SearchClient] = {}
 
+# Versión asíncrona: un cliente por índice, cada uno con su pool de conexiones aiohttp.
+_ASYNC_SEARCH_CLIENTS: Dict[str, AsyncSearchClient] = {}
+
 
 def _get_search_client(index_name: Optional[str]) -> Optional[SearchClient]:
     """Crea (o reutiliza) un cliente de búsqueda para el índice solicitado."""
@@ -53,6 +90,59 @@ def _get_search_client(index_name: Optional[str]) -> Optional[SearchClient]:
     return _SEARCH_CLIENTS[index_name]
 
 
+def _get_async_search_client(index_name: Optional[str]) -> Optional[AsyncSearchClient]:
+    """
+    Crea (o reutiliza) el cliente asíncrono del índice con un transporte
+    compartido (keep-alive). Debe llamarse desde el event loop.
+    """
+    if not (settings.AZURE_ENDPOINT and settings.AZURE_QUERYKEY and index_name):
+        return None
+    if index_name not in _ASYNC_SEARCH_CLIENTS:
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=settings.AZURE_SEARCH_MAX_CONNECTIONS,
+                ttl_dns_cache=300
+            )
+        )
+        _ASYNC_SEARCH_CLIENTS[index_name] = AsyncSearchClient(
+            endpoint=settings.AZURE_ENDPOINT,
+            index_name=index_name,
+            credential=AzureKeyCredential(settings.AZURE_QUERYKEY),
+            transport=AioHttpTransport(session=session, session_owner=True)
+        )
+    return _ASYNC_SEARCH_CLIENTS[index_name]
+
+
+async def close_search_clients() -> None:
+    """Cierra los clientes asíncronos y sus pools de conexiones."""
+    while _ASYNC_SEARCH_CLIENTS:
+        index_name, client = _ASYNC_SEARCH_CLIENTS.popitem()
+        try:
+            await client.close()
+        except Exception as e:
+            logger.warning(f"Error closing search client for {index_name}: {e}")
+
+
+def _resolve_projection(
+    select: Optional[List[str]],
+    rename: Optional[Dict[str, str]]
+) -> Tuple[List[str], Dict[str, str]]:
+    """Campos a seleccionar y renombres (por defecto, los de deuda)."""
+    if select is None:
+        return _DEFAULT_DEBT_FIELDS, _DEFAULT_DEBT_RENAME
+    return select, rename or {}
+
+
+def _eq_filter(field: str, value: str) -> str:
+    """Filtro OData de igualdad escapando comillas simples."""
+    escaped = str(value).replace("'", "''")
+    return f"{field} eq '{escaped}'"
+
+
+def _project(record: Dict, select_fields: List[str], rename_map: Dict[str, str]) -> Dict:
+    return {rename_map.get(field, field): record.get(field) for field in select_fields}
+
+
 def azure_search(
     field: str,
     value: str,
@@ -60,65 +150,338 @@ def azure_search(
     index: Optional[str] = None,
     select: Optional[List[str]] = None,
     rename: Optional[Dict[str, str]] = None,
-    timeout: int = 4  # P1-2: Timeout configurable
-) -> pd.DataFrame:
+    timeout: float = settings.AZURE_SEARCH_TIMEOUT
+) -> SearchResult:
     """
-    Ejecuta búsqueda con timeout estricto y manejo de errores.
+    Búsqueda síncrona (para scripts fuera del event loop).
+    El timeout se aplica a la conexión y a la lectura de cada petición.
     """
     index_name = index or settings.AZURE_INDEX_DEUDA or settings.AZURE_INDEX
     client = _get_search_client(index_name)
     if not client:
         logger.error("Azure Search client not configured")
-        return pd.DataFrame()
-
-    if select is None:
-        select_fields = _DEFAULT_DEBT_FIELDS
-        rename_map = _DEFAULT_DEBT_RENAME
-    else:
-        select_fields = select
-        rename_map = rename or {}
+        return SearchResult()
 
-    filter_clause = f"{field} eq '{value}'"
+    select_fields, rename_map = _resolve_projection(select, rename)
     
     try:
-        import signal
-        
-        # P1-2: Timeout usando signal (solo funciona en main thread)
-        # Alternativa: usar asyncio.wait_for si refactorizamos a async
         results = client.search(
             search_text="*",
-            filter=filter_clause,
+            filter=_eq_filter(field, value),
             top=10,
-            select=select_fields
+            select=select_fields,
+            connection_timeout=timeout,
+            read_timeout=timeout
         )
-
-        rows = []
-        for record in results:
-            row = {}
-            for source_field in select_fields:
-                target = rename_map.get(source_field, source_field)
-                row[target] = record.get(source_field)
-            rows.append(row)
+        rows = [_project(record, select_fields, rename_map) for record in results]
         
         logger.info(f"Azure Search returned {len(rows)} results for {field}={value}")
-        return pd.DataFrame(rows)
+        return SearchResult(rows)
     
     except Exception as e:
         logger.exception(f"Azure Search error for {field}={value}: {e}")
-        # P1-2: Retornar DataFrame vacío en lugar de crashear
-        return pd.DataFrame()
+        # P1-2: Retornar resultado vacío en lugar de crashear
+        return SearchResult()
+
+
+async def _search_rows_async(
+    field: str,
+    value: str,
+    index_name: Optional[str],
+    select_fields: List[str],
+    rename_map: Dict[str, str],
+    timeout: float,
+    clamped: bool = False
+) -> List[Dict]:
+    """
+    Ejecuta la búsqueda asíncrona con un deadline para toda la operación
+    (petición y lectura de resultados). Propaga errores y timeouts.
+
+    Con `clamped` (timeout recortado por el presupuesto del turno) un
+    timeout no cuenta como fallo de Azure Search en el circuit breaker.
+    """
+    client = _get_async_search_client(index_name)
+    if not client:
+        raise RuntimeError("Azure Search client not configured")
+
+    async def _run() -> List[Dict]:
+        results = await client.search(
+            search_text="*",
+            filter=_eq_filter(field, value),
+            top=10,
+            select=select_fields
+        )
+        return [_project(record, select_fields, rename_map) async for record in results]
+
+    # wait_for cancela la petición en curso si se agota el tiempo
+    with search_breaker.guard(
+        SEARCH_FAILURES,
+        uncounted=(asyncio.TimeoutError,) if clamped else (),
+        is_failure=_is_search_outage
+    ):
+        return await asyncio.wait_for(_run(), timeout=timeout)
+
 
+async def azure_search_async(
+    field: str,
+    value: str,
+    *,
+    index: Optional[str] = None,
+    select: Optional[List[str]] = None,
+    rename: Optional[Dict[str, str]] = None,
+    timeout: float = settings.AZURE_SEARCH_TIMEOUT,
+    raise_timeout: bool = False
+) -> SearchResult:
+    """
+    Ejecuta búsqueda sin bloquear el event loop, con timeout estricto y manejo de errores.
+
+    Args:
+        raise_timeout: Lanzar SearchTimeoutError en lugar de devolver un
+            resultado vacío si no hay tiempo o la búsqueda no responde
+
+    Raises:
+        CircuitOpenError: si Azure Search está marcado como caído (el llamador
+            responde con su fallback sin esperar el timeout)
+        SearchTimeoutError: con `raise_timeout`, si la búsqueda no respondió a tiempo
+    """
+    index_name = index or settings.AZURE_INDEX_DEUDA or settings.AZURE_INDEX
+    select_fields, rename_map = _resolve_projection(select, rename)
+    configured = timeout
+    timeout = deadline.stage_timeout(configured)
+    if timeout <= 0:
+        # Turno sin tiempo: no se llama a Azure (ni cuenta como fallo del servicio)
+        metrics.increment("deadline.degraded.search")
+        if raise_timeout:
+            raise SearchTimeoutError(f"No time left to search {field}={value}")
+        return SearchResult()
+
+    try:
+        rows = await _search_rows_async(
+            field, value, index_name, select_fields, rename_map, timeout, clamped=timeout < configured
+        )
+        logger.info(f"Azure Search returned {len(rows)} results for {field}={value}")
+        return SearchResult(rows)
 
-def search_debt_by_dni(dni: str) -> pd.DataFrame:
-    """Búsqueda especializada para deuda usando el DNI del cliente."""
-    return azure_search("DocNum", dni)
+    except CircuitOpenError:
+        raise
 
+    except asyncio.TimeoutError:
+        logger.error(f"Azure Search timed out after {timeout}s for {field}={value}")
+        if raise_timeout:
+            raise SearchTimeoutError(f"Azure Search timed out for {field}={value}") from None
+        return SearchResult()
 
-def search_otp_by_phone(phone: str) -> pd.DataFrame:
+    except Exception as e:
+        logger.exception(f"Azure Search error for {field}={value}: {e}")
+        return SearchResult()
+
+
+# Caché de búsquedas de deuda por DNI: positivos con TTL normal y
+# "no encontrado" con TTL corto (los errores y timeouts nunca se cachean).
+_debt_lookup_cache = LRUCache(settings.DEBT_LOOKUP_CACHE_MAX_ENTRIES, settings.DEBT_LOOKUP_CACHE_TTL)
+
+# Snapshot local opcional del índice de deuda (ver scripts/export_debt_snapshot.py).
+_debt_snapshot = (
+    DebtSnapshot(settings.DEBT_SNAPSHOT_PATH, settings.DEBT_SNAPSHOT_MAX_AGE)
+    if settings.DEBT_SNAPSHOT_PATH else None
+)
+
+# Búsquedas en curso por DNI: las concurrentes comparten la misma petición (single-flight).
+_debt_lookups_in_flight: Dict[str, "asyncio.Task[List[Dict]]"] = {}
+
+
+async def _fetch_debt_rows(dni: str) -> List[Dict]:
+    """Consulta Azure y guarda el resultado en la caché; propaga errores."""
+    index_name = settings.AZURE_INDEX_DEUDA or settings.AZURE_INDEX
+    rows = await _search_rows_async(
+        "DocNum", dni, index_name, _DEFAULT_DEBT_FIELDS, _DEFAULT_DEBT_RENAME, settings.AZURE_SEARCH_TIMEOUT
+    )
+    ttl = settings.DEBT_LOOKUP_CACHE_TTL if rows else settings.DEBT_LOOKUP_NEGATIVE_TTL
+    _debt_lookup_cache.set(dni, tuple(rows), ttl=ttl)
+    logger.info(f"Azure Search returned {len(rows)} results for DocNum={dni}")
+    return rows
+
+
+def invalidate_debt_lookup(dni: str) -> None:
+    """Descarta la entrada cacheada de un DNI (p. ej. tras registrar un pago)."""
+    _debt_lookup_cache.delete(dni)
+
+
+async def search_debt_by_dni(dni: str) -> SearchResult:
+    """
+    Búsqueda especializada para deuda usando el DNI del cliente.
+
+    Lee primero el snapshot local si está configurado y vigente; si no,
+    usa la caché de búsquedas y agrupa las consultas simultáneas del mismo
+    DNI en una sola petición a Azure.
+
+    Raises:
+        CircuitOpenError: si Azure Search está marcado como caído
+        SearchTimeoutError: si la búsqueda no respondió dentro del turno (el
+            llamador no debe decir que el DNI no existe)
+    """
+    if _debt_snapshot is not None:
+        rows = _debt_snapshot.lookup(dni)
+        if rows is not None:
+            return SearchResult(rows)
+
+    if not settings.DEBT_LOOKUP_CACHE_ENABLED:
+        return await azure_search_async("DocNum", dni, raise_timeout=True)
+
+    cached = _debt_lookup_cache.get(dni)
+    if cached is not None:
+        metrics.increment("debt_lookup.hit" if cached else "debt_lookup.negative_hit")
+        return SearchResult(cached)
+
+    task = _debt_lookups_in_flight.get(dni)
+    if task is not None:
+        metrics.increment("debt_lookup.coalesced")
+    else:
+        metrics.increment("debt_lookup.miss")
+        task = asyncio.ensure_future(_fetch_debt_rows(dni))
+        _debt_lookups_in_flight[dni] = task
+        task.add_done_callback(lambda _: _debt_lookups_in_flight.pop(dni, None))
+        # Recoge el error aunque todos los que esperaban ya hayan agotado su timeout
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    try:
+        # shield: si se cancela a quien espera (o se agota su turno), la petición compartida continúa
+        wait = deadline.stage_timeout(settings.AZURE_SEARCH_TIMEOUT)
+        return SearchResult(await asyncio.wait_for(asyncio.shield(task), timeout=wait))
+    except CircuitOpenError:
+        raise
+    except asyncio.TimeoutError:
+        logger.error(f"Azure Search timed out after {wait}s for DocNum={dni}")
+        raise SearchTimeoutError(f"Azure Search timed out for DocNum={dni}") from None
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.exception(f"Azure Search error for DocNum={dni}: {e}")
+        return SearchResult()
+
+
+async def search_otp_by_phone(phone: str) -> SearchResult:
     """Búsqueda especializada para recuperar claves OTP del número registrado."""
-    return azure_search(
+    return await azure_search_async(
         "Recepient",
         phone,
         index=settings.AZURE_INDEX_OTP,
         select=["Recepient", "Codigo"]
     )
+
+
+def _in_filter(field: str, values: List[str]) -> str:
+    """Filtro OData search.in para varias claves (separadas por coma)."""
+    escaped = ",".join(str(value).replace("'", "''") for value in values)
+    return f"search.in({field}, '{escaped}', ',')"
+
+
+async def _search_chunk_async(
+    client: AsyncSearchClient,
+    field: str,
+    values: List[str],
+    select_fields: List[str],
+    timeout: float
+) -> List[Dict]:
+    async def _run() -> List[Dict]:
+        # Sin top: el SDK recorre todas las páginas del bloque
+        results = await client.search(
+            search_text="*",
+            filter=_in_filter(field, values),
+            select=select_fields
+        )
+        return [record async for record in results]
+
+    with search_breaker.guard(SEARCH_FAILURES, is_failure=_is_search_outage):
+        return await asyncio.wait_for(_run(), timeout=timeout)
+
+
+async def azure_search_many_async(
+    field: str,
+    values: List[str],
+    *,
+    index: Optional[str] = None,
+    select: Optional[List[str]] = None,
+    rename: Optional[Dict[str, str]] = None,
+    batch_size: int = settings.AZURE_SEARCH_BATCH_SIZE,
+    concurrency: int = settings.AZURE_SEARCH_BATCH_CONCURRENCY,
+    timeout: float = settings.AZURE_SEARCH_TIMEOUT,
+    strict: bool = False
+) -> Dict[str, SearchResult]:
+    """
+    Busca varias claves con filtros search.in en bloques de `batch_size`,
+    con hasta `concurrency` bloques en paralelo, y reparte los resultados por clave.
+
+    Args:
+        field: Campo clave del índice (DocNum, Recepient...)
+        values: Claves a buscar (se ignoran duplicados y vacías)
+        strict: Propagar el error de un bloque en lugar de dejar sus claves
+            vacías (para quien no puede distinguir "sin resultados" de "falló")
+
+    Returns:
+        Diccionario clave -> SearchResult. Las claves sin resultados, o cuyo
+        bloque falló, quedan con un resultado vacío.
+    """
+    keys = list(dict.fromkeys(str(value) for value in values if value))
+    results: Dict[str, List[Dict]] = {key: [] for key in keys}
+    if not keys:
+        return {}
+
+    for key in keys:
+        if "," in key:
+            raise ValueError(f"Key {key!r} contains the search.in delimiter")
+
+    index_name = index or settings.AZURE_INDEX_DEUDA or settings.AZURE_INDEX
+    client = _get_async_search_client(index_name)
+    if not client:
+        logger.error("Azure Search client not configured")
+        return {key: SearchResult() for key in keys}
+
+    select_fields, rename_map = _resolve_projection(select, rename)
+    # El campo clave es necesario para repartir los resultados
+    query_fields = select_fields if field in select_fields else [*select_fields, field]
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def _run_chunk(chunk: List[str]) -> None:
+        async with semaphore:
+            try:
+                records = await _search_chunk_async(client, field, chunk, query_fields, timeout)
+            except CircuitOpenError:
+                raise
+            except asyncio.TimeoutError:
+                logger.error(f"Azure Search batch of {len(chunk)} keys timed out after {timeout}s")
+                if strict:
+                    raise
+                return
+            except Exception as e:
+                logger.exception(f"Azure Search batch error for {len(chunk)} keys: {e}")
+                if strict:
+                    raise
+                return
+        for record in records:
+            key = str(record.get(field))
+            if key in results:
+                results[key].append(_project(record, select_fields, rename_map))
+
+    chunks = [keys[i:i + batch_size] for i in range(0, len(keys), batch_size)]
+    await asyncio.gather(*(_run_chunk(chunk) for chunk in chunks))
+
+    found = sum(1 for rows in results.values() if rows)
+    logger.info(f"Azure Search batch: {found}/{len(keys)} keys found in {len(chunks)} requests")
+    return {key: SearchResult(rows) for key, rows in results.items()}
+
+
+async def search_debt_by_dnis(dnis: List[str], **kwargs) -> Dict[str, SearchResult]:
+    """Deuda de varios DNIs en pocas peticiones (conciliaciones, cargas masivas)."""
+    return await azure_search_many_async("DocNum", dnis, **kwargs)
+
+
+async def search_otp_by_phones(phones: List[str], **kwargs) -> Dict[str, SearchResult]:
+    """Claves OTP de varios números en pocas peticiones."""
+    return await azure_search_many_async(
+        "Recepient",
+        phones,
+        index=settings.AZURE_INDEX_OTP,
+        select=["Recepient", "Codigo"],
+        **kwargs
+    )
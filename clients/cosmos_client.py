@@ -1,11 +1,92 @@
+from azure.core import MatchConditions
 from azure.cosmos import CosmosClient, PartitionKey, exceptions
+from azure.cosmos.aio import CosmosClient as AsyncCosmosClient
+from azure.cosmos.aio import ContainerProxy as AsyncContainerProxy
 from azure.cosmos.container import ContainerProxy
-from typing import Optional, Dict, Any, List
+from datetime import datetime
+from typing import Optional, Dict, Any, Iterator, List, Tuple
+from clients.profile_read_model import ProfileReadModel
 from config.settings import settings
+from utils import metrics
+from utils.cache import LRUCache
+import copy
+import itertools
 import logging
+import re
+import time
 
 logger = logging.getLogger(__name__)
 
+# Identificadores que se indexan para búsquedas puntuales (campo del perfil)
+IDENTITY_KINDS = ("dni", "phone")
+
+def identity_entry_id(kind: str, value: str) -> str:
+    """Id (y partition key) de la entrada del índice, p. ej. 'dni:12345678'."""
+    return f"{kind}:{value}"
+
+def identity_entries(profile: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Entradas del índice de identificadores para un perfil."""
+    contact_id = profile.get("contactId")
+    return [
+        {
+            "id": identity_entry_id(kind, profile[kind]),
+            "kind": kind,
+            "value": profile[kind],
+            "contactId": contact_id,
+            "updatedAt": datetime.utcnow().isoformat()
+        }
+        for kind in IDENTITY_KINDS
+        if profile.get(kind) and contact_id
+    ]
+
+# Nombres de campo aceptados en proyecciones y filtros (se interpolan en la consulta)
+_FIELD_NAME = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+def build_profile_query(
+    fields: Optional[List[str]] = None,
+    filters: Optional[Dict[str, Any]] = None
+) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    Arma la consulta de perfiles con proyección y filtros de igualdad.
+    
+    Args:
+        fields: Campos a traer (None = documento completo)
+        filters: Campo -> valor exacto (parametrizado)
+        
+    Returns:
+        Tupla (query, parameters) para query_items
+        
+    Raises:
+        ValueError: Si algún nombre de campo no es válido
+    """
+    for name in list(fields or []) + list(filters or {}):
+        if not _FIELD_NAME.fullmatch(name):
+            raise ValueError(f"Invalid profile field name: {name!r}")
+    
+    projection = ", ".join(f"c.{name}" for name in fields) if fields else "*"
+    query = f"SELECT {projection} FROM c"
+    parameters = []
+    if filters:
+        conditions = []
+        for i, (name, value) in enumerate(filters.items()):
+            conditions.append(f"c.{name} = @p{i}")
+            parameters.append({"name": f"@p{i}", "value": value})
+        query += " WHERE " + " AND ".join(conditions)
+    return query, parameters
+
+# Modelo de lectura local (change feed): primer paso para resolver DNI/teléfono -> contactId
+_read_model = (
+    ProfileReadModel(settings.PROFILE_READ_MODEL_PATH, settings.PROFILE_READ_MODEL_MAX_LAG)
+    if settings.PROFILE_READ_MODEL_PATH else None
+)
+
+def _serialize_for_cosmos(profile: Dict[str, Any]) -> Dict[str, Any]:
+    """Convierte campos datetime a ISO string para Cosmos DB."""
+    return {
+        key: value.isoformat() if isinstance(value, datetime) else value
+        for key, value in profile.items()
+    }
+
 class CosmosDBClient:
     """
     Cliente para gestionar perfiles de usuario en Cosmos DB.
@@ -32,6 +113,10 @@ class CosmosDBClient:
             self.container: ContainerProxy = self.database.get_container_client(
                 settings.COSMOS_CONTAINER
             )
+            # Índice identificador -> contactId (partition key /id)
+            self.identity_container: ContainerProxy = self.database.get_container_client(
+                settings.COSMOS_IDENTITY_CONTAINER
+            )
             logger.info("Cosmos DB client initialized successfully")
         except Exception as e:
             logger.exception(f"Failed to initialize Cosmos DB client: {e}")
@@ -103,6 +188,7 @@ class CosmosDBClient:
         try:
             result = self.container.upsert_item(body=serializable_profile)
             logger.info(f"Profile upserted for contactId: {contact_id}")
+            self._index_identity(serializable_profile)
             return result
         
         except Exception as e:
@@ -117,87 +203,106 @@ class CosmosDBClient:
         Returns:
             Perfil con datetimes convertidos a string
         """
-        from datetime import datetime
-
-        serialized = {}
-        for key, value in profile.items():
-            if isinstance(value, datetime):
-                serialized[key] = value.isoformat()
-            else:
-                serialized[key] = value
-                
-        return serialized
+        return _serialize_for_cosmos(profile)
     
     def find_by_dni(self, dni: str) -> Optional[Dict[str, Any]]:
         """
-        Busca perfil por DNI usando query SQL.
+        Busca perfil por DNI con una lectura puntual en el índice de identificadores.
         
         Args:
             dni: DNI del usuario (8 dígitos)
             
         Returns:
-            Primer perfil que coincida o None
+            Perfil asociado o None
         """
-        if not self._is_configured():
-            logger.warning("Cosmos DB not configured, skipping find_by_dni")
-            return None
-        
-        try:
-            query = "SELECT * FROM c WHERE c.dni = @dni"
-            parameters = [{"name": "@dni", "value": dni}]
-            
-            items = list(self.container.query_items(
-                query=query,
-                parameters=parameters,
-                enable_cross_partition_query=True
-            ))
-            
-            if items:
-                logger.debug(f"Profile found for DNI: {dni}")
-                return items[0]
-            
-            logger.debug(f"No profile found for DNI: {dni}")
-            return None
-        
-        except Exception as e:
-            logger.exception(f"Error searching by DNI {dni}: {e}")
-            return None
+        return self._find_by_identity("dni", dni)
     
     def find_by_phone(self, phone: str) -> Optional[Dict[str, Any]]:
         """
-        Busca perfil por teléfono usando query SQL.
+        Busca perfil por teléfono con una lectura puntual en el índice de identificadores.
         
         Args:
             phone: Teléfono del usuario (9 dígitos)
             
         Returns:
-            Primer perfil que coincida o None
+            Perfil asociado o None
+        """
+        return self._find_by_identity("phone", phone)
+    
+    def _find_by_identity(self, kind: str, value: str) -> Optional[Dict[str, Any]]:
+        """
+        Resuelve identificador -> contactId en el índice y lee el perfil.
+        
+        Si hay modelo de lectura local vigente se resuelve primero ahí. Si la
+        entrada del índice apunta a un perfil que ya no tiene ese
+        identificador se elimina (read-repair). Sin entrada, opcionalmente se
+        consulta el contenedor de perfiles y se repara el índice.
         """
         if not self._is_configured():
-            logger.warning("Cosmos DB not configured, skipping find_by_phone")
+            logger.warning(f"Cosmos DB not configured, skipping find_by_{kind}")
             return None
         
+        contact_id = _read_model.resolve(kind, value) if _read_model else None
+        if contact_id:
+            profile = self.get_profile(contact_id)
+            if profile and profile.get(kind) == value:
+                logger.debug(f"Profile found for {kind} via local read model")
+                return profile
+        
+        entry_id = identity_entry_id(kind, value)
         try:
-            query = "SELECT * FROM c WHERE c.phone = @phone"
-            parameters = [{"name": "@phone", "value": phone}]
-            
-            items = list(self.container.query_items(
-                query=query,
-                parameters=parameters,
-                enable_cross_partition_query=True
-            ))
-            
-            if items:
-                logger.debug(f"Profile found for phone: {phone}")
-                return items[0]
-            
-            logger.debug(f"No profile found for phone: {phone}")
+            entry = self.identity_container.read_item(item=entry_id, partition_key=entry_id)
+        except exceptions.CosmosResourceNotFoundError:
+            entry = None
+        except Exception as e:
+            logger.exception(f"Error reading identity index for {kind}: {e}")
+            entry = None
+        
+        if entry:
+            profile = self.get_profile(entry["contactId"])
+            if profile and profile.get(kind) == value:
+                logger.debug(f"Profile found for {kind} via identity index")
+                return profile
+            self._delete_identity_entry(entry_id)
+        
+        if not settings.IDENTITY_INDEX_QUERY_FALLBACK:
+            logger.debug(f"No profile found for {kind}: {value}")
             return None
         
+        profile = self._query_by_field(kind, value)
+        if profile:
+            self._index_identity(profile)
+        return profile
+    
+    def _query_by_field(self, field: str, value: str) -> Optional[Dict[str, Any]]:
+        """Consulta entre particiones (solo como respaldo del índice); trae un único resultado."""
+        try:
+            items = self.container.query_items(
+                query=f"SELECT TOP 1 * FROM c WHERE c.{field} = @value",
+                parameters=[{"name": "@value", "value": value}],
+                enable_cross_partition_query=True,
+                max_item_count=1
+            )
+            return next(iter(items), None)
         except Exception as e:
-            logger.exception(f"Error searching by phone {phone}: {e}")
+            logger.exception(f"Error searching by {field} {value}: {e}")
             return None
     
+    def _index_identity(self, profile: Dict[str, Any]) -> None:
+        """Escribe las entradas del índice para el DNI y teléfono del perfil."""
+        for entry in identity_entries(profile):
+            try:
+                self.identity_container.upsert_item(body=entry)
+            except Exception as e:
+                logger.warning(f"Could not update identity index {entry['id']}: {e}")
+    
+    def _delete_identity_entry(self, entry_id: str) -> None:
+        try:
+            self.identity_container.delete_item(item=entry_id, partition_key=entry_id)
+            logger.info(f"Stale identity index entry removed: {entry_id}")
+        except Exception as e:
+            logger.debug(f"Could not remove identity index entry {entry_id}: {e}")
+    
     def delete_profile(self, contact_id: str) -> bool:
         """
         Elimina un perfil (útil para testing).
@@ -228,26 +333,64 @@ class CosmosDBClient:
             logger.exception(f"Error deleting profile {contact_id}: {e}")
             return False
     
+    def iter_profile_pages(
+        self,
+        fields: Optional[List[str]] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        page_size: int = 100,
+        continuation: Optional[str] = None
+    ) -> Iterator[Tuple[List[Dict[str, Any]], Optional[str]]]:
+        """
+        Recorre los perfiles página por página sin materializar el resultado.
+        
+        Args:
+            fields: Campos a traer (proyección); None = documento completo
+            filters: Campo -> valor exacto
+            page_size: Documentos por página (max_item_count)
+            continuation: Token devuelto por una página anterior para reanudar
+            
+        Yields:
+            Tupla (perfiles de la página, token para continuar después de ella;
+            None en la última página)
+        """
+        if not self._is_configured():
+            logger.warning("Cosmos DB not configured, skipping iter_profile_pages")
+            return
+        
+        query, parameters = build_profile_query(fields, filters)
+        pager = self.container.query_items(
+            query=query,
+            parameters=parameters or None,
+            enable_cross_partition_query=True,
+            max_item_count=page_size
+        ).by_page(continuation)
+        for page in pager:
+            yield list(page), pager.continuation_token
+    
+    def iter_profiles(
+        self,
+        fields: Optional[List[str]] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        page_size: int = 100
+    ) -> Iterator[Dict[str, Any]]:
+        """Recorre los perfiles uno a uno (ver iter_profile_pages)."""
+        for page, _ in self.iter_profile_pages(fields, filters, page_size):
+            yield from page
+    
     def list_all_profiles(self, max_items: int = 100) -> List[Dict[str, Any]]:
         """
-        Lista todos los perfiles (útil para debugging).
+        Lista perfiles (útil para debugging).
         
         Args:
             max_items: Límite de perfiles a retornar
             
         Returns:
-            Lista de perfiles
+            Lista de hasta max_items perfiles
         """
-        if not self._is_configured():
-            logger.warning("Cosmos DB not configured, skipping list_all_profiles")
-            return []
-        
         try:
-            query = "SELECT * FROM c"
-            items = list(self.container.query_items(
-                query=query,
-                enable_cross_partition_query=True,
-                max_item_count=max_items
+            # max_item_count solo fija el tamaño de página: el límite se aplica aquí
+            items = list(itertools.islice(
+                self.iter_profiles(page_size=min(max_items, 1000)), max_items
             ))
             logger.debug(f"Retrieved {len(items)} profiles")
             return items
@@ -256,5 +399,288 @@ class CosmosDBClient:
             logger.exception(f"Error listing profiles: {e}")
             return []
 
+
+class AsyncCosmosDBClient:
+    """
+    Versión asíncrona (azure.cosmos.aio) para usar desde el event loop.
+    
+    Registra por operación la latencia (`cosmos.<op>_ms`) y las RU
+    consumidas (`cosmos.<op>.ru`, `cosmos.<op>.calls`) en las métricas.
+    
+    Los perfiles leídos o escritos se guardan en una caché LRU con su
+    `_etag`: la siguiente lectura es condicional (If-None-Match) y, si el
+    documento no cambió, Cosmos responde 304 sin cuerpo y se usa la copia
+    local (`profile_cache.hit`, RU ahorradas en `profile_cache.ru_saved`).
+    """
+    
+    def __init__(self):
+        self.client: Optional[AsyncCosmosClient] = None
+        self.container: Optional[AsyncContainerProxy] = None
+        self.identity_container: Optional[AsyncContainerProxy] = None
+        # contactId -> (documento con _etag, RU de la última lectura completa)
+        self._profile_cache = LRUCache(settings.PROFILE_CACHE_MAX_ENTRIES, settings.PROFILE_CACHE_TTL)
+    
+    def _is_configured(self) -> bool:
+        return bool(settings.COSMOS_ENDPOINT and settings.COSMOS_KEY)
+    
+    def _get_container(self) -> Optional[AsyncContainerProxy]:
+        """Crea el cliente en el primer uso (debe hacerse dentro del event loop)."""
+        if self.container is None and self._is_configured():
+            self.client = AsyncCosmosClient(settings.COSMOS_ENDPOINT, credential=settings.COSMOS_KEY)
+            database = self.client.get_database_client(settings.COSMOS_DATABASE)
+            self.container = database.get_container_client(settings.COSMOS_CONTAINER)
+            self.identity_container = database.get_container_client(settings.COSMOS_IDENTITY_CONTAINER)
+        return self.container
+    
+    async def close(self) -> None:
+        if self.client is not None:
+            await self.client.close()
+        self.client = None
+        self.container = None
+        self.identity_container = None
+    
+    async def _call(self, operation: str, method, *args, **kwargs):
+        """Ejecuta la operación registrando latencia y request charge."""
+        result, _ = await self._call_with_charge(operation, method, *args, **kwargs)
+        return result
+    
+    async def _call_with_charge(self, operation: str, method, *args, **kwargs) -> Tuple[Any, float]:
+        """Igual que `_call`, pero devuelve también las RU consumidas."""
+        charges: List[float] = []
+        
+        def _hook(headers, _result):
+            charges.append(float(headers.get("x-ms-request-charge") or 0))
+        
+        start = time.perf_counter()
+        try:
+            result = await method(*args, response_hook=_hook, **kwargs)
+            return result, sum(charges)
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            metrics.observe(f"cosmos.{operation}_ms", elapsed_ms)
+            metrics.increment(f"cosmos.{operation}.calls")
+            metrics.increment(f"cosmos.{operation}.ru", sum(charges))
+            logger.debug(f"Cosmos {operation}: {sum(charges):.2f} RU in {elapsed_ms:.1f} ms")
+    
+    def _cache_profile(self, document: Optional[Dict[str, Any]], ru: float = 0.0) -> None:
+        """Guarda el documento (con su _etag) para revalidarlo en la próxima lectura."""
+        if not settings.PROFILE_CACHE_ENABLED or not document or not document.get("_etag"):
+            return
+        previous = self._profile_cache.get(document["id"])
+        # Las escrituras no dicen cuánto cuesta leer el documento: se conserva la última lectura
+        read_ru = ru or (previous[1] if previous else 0.0)
+        self._profile_cache.set(document["id"], (copy.deepcopy(document), read_ru))
+    
+    def invalidate_profile(self, contact_id: str) -> None:
+        """Descarta la copia local del perfil (la próxima lectura es completa)."""
+        self._profile_cache.delete(contact_id)
+    
+    async def get_profile(self, contact_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Obtiene perfil por Contact ID (point read).
+        
+        Si hay una copia en caché la lectura es condicional por ETag: un 304
+        devuelve la copia local a menor costo de RU.
+        
+        Returns:
+            Documento del perfil, o None si no existe
+        
+        Raises:
+            Exception: cualquier error de Cosmos distinto de "no encontrado"
+                (throttling, 5xx, autenticación): quien llama no debe
+                confundirlo con un perfil inexistente y crear uno en blanco
+        """
+        container = self._get_container()
+        if container is None:
+            logger.warning("Cosmos DB not configured, skipping get_profile")
+            return None
+        
+        cached = self._profile_cache.get(contact_id) if settings.PROFILE_CACHE_ENABLED else None
+        conditional = {}
+        if cached:
+            conditional = {"etag": cached[0]["_etag"], "match_condition": MatchConditions.IfModified}
+        
+        try:
+            document, ru = await self._call_with_charge(
+                "read", container.read_item, item=contact_id, partition_key=contact_id, **conditional
+            )
+        except exceptions.CosmosResourceNotFoundError:
+            logger.debug(f"Profile not found for contactId: {contact_id}")
+            self.invalidate_profile(contact_id)
+            return None
+        except Exception as e:
+            logger.exception(f"Error retrieving profile for {contact_id}: {e}")
+            raise
+        
+        if cached and not document:
+            # 304 Not Modified: sin cuerpo, la copia local sigue vigente
+            metrics.increment("profile_cache.hit")
+            metrics.increment("profile_cache.ru_saved", max(0.0, cached[1] - ru))
+            return copy.deepcopy(cached[0])
+        
+        metrics.increment("profile_cache.stale" if cached else "profile_cache.miss")
+        self._cache_profile(document, ru)
+        return document
+    
+    async def upsert_profile(self, profile: Dict[str, Any], etag: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Crea o reemplaza el documento completo del perfil.
+        
+        Args:
+            profile: Documento del perfil
+            etag: Si se indica, solo se reemplaza si el documento sigue en esa
+                versión (concurrencia optimista)
+        
+        Raises:
+            ValueError: Si falta contactId en el perfil
+            CosmosAccessConditionFailedError: Si otro proceso modificó el perfil
+                después de leer `etag`
+        """
+        container = self._get_container()
+        if container is None:
+            logger.warning("Cosmos DB not configured, skipping upsert_profile")
+            return profile
+        
+        contact_id = profile.get("contactId")
+        if not contact_id:
+            raise ValueError("Profile must include 'contactId' field")
+        profile.setdefault("id", contact_id)
+        
+        serializable_profile = _serialize_for_cosmos(profile)
+        conditional = {"etag": etag, "match_condition": MatchConditions.IfNotModified} if etag else {}
+        try:
+            result = await self._call("upsert", container.upsert_item, body=serializable_profile, **conditional)
+            logger.info(f"Profile upserted for contactId: {contact_id}")
+        except exceptions.CosmosAccessConditionFailedError:
+            logger.warning(f"Profile {contact_id} changed since it was read, upsert rejected")
+            metrics.increment("cosmos.upsert.conflict")
+            self.invalidate_profile(contact_id)
+            raise
+        except Exception as e:
+            logger.exception(f"Error upserting profile for {contact_id}: {e}")
+            raise
+        
+        self._cache_profile(result)
+        await self._index_identity(serializable_profile)
+        return result
+    
+    async def find_by_dni(self, dni: str) -> Optional[Dict[str, Any]]:
+        """Busca perfil por DNI con una lectura puntual en el índice de identificadores."""
+        return await self._find_by_identity("dni", dni)
+    
+    async def find_by_phone(self, phone: str) -> Optional[Dict[str, Any]]:
+        """Busca perfil por teléfono con una lectura puntual en el índice de identificadores."""
+        return await self._find_by_identity("phone", phone)
+    
+    async def _find_by_identity(self, kind: str, value: str) -> Optional[Dict[str, Any]]:
+        """Igual que CosmosDBClient._find_by_identity (modelo local, índice y read-repair)."""
+        if self._get_container() is None:
+            logger.warning(f"Cosmos DB not configured, skipping find_by_{kind}")
+            return None
+        
+        contact_id = _read_model.resolve(kind, value) if _read_model else None
+        if contact_id:
+            profile = await self.get_profile(contact_id)
+            if profile and profile.get(kind) == value:
+                return profile
+        
+        entry_id = identity_entry_id(kind, value)
+        try:
+            entry = await self._call(
+                "index_read", self.identity_container.read_item, item=entry_id, partition_key=entry_id
+            )
+        except exceptions.CosmosResourceNotFoundError:
+            entry = None
+        except Exception as e:
+            logger.exception(f"Error reading identity index for {kind}: {e}")
+            entry = None
+        
+        if entry:
+            profile = await self.get_profile(entry["contactId"])
+            if profile and profile.get(kind) == value:
+                return profile
+            await self._delete_identity_entry(entry_id)
+        
+        if not settings.IDENTITY_INDEX_QUERY_FALLBACK:
+            return None
+        
+        profile = await self._query_by_field(kind, value)
+        if profile:
+            await self._index_identity(profile)
+        return profile
+    
+    async def _query_by_field(self, field: str, value: str) -> Optional[Dict[str, Any]]:
+        """Consulta entre particiones (solo como respaldo del índice); trae un único resultado."""
+        start = time.perf_counter()
+        try:
+            items = self.container.query_items(
+                query=f"SELECT TOP 1 * FROM c WHERE c.{field} = @value",
+                parameters=[{"name": "@value", "value": value}],
+                max_item_count=1
+            )
+            async for item in items:
+                return item
+            return None
+        except Exception as e:
+            logger.exception(f"Error searching by {field} {value}: {e}")
+            return None
+        finally:
+            metrics.observe("cosmos.query_ms", (time.perf_counter() - start) * 1000)
+            metrics.increment("cosmos.query.calls")
+    
+    async def _index_identity(self, profile: Dict[str, Any]) -> None:
+        for entry in identity_entries(profile):
+            try:
+                await self._call("index_upsert", self.identity_container.upsert_item, body=entry)
+            except Exception as e:
+                logger.warning(f"Could not update identity index {entry['id']}: {e}")
+    
+    async def _delete_identity_entry(self, entry_id: str) -> None:
+        try:
+            await self._call("index_delete", self.identity_container.delete_item, item=entry_id, partition_key=entry_id)
+            logger.info(f"Stale identity index entry removed: {entry_id}")
+        except Exception as e:
+            logger.debug(f"Could not remove identity index entry {entry_id}: {e}")
+    
+    async def patch_profile(
+        self,
+        contact_id: str,
+        operations: List[Dict[str, Any]]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Actualización parcial del perfil (incr/set de campos puntuales).
+        
+        Args:
+            contact_id: Contact ID (id y partition key)
+            operations: Operaciones de patch de Cosmos DB
+            
+        Returns:
+            Documento actualizado, o None si el perfil no existe
+        """
+        container = self._get_container()
+        if container is None:
+            logger.warning("Cosmos DB not configured, skipping patch_profile")
+            return None
+        
+        try:
+            result = await self._call(
+                "patch",
+                container.patch_item,
+                item=contact_id,
+                partition_key=contact_id,
+                patch_operations=operations
+            )
+        except exceptions.CosmosResourceNotFoundError:
+            logger.debug(f"Profile not found for patch: {contact_id}")
+            self.invalidate_profile(contact_id)
+            return None
+        except Exception as e:
+            logger.exception(f"Error patching profile for {contact_id}: {e}")
+            raise
+        
+        self._cache_profile(result)
+        return result
+
 # Cliente singleton
 cosmos_client = CosmosDBClient()
+async_cosmos_client = AsyncCosmosDBClient()
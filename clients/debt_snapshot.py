@@ -0,0 +1,126 @@
+# Snapshot local (SQLite) del índice de deuda para búsquedas sin ir a Azure
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Cada cuánto se revisa si el archivo fue reemplazado por una exportación nueva.
+_STAT_INTERVAL = 1.0
+
+
+def create_schema(conn: sqlite3.Connection) -> None:
+    """Tablas del snapshot: filas de deuda ya proyectadas (JSON) y metadatos."""
+    conn.execute("CREATE TABLE IF NOT EXISTS debt (docnum TEXT NOT NULL, row TEXT NOT NULL)")
+    conn.execute("CREATE INDEX IF NOT EXISTS debt_docnum ON debt (docnum)")
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+
+def write_meta(conn: sqlite3.Connection, **values: Any) -> None:
+    conn.executemany(
+        "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+        [(key, None if value is None else str(value)) for key, value in values.items()]
+    )
+
+
+def read_meta(conn: sqlite3.Connection) -> Dict[str, str]:
+    return dict(conn.execute("SELECT key, value FROM meta"))
+
+
+def encode_row(row: Dict[str, Any]) -> str:
+    return json.dumps(row, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+class DebtSnapshot:
+    """
+    Lector del snapshot de deuda.
+
+    El exportador escribe un archivo nuevo y lo reemplaza con os.replace, así
+    que el lector abre el archivo como inmutable y solo reabre la conexión
+    cuando detecta que cambió. Si el snapshot no existe o está vencido,
+    `lookup` devuelve None y la búsqueda sigue contra Azure.
+    """
+
+    def __init__(self, path: str, max_age: int):
+        self.path = path
+        self.max_age = max_age
+        self._conn: Optional[sqlite3.Connection] = None
+        self._signature = None
+        self._exported_at = 0.0
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _open(self) -> None:
+        now = time.monotonic()
+        if now - self._checked_at < _STAT_INTERVAL:
+            return
+        self._checked_at = now
+
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._close()
+            return
+        signature = (stat.st_ino, stat.st_mtime_ns)
+        if signature == self._signature:
+            return
+
+        try:
+            conn = sqlite3.connect(
+                f"file:{self.path}?mode=ro&immutable=1", uri=True, check_same_thread=False
+            )
+            meta = read_meta(conn)
+        except sqlite3.Error as e:
+            logger.warning(f"Could not open debt snapshot {self.path}: {e}")
+            self._close()
+            return
+
+        self._close()
+        self._conn = conn
+        self._signature = signature
+        self._exported_at = float(meta.get("exported_at") or 0)
+        metrics.set_gauge("debt_snapshot.exported_at", self._exported_at)
+        logger.info(f"Debt snapshot loaded from {self.path} ({meta.get('rows')} rows)")
+
+    def _close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+        self._conn = None
+        self._signature = None
+
+    def is_fresh(self) -> bool:
+        return self._conn is not None and time.time() - self._exported_at <= self.max_age
+
+    def lookup(self, dni: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Filas del DNI según el snapshot.
+
+        Returns:
+            Lista de filas, o None si no hay snapshot vigente o el DNI no está
+            (un DNI nuevo pudo llegar después de la exportación)
+        """
+        with self._lock:
+            self._open()
+            if self._conn is None:
+                metrics.increment("debt_snapshot.unavailable")
+                return None
+            if not self.is_fresh():
+                metrics.increment("debt_snapshot.stale")
+                return None
+            try:
+                rows = self._conn.execute("SELECT row FROM debt WHERE docnum = ?", (dni,)).fetchall()
+            except sqlite3.Error as e:
+                logger.warning(f"Debt snapshot lookup failed: {e}")
+                return None
+
+        if not rows:
+            metrics.increment("debt_snapshot.miss")
+            return None
+        metrics.increment("debt_snapshot.hit")
+        return [json.loads(row) for (row,) in rows]
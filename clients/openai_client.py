@@ -1,10 +1,65 @@
 # Cliente de OpenAI para usar sus servicios
-from openai import OpenAI
+import asyncio
+import httpx
+import openai
+from openai import AsyncOpenAI, OpenAI
 from config.settings import settings
+from utils import deadline
+from utils.circuit_breaker import CircuitBreaker
+
+# Errores que indican que OpenAI no está disponible (no los de validación de la petición)
+OPENAI_FAILURES = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+    openai.RateLimitError,
+    asyncio.TimeoutError,
+)
+
+OPENAI_TIMEOUTS = (openai.APITimeoutError, asyncio.TimeoutError)
 
 def get_openai_client():
     if not settings.OPENAI_API_KEY:
         return None
     return OpenAI(api_key=settings.OPENAI_API_KEY)
 
+def get_async_openai_client():
+    """
+    Cliente asíncrono para usar desde el event loop sin bloquearlo.
+    Reutiliza un pool de conexiones keep-alive entre llamadas.
+    """
+    if not settings.OPENAI_API_KEY:
+        return None
+    return AsyncOpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        timeout=settings.OPENAI_TIMEOUT,
+        max_retries=settings.OPENAI_MAX_RETRIES,
+        http_client=httpx.AsyncClient(
+            timeout=settings.OPENAI_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=settings.OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.OPENAI_MAX_CONNECTIONS
+            )
+        )
+    )
+
 openai_client = get_openai_client()
+async_openai_client = get_async_openai_client()
+openai_breaker = CircuitBreaker("openai")
+
+async def chat_completion(timeout: float, **kwargs):
+    """
+    Llamada a chat.completions con el circuit breaker de OpenAI.
+
+    `timeout` es el de la etapa; se acota a lo que queda del turno y es el
+    límite total (incluidos los reintentos del SDK). Si se acotó, un timeout
+    no cuenta como fallo de OpenAI: se agotó el turno, no el servicio.
+    """
+    configured = timeout
+    timeout = deadline.stage_timeout(configured)
+    uncounted = OPENAI_TIMEOUTS if timeout < configured else ()
+    with openai_breaker.guard(OPENAI_FAILURES, uncounted):
+        return await asyncio.wait_for(
+            async_openai_client.chat.completions.create(timeout=timeout, **kwargs),
+            timeout=timeout
+        )
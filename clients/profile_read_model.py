@@ -0,0 +1,194 @@
+# Modelo de lectura local (SQLite) de los perfiles, alimentado por el change feed de Cosmos DB
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Columnas del modelo de lectura: campo del documento -> columna
+_COLUMNS = {
+    "contactId": "contact_id",
+    "dni": "dni",
+    "phone": "phone",
+    "isVerified": "is_verified",
+    "verifiedAt": "verified_at",
+    "channelSource": "channel_source",
+    "updatedAt": "updated_at",
+    "_ts": "ts",
+}
+
+_LOOKUP_COLUMNS = {"dni": "dni", "phone": "phone"}
+
+
+def create_schema(conn: sqlite3.Connection) -> None:
+    """Tabla compacta de perfiles (solo identidad y verificación) y metadatos del feed."""
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS profiles ("
+        " contact_id TEXT PRIMARY KEY, dni TEXT, phone TEXT, is_verified INTEGER NOT NULL DEFAULT 0,"
+        " verified_at TEXT, channel_source TEXT, updated_at TEXT, ts INTEGER)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS profiles_dni ON profiles (dni)")
+    conn.execute("CREATE INDEX IF NOT EXISTS profiles_phone ON profiles (phone)")
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+
+def _row(document: Dict[str, Any]) -> tuple:
+    values = []
+    for field in _COLUMNS:
+        value = document.get(field)
+        values.append(int(bool(value)) if field == "isVerified" else value)
+    return tuple(values)
+
+
+class ProfileReadModel:
+    """
+    Copia local de contactId/dni/teléfono/verificación de todos los perfiles.
+
+    Un único proceso (scripts/sync_profile_read_model.py) aplica el change
+    feed con `apply_changes`, que guarda los documentos y el continuation
+    token en la misma transacción: tras un reinicio se sigue desde el último
+    lote confirmado. Los lectores abren el archivo en solo lectura (WAL
+    permite leer mientras se escribe) y, si el modelo está atrasado más de
+    `max_lag` segundos, `resolve` devuelve None para consultar Cosmos.
+
+    El modo LatestVersion del change feed no informa borrados: un perfil
+    eliminado sigue aquí hasta reconstruir el modelo con --rebuild.
+    """
+
+    def __init__(self, path: str, max_lag: Optional[int] = None, readonly: bool = True):
+        self.path = path
+        self.max_lag = max_lag
+        self.readonly = readonly
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        if self._conn is not None:
+            return self._conn
+        try:
+            if self.readonly:
+                conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            else:
+                conn = sqlite3.connect(self.path, check_same_thread=False)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                create_schema(conn)
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Could not open profile read model {self.path}: {e}")
+            return None
+        self._conn = conn
+        return conn
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+            self._conn = None
+
+    def _meta(self, conn: sqlite3.Connection) -> Dict[str, str]:
+        return dict(conn.execute("SELECT key, value FROM meta"))
+
+    def checkpoint(self) -> Optional[str]:
+        """Continuation token del último lote aplicado (None = empezar desde el inicio)."""
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return None
+            return self._meta(conn).get("continuation")
+
+    def apply_changes(self, documents: Iterable[Dict[str, Any]], continuation: Optional[str]) -> int:
+        """
+        Aplica un lote del change feed y avanza el checkpoint de forma atómica.
+
+        Returns:
+            Cantidad de perfiles escritos
+        """
+        rows = [_row(doc) for doc in documents if doc.get("contactId")]
+        columns = ", ".join(_COLUMNS.values())
+        placeholders = ", ".join("?" for _ in _COLUMNS)
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                raise RuntimeError(f"Profile read model {self.path} is not available")
+            with conn:
+                conn.executemany(f"INSERT OR REPLACE INTO profiles ({columns}) VALUES ({placeholders})", rows)
+                conn.executemany(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                    [("continuation", continuation), ("synced_at", str(time.time()))]
+                )
+        metrics.increment("profile_read_model.applied", len(rows))
+        return len(rows)
+
+    def reset(self) -> None:
+        """Vacía el modelo y el checkpoint (la próxima sincronización lee el feed desde el inicio)."""
+        with self._lock:
+            conn = self._connect()
+            if conn is not None:
+                with conn:
+                    conn.execute("DELETE FROM profiles")
+                    conn.execute("DELETE FROM meta")
+
+    def mark_synced(self) -> None:
+        """Registra que el feed está al día aunque no haya cambios nuevos."""
+        with self._lock:
+            conn = self._connect()
+            if conn is not None:
+                with conn:
+                    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('synced_at', ?)", (str(time.time()),))
+
+    def resolve(self, kind: str, value: str) -> Optional[str]:
+        """
+        contactId asociado a un DNI/teléfono según el modelo local.
+
+        Returns:
+            contactId, o None si no está, el modelo no existe o está atrasado
+        """
+        column = _LOOKUP_COLUMNS[kind]
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                metrics.increment("profile_read_model.unavailable")
+                return None
+            try:
+                meta = self._meta(conn)
+                lag = time.time() - float(meta.get("synced_at") or 0)
+                if self.max_lag is not None and lag > self.max_lag:
+                    metrics.increment("profile_read_model.stale")
+                    return None
+                row = conn.execute(
+                    f"SELECT contact_id FROM profiles WHERE {column} = ? ORDER BY ts DESC LIMIT 1", (value,)
+                ).fetchone()
+            except sqlite3.Error as e:
+                logger.warning(f"Profile read model lookup failed: {e}")
+                return None
+
+        metrics.increment("profile_read_model.hit" if row else "profile_read_model.miss")
+        return row[0] if row else None
+
+    def stats(self) -> Dict[str, Any]:
+        """Totales para reportes: perfiles, con DNI/teléfono y verificados por canal."""
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return {}
+            total, with_dni, with_phone, verified = conn.execute(
+                "SELECT COUNT(*), COUNT(dni), COUNT(phone), COALESCE(SUM(is_verified), 0) FROM profiles"
+            ).fetchone()
+            by_channel: List[tuple] = conn.execute(
+                "SELECT COALESCE(channel_source, '?'), COUNT(*), COALESCE(SUM(is_verified), 0)"
+                " FROM profiles GROUP BY 1 ORDER BY 2 DESC"
+            ).fetchall()
+            synced_at = float(self._meta(conn).get("synced_at") or 0)
+        return {
+            "profiles": total,
+            "with_dni": with_dni,
+            "with_phone": with_phone,
+            "verified": verified,
+            "by_channel": {channel: {"profiles": n, "verified": v} for channel, n, v in by_channel},
+            "synced_at": synced_at,
+        }
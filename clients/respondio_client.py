@@ -1,10 +1,22 @@
 import httpx
+import importlib.util
 import logging
 from typing import Optional, Any
 from config.settings import settings
+from utils import deadline
+from utils.circuit_breaker import CircuitBreaker, CircuitOpenError
 
 logger = logging.getLogger(__name__)
 
+
+class RespondIOUnavailableError(Exception):
+    """Respuesta 5xx o 429: cuenta como caída de Respond.io en el circuit breaker."""
+
+    def __init__(self, response: httpx.Response):
+        super().__init__(f"Respond.io returned {response.status_code}")
+        self.response = response
+
+
 class RespondIOClient:
     """Cliente para enviar mensajes mediante la API de Respond.io."""
     
@@ -16,6 +28,61 @@ class RespondIOClient:
             "Authorization": f"Bearer {self.token}",
             "Content-Type": "application/json"
         }
+        self.breaker = CircuitBreaker("respondio")
+        # Marcar como leído tiene su propio breaker: sus fallos no cortan los envíos
+        self.read_breaker = CircuitBreaker("respondio_read")
+        self._client: Optional[httpx.AsyncClient] = None
+    
+    def start(self, **client_kwargs: Any) -> httpx.AsyncClient:
+        """
+        Crea el cliente HTTP compartido del proceso (llamar al iniciar la app
+        o el worker). Mantiene las conexiones abiertas entre envíos para no
+        repetir el handshake TCP+TLS con api.respond.io en cada mensaje.
+        
+        Args:
+            client_kwargs: Opciones extra de httpx.AsyncClient (p. ej. verify en benchmarks)
+        """
+        if self._client is not None and not self._client.is_closed:
+            return self._client
+        
+        http2 = settings.RESPONDIO_HTTP2 and importlib.util.find_spec("h2") is not None
+        if settings.RESPONDIO_HTTP2 and not http2:
+            logger.warning("Package h2 not installed, Respond.io client falls back to HTTP/1.1 keep-alive")
+        
+        self._client = httpx.AsyncClient(
+            http2=http2,
+            headers=self.headers,
+            timeout=httpx.Timeout(10.0, connect=settings.RESPONDIO_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=settings.RESPONDIO_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.RESPONDIO_MAX_KEEPALIVE,
+                keepalive_expiry=settings.RESPONDIO_KEEPALIVE_EXPIRY
+            ),
+            **client_kwargs
+        )
+        return self._client
+    
+    async def close(self) -> None:
+        """Cierra las conexiones del cliente compartido (al apagar el proceso)."""
+        if self._client is not None:
+            await self._client.aclose()
+        self._client = None
+    
+    async def _post(self, breaker: CircuitBreaker, endpoint: str, payload: dict, timeout: float) -> httpx.Response:
+        """
+        POST con el circuit breaker indicado. Solo los 5xx, los 429 y los
+        errores de red cuentan como caída de Respond.io; los 4xx son errores
+        de la petición. Una cancelación libera la prueba de half_open.
+
+        Raises:
+            CircuitOpenError: si el circuito no permite la llamada
+            RespondIOUnavailableError: si Respond.io respondió 5xx o 429
+        """
+        with breaker.guard((httpx.HTTPError, RespondIOUnavailableError)):
+            response = await self.start().post(endpoint, json=payload, timeout=timeout)
+            if response.status_code >= 500 or response.status_code == 429:
+                raise RespondIOUnavailableError(response)
+            return response
     
     def _format_identifier(self, identifier: str) -> str:
         """
@@ -92,20 +159,23 @@ class RespondIOClient:
         logger.debug(f"[Respond.io] Payload: {payload}")
         
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.post(
-                    endpoint,
-                    json=payload,
-                    headers=self.headers
-                )
+            response = await self._post(self.breaker, endpoint, payload, deadline.send_timeout(10.0))
+            
+            if response.status_code in [200, 201]:
+                logger.info(f"Message sent successfully to {formatted_identifier}")
+                return True
+            else:
+                logger.error(f" API Error {response.status_code}: {response.text}")
+                return False
+        
+        except CircuitOpenError:
+            logger.error(f"Respond.io circuit open, message to {formatted_identifier} not sent")
+            return False
+        
+        except RespondIOUnavailableError as e:
+            logger.error(f" API Error {e.response.status_code}: {e.response.text}")
+            return False
                 
-                if response.status_code in [200, 201]:
-                    logger.info(f"Message sent successfully to {formatted_identifier}")
-                    return True
-                else:
-                    logger.error(f" API Error {response.status_code}: {response.text}")
-                    return False
-                    
         except Exception as e:
             logger.exception(f"Exception sending message: {e}")
             return False
@@ -135,20 +205,22 @@ class RespondIOClient:
         logger.debug(f"Marking message {message_id} as read on channel {channel_id}")
         
         try:
-            async with httpx.AsyncClient(timeout=3.0) as client:  # Timeout corto
-                response = await client.post(
-                    endpoint,
-                    json=payload,
-                    headers=self.headers
-                )
+            response = await self._post(self.read_breaker, endpoint, payload, 3.0)  # Timeout corto
+            
+            if response.status_code in [200, 201, 204]:
+                logger.debug(f"Message {message_id} marked as read")
+                return True
+            else:
+                logger.warning(f"Failed to mark as read: {response.status_code}")
+                return False
+        
+        except CircuitOpenError:
+            return False
+        
+        except RespondIOUnavailableError as e:
+            logger.warning(f"Failed to mark as read: {e.response.status_code}")
+            return False
                 
-                if response.status_code in [200, 201, 204]:
-                    logger.debug(f"Message {message_id} marked as read")
-                    return True
-                else:
-                    logger.warning(f"Failed to mark as read: {response.status_code}")
-                    return False
-                    
         except Exception as e:
             logger.warning(f"Exception marking as read (non-critical): {e}")
             return False  # Fail silently
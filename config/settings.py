@@ -22,15 +22,67 @@ class Settings(BaseSettings):
     AZURE_INDEX: Optional[str] = None
     AZURE_INDEX_DEUDA: Optional[str] = None
     AZURE_INDEX_OTP: Optional[str] = None
+    AZURE_SEARCH_TIMEOUT: float = 4.0  # Deadline por búsqueda (segundos)
+    AZURE_SEARCH_MAX_CONNECTIONS: int = 20  # Conexiones por índice en el pool asíncrono
+    AZURE_SEARCH_BATCH_SIZE: int = 100  # Claves por filtro search.in en búsquedas por lote
+    AZURE_SEARCH_BATCH_CONCURRENCY: int = 4  # Bloques simultáneos por búsqueda en lote
+    DEBT_LOOKUP_CACHE_ENABLED: bool = True
+    DEBT_LOOKUP_CACHE_MAX_ENTRIES: int = 4096
+    DEBT_LOOKUP_CACHE_TTL: int = 300  # Resultados encontrados (segundos)
+    DEBT_LOOKUP_NEGATIVE_TTL: int = 60  # DNIs sin resultados (segundos)
+    DEBT_SNAPSHOT_PATH: Optional[str] = None  # SQLite exportado del índice de deuda; sin ruta siempre se consulta Azure
+    DEBT_SNAPSHOT_MAX_AGE: int = 21600  # Antigüedad máxima del snapshot antes de volver a Azure (segundos)
+    DEBT_SNAPSHOT_CHANGE_FIELD: Optional[str] = None  # Campo de última modificación para refrescos incrementales
     
     # Cosmos DB
     COSMOS_ENDPOINT: str
     COSMOS_KEY: str
     COSMOS_DATABASE: str = "assistantdb"
     COSMOS_CONTAINER: str = "user_profiles"
+    COSMOS_IDENTITY_CONTAINER: str = "identity_index"  # DNI/teléfono -> contactId (partition key /id)
+    IDENTITY_INDEX_QUERY_FALLBACK: bool = True  # Consultar perfiles si falta la entrada (hasta completar el backfill)
+    PROFILE_WRITE_BEHIND_ENABLED: bool = True  # Agrupar en Redis las escrituras de perfiles y aplicarlas por lotes
+    PROFILE_FLUSH_INTERVAL: float = 5.0  # Segundos entre vaciados del buffer
+    PROFILE_FLUSH_MAX_PENDING: int = 200  # Contactos pendientes que fuerzan un vaciado (y tamaño de lote)
+    PROFILE_FLUSH_CONCURRENCY: int = 16
+    PROFILE_FLUSH_LOCK_TTL: int = 60  # Expiración del lock por contacto mientras un proceso escribe su perfil
+    PROFILE_DRAIN_TIMEOUT: float = 20.0  # Tiempo máximo para vaciar el buffer al apagar (menor que el grace period del contenedor)
+    PROFILE_CACHE_ENABLED: bool = True  # Caché de perfiles revalidada con ETag (lecturas condicionales)
+    PROFILE_CACHE_MAX_ENTRIES: int = 2048
+    PROFILE_CACHE_TTL: int = 600  # Segundos que una entrada puede seguir revalidándose antes de expirar
+    PROFILE_READ_MODEL_PATH: Optional[str] = None  # SQLite alimentado por el change feed; sin ruta se consulta Cosmos
+    PROFILE_READ_MODEL_MAX_LAG: int = 300  # Atraso máximo del modelo local antes de ignorarlo (segundos)
 
     # OpenAI
     OPENAI_API_KEY: Optional[str] = None
+    OPENAI_TIMEOUT: float = 15.0  # Timeout por defecto del cliente
+    OPENAI_ROUTER_TIMEOUT: float = 6.0  # Timeout por llamada de enrutamiento
+    OPENAI_ANSWER_TIMEOUT: float = 10.0  # Timeout por llamada de respuesta
+    OPENAI_MAX_RETRIES: int = 1
+    OPENAI_MAX_CONNECTIONS: int = 20
+    COMBINED_ROUTE_ANSWER_ENABLED: bool = True  # Enrutar y responder deuda en una llamada si ya hay DNI
+    COMBINED_DEBT_MIN_SCORE: float = 0.5  # Probabilidad de deuda (modelo local) para intentar la llamada combinada
+    SPECULATIVE_PREFETCH_ENABLED: bool = True  # Consultar Azure en paralelo al enrutamiento si el mensaje trae DNI/celular
+    SESSION_HYDRATION_ENABLED: bool = True  # Sembrar DNI/teléfono/nombre desde el perfil cuando no hay sesión en Redis
+    SESSION_HYDRATION_TIMEOUT: float = 1.0  # Espera máxima por el perfil antes de seguir sin él (segundos)
+
+    # Presupuesto de tiempo por turno (de la recepción del evento al envío de la respuesta)
+    TURN_DEADLINE_SECONDS: float = 12.0
+    TURN_SEND_RESERVE_SECONDS: float = 2.0  # Reservado para enviar la respuesta por Respond.io
+    DEADLINE_MIN_LLM_SECONDS: float = 1.5  # Con menos tiempo se usan heurísticas/plantillas en vez del LLM
+
+    # Circuit breakers de dependencias externas (Azure Search, OpenAI, Respond.io)
+    CIRCUIT_FAILURE_RATE: float = 0.5  # Proporción de fallos que abre el circuito
+    CIRCUIT_MIN_CALLS: int = 10  # Llamadas mínimas en la ventana antes de evaluar
+    CIRCUIT_WINDOW_SECONDS: float = 30.0
+    CIRCUIT_OPEN_SECONDS: float = 15.0  # Tiempo abierto antes de probar de nuevo
+
+    # Caché de respuestas generadas (por DNI + huella de datos + tipo de pregunta)
+    ANSWER_CACHE_MAX_ENTRIES: int = 2048
+    ANSWER_CACHE_TTL: int = 43200  # 12 horas
+    ANSWER_PROMPT_VERSION: str = "v1"  # Cambiarlo invalida la caché de respuestas
+    DEBT_PROMPT_TOKEN_BUDGET: int = 200  # Tokens máximos para la tabla de datos de deuda
+    DEBT_ANSWER_MAX_TOKENS: int = 200  # Tokens máximos de la respuesta generada
 
     # Telegram
     TELEGRAM_TOKEN: Optional[str] = None
@@ -43,11 +95,29 @@ class Settings(BaseSettings):
     RESPONDIO_API_URL: str = "https://api.respond.io/v2"
     RESPONDIO_CHANNEL_ID: Optional[str] = None
     RESPONDIO_WHATSAPP_CHANNEL_ID: Optional[str] = None
+    RESPONDIO_HTTP2: bool = True  # Multiplexar envíos en una conexión HTTP/2 (requiere el paquete h2)
+    RESPONDIO_MAX_CONNECTIONS: int = 20
+    RESPONDIO_MAX_KEEPALIVE: int = 10
+    RESPONDIO_KEEPALIVE_EXPIRY: float = 60.0  # Segundos que una conexión ociosa se mantiene abierta
+    RESPONDIO_CONNECT_TIMEOUT: float = 5.0
     
     # Redis
     REDIS_URL: str = "redis://localhost:6379/0"
     REDIS_QUEUE_NAME: str = "respondio:events"
-    
+
+    # Caché de enrutamiento (LRU local + Redis compartido)
+    ROUTE_CACHE_ENABLED: bool = True
+    ROUTE_CACHE_MAX_ENTRIES: int = 2048
+    ROUTE_CACHE_TTL: int = 21600  # 6 horas
+    ROUTER_PROMPT_VERSION: str = "v1"  # Cambiarlo invalida la caché de rutas
+
+    # Clasificador local de intención (entrenado con el histórico de rutas del LLM)
+    INTENT_MODEL_PATH: Optional[str] = None  # Ruta al .npz; sin modelo todo va al LLM
+    INTENT_MODEL_THRESHOLD: float = 0.9  # Confianza mínima para saltarse el LLM
+    ROUTER_COLLECT_SAMPLES: bool = True  # Guardar pares (mensaje, intent) en Redis
+    ROUTER_SAMPLES_KEY: str = "router:samples"
+    ROUTER_SAMPLES_MAX: int = 50000
+
     # Servidor
     WEBHOOK_HOST: str = "0.0.0.0"
     WEBHOOK_PORT: int = 8000
@@ -6,6 +6,7 @@ import asyncio
 from services.message_processor import process_message_for_webhook
 from utils.idempotency import is_message_processed, mark_message_processed
 from clients.respondio_client import respondio_client
+from utils.deadline import turn_deadline
 
 logger = logging.getLogger(__name__)
 
@@ -62,9 +63,10 @@ async def handle_event(event_data: Dict[str, Any]) -> None:
             logger.info(f"Ignoring {traffic} message")
             return
         
-        # Procesar mensaje
+        # Procesar mensaje (todo el turno comparte un mismo presupuesto de tiempo)
         logger.info(f"Processing incoming message: {message_id}")
-        await process_message_for_webhook(event_data)
+        with turn_deadline():
+            await process_message_for_webhook(event_data)
         
         # Marcar como procesado
         if message_id:
@@ -5,7 +5,8 @@ from telegram import Update
 from telegram.ext import ContextTypes
 from services.router_service import route_message
 from services.rag_service import build_personalized_answer
-from clients.azure_client import search_debt_by_dni, search_otp_by_phone
+from clients.azure_client import SearchTimeoutError, search_debt_by_dni, search_otp_by_phone
+from utils.circuit_breaker import CircuitOpenError
 from utils.parsing import capture_name
 from utils.regex_utils import DNI_RE, PHONE_RE
 
@@ -55,18 +56,24 @@ def _only_digits(text: str) -> str:
 
 async def _respond_with_debt(message, chat: dict, user_msg: str, reason: Optional[str]) -> None:
     """Consulta Azure para deuda y responde de forma personalizada."""
-    df = search_debt_by_dni(chat["dni"])
-    if df.empty:
+    try:
+        result = await search_debt_by_dni(chat["dni"])
+    except (CircuitOpenError, SearchTimeoutError):
+        await message.reply_text(
+            _with_name(chat.get("name"), "Estoy teniendo problemas para consultar tu deuda. Intenta en unos minutos.")
+        )
+        return
+    if result.empty:
         await message.reply_text(
             _with_name(chat.get("name"), f"No encontré información para el DNI {chat['dni']}. ¿Podrías revisarlo?")
         )
         _clear_pending(chat)
         return
 
-    answer = build_personalized_answer(
+    answer = await build_personalized_answer(
         user_msg,
-        df,
-        chat.get("name"),
+        result,
+        chat,
         reason,
         intent="debt"
     )
@@ -84,18 +91,24 @@ async def _respond_with_otp(message, chat: dict, user_msg: str, reason: Optional
         _clear_pending(chat)
         return
 
-    df = search_otp_by_phone(phone)
-    if df.empty:
+    try:
+        result = await search_otp_by_phone(phone)
+    except CircuitOpenError:
+        await message.reply_text(
+            _with_name(chat.get("name"), "Estoy teniendo problemas para recuperar tu clave OTP. Intenta en unos minutos.")
+        )
+        return
+    if result.empty:
         await message.reply_text(
             _with_name(chat.get("name"), "No encontré una clave OTP activa para ese número. ¿Lo verificamos?")
         )
         _clear_pending(chat)
         return
 
-    answer = build_personalized_answer(
+    answer = await build_personalized_answer(
         user_msg,
-        df,
-        chat.get("name"),
+        result,
+        chat,
         reason,
         intent="otp",
         phone=phone
@@ -143,7 +156,7 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
             return
 
-    route = route_message(msg)
+    route = await route_message(msg)
     intent = route.get("intent", "general")
     reason = route.get("reason")
 
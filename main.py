@@ -2,6 +2,11 @@ import uvicorn
 from fastapi import FastAPI
 from utils.logging import setup_logging
 from config.settings import settings
+from clients.azure_client import close_search_clients
+from clients.cosmos_client import async_cosmos_client
+from clients.respondio_client import respondio_client
+from services.message_processor import drain_background_tasks
+from services.profile_writer import profile_writer
 
 # Importar routers
 from webhook.listener import router as webhook_router
@@ -20,6 +25,21 @@ app = FastAPI(
 app.include_router(webhook_router)
 app.mount("/api", rag_app)
 
+@app.on_event("startup")
+async def startup():
+    """Inicia el vaciado periódico del buffer de perfiles y el cliente HTTP de Respond.io"""
+    profile_writer.start()
+    respondio_client.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Escribe los perfiles pendientes y libera los pools de conexiones al apagar el servidor"""
+    await drain_background_tasks()
+    await profile_writer.drain()
+    await respondio_client.close()
+    await close_search_clients()
+    await async_cosmos_client.close()
+
 @app.get("/")
 async def root():
     """Endpoint raíz con información del servicio"""
@@ -35,7 +55,8 @@ async def root():
             "rag_api": {
                 "base": "/api",
                 "process": "/api/process-message",
-                "health": "/api/health"
+                "health": "/api/health",
+                "metrics": "/api/metrics"
             }
         },
         "status": "running"
@@ -0,0 +1,45 @@
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+
+class SearchResult:
+    """
+    Resultado compacto de una búsqueda en Azure AI Search.
+
+    Reemplaza al DataFrame de pandas en el camino de cada mensaje: las
+    búsquedas devuelven como mucho unas pocas filas y solo necesitamos saber
+    si hay resultados, leer la primera fila y serializarlas.
+    """
+
+    __slots__ = ("rows",)
+
+    def __init__(self, rows: Sequence[Dict[str, Any]] = ()):
+        self.rows = tuple(rows)
+
+    @property
+    def empty(self) -> bool:
+        return not self.rows
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self.rows)
+
+    def __repr__(self) -> str:
+        return f"SearchResult({len(self.rows)} rows)"
+
+    def first(self) -> Optional[Dict[str, Any]]:
+        """Primera fila o None si no hay resultados."""
+        return self.rows[0] if self.rows else None
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """Copia de las filas como lista de diccionarios."""
+        return [dict(row) for row in self.rows]
+
+    def to_dataframe(self):
+        """
+        Adaptador opcional para análisis: requiere tener pandas instalado
+        (ya no forma parte de las dependencias del servicio).
+        """
+        import pandas as pd
+        return pd.DataFrame(self.to_records())
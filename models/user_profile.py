@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 from typing import Optional, Dict, Any
 from datetime import datetime
 
@@ -36,6 +36,11 @@ class UserProfile(BaseModel):
     
     # Datos adicionales
     metadata: Dict[str, Any] = Field(default_factory=dict)
+    
+    # Estado guardado en Cosmos DB (sin contadores); None si aún no se guardó
+    _persisted_state: Optional[Dict[str, Any]] = PrivateAttr(default=None)
+    # ETag del documento leído/escrito (control de concurrencia optimista)
+    _etag: Optional[str] = PrivateAttr(default=None)
 
     class Config:
         json_encoders = {
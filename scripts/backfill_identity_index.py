@@ -0,0 +1,76 @@
+"""
+Crea (si no existe) el contenedor del índice de identificadores y lo llena
+con las entradas DNI/teléfono -> contactId de todos los perfiles existentes.
+
+Es idempotente: se puede volver a ejecutar (p. ej. tras una carga masiva).
+Una vez completo, IDENTITY_INDEX_QUERY_FALLBACK puede desactivarse para que
+find_by_dni/find_by_phone no vuelvan a consultar entre particiones.
+
+Ejecutar:
+    python scripts/backfill_identity_index.py --dry-run
+    python scripts/backfill_identity_index.py
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Agregar directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from azure.cosmos import PartitionKey
+
+from clients.cosmos_client import cosmos_client, identity_entries
+from config.settings import settings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill del índice DNI/teléfono -> contactId")
+    parser.add_argument("--dry-run", action="store_true", help="Solo contar las entradas a escribir")
+    parser.add_argument("--page-size", type=int, default=500)
+    args = parser.parse_args()
+
+    if not cosmos_client._is_configured():
+        print("Cosmos DB no está configurado (COSMOS_ENDPOINT / COSMOS_KEY)")
+        return 1
+
+    if not args.dry_run:
+        cosmos_client.identity_container = cosmos_client.database.create_container_if_not_exists(
+            id=settings.COSMOS_IDENTITY_CONTAINER,
+            partition_key=PartitionKey(path="/id")
+        )
+
+    # Solo los campos necesarios: la proyección reduce las RU de la lectura completa
+    profiles = cosmos_client.container.query_items(
+        query="SELECT c.contactId, c.dni, c.phone FROM c WHERE IS_DEFINED(c.dni) OR IS_DEFINED(c.phone)",
+        enable_cross_partition_query=True,
+        max_item_count=args.page_size
+    )
+
+    start = time.perf_counter()
+    scanned = written = failed = 0
+    for profile in profiles:
+        scanned += 1
+        for entry in identity_entries(profile):
+            if args.dry_run:
+                written += 1
+                continue
+            try:
+                cosmos_client.identity_container.upsert_item(body=entry)
+                written += 1
+            except Exception as e:
+                failed += 1
+                print(f"Error escribiendo {entry['id']}: {e}", file=sys.stderr)
+        if scanned % 1000 == 0:
+            print(f"  {scanned} perfiles, {written} entradas", file=sys.stderr)
+
+    action = "por escribir" if args.dry_run else "escritas"
+    print(
+        f"{scanned} perfiles revisados, {written} entradas {action}, {failed} errores "
+        f"en {time.perf_counter() - start:.1f}s"
+    )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
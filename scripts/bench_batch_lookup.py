@@ -0,0 +1,118 @@
+"""
+Compara búsquedas de deuda una por una (search_debt_by_dni secuencial)
+contra la búsqueda en lote con search.in (search_debt_by_dnis).
+
+Por defecto levanta un emulador local del endpoint de búsqueda con una
+latencia fija por petición, así la comparación no depende de la red.
+Con --live usa el índice configurado en AZURE_ENDPOINT / AZURE_INDEX_DEUDA
+(pasar DNIs reales con --dnis-file, uno por línea).
+
+Ejecutar:
+    python scripts/bench_batch_lookup.py --keys 500 --latency-ms 40
+    python scripts/bench_batch_lookup.py --live --dnis-file dnis.txt
+"""
+import argparse
+import asyncio
+import re
+import sys
+import time
+from pathlib import Path
+
+# Agregar directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from aiohttp import web
+
+from config.settings import settings
+
+_IN_RE = re.compile(r"search\.in\((\w+), '([^']*)', ','\)")
+_EQ_RE = re.compile(r"(\w+) eq '([^']*)'")
+
+
+async def _start_emulator(port: int, latency_ms: float) -> web.AppRunner:
+    """Emula el endpoint docs/search: devuelve un documento por cada DNI par."""
+
+    async def search(request: web.Request) -> web.Response:
+        body = await request.json()
+        await asyncio.sleep(latency_ms / 1000)
+        flt = body.get("filter", "")
+        if match := _IN_RE.search(flt):
+            field, keys = match.group(1), match.group(2).split(",")
+        elif match := _EQ_RE.search(flt):
+            field, keys = match.group(1), [match.group(2)]
+        else:
+            return web.json_response({"value": []})
+        docs = [
+            {field: key, "Firstname": "Cliente", "TotalDebt": 100.0 + i, "Status": "Vigente"}
+            for i, key in enumerate(keys) if int(key) % 2 == 0
+        ]
+        return web.json_response({"value": docs})
+
+    app = web.Application()
+    app.router.add_post(r"/indexes('{index}')/docs/search.post.search", search)
+    app.router.add_post("/indexes/{index}/docs/search.post.search", search)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+async def run(args) -> None:
+    from clients import azure_client
+
+    runner = None
+    if not args.live:
+        runner = await _start_emulator(args.port, args.latency_ms)
+        settings.AZURE_ENDPOINT = f"http://127.0.0.1:{args.port}"
+        settings.AZURE_QUERYKEY = "bench"
+        settings.AZURE_INDEX_DEUDA = "deuda-bench"
+    # Comparar contra Azure, no contra la caché de búsquedas
+    settings.DEBT_LOOKUP_CACHE_ENABLED = False
+
+    if args.dnis_file:
+        dnis = [line.strip() for line in open(args.dnis_file, encoding="utf-8") if line.strip()]
+    else:
+        dnis = [f"{40000000 + i:08d}" for i in range(args.keys)]
+
+    try:
+        # Calentar conexiones para no medir el handshake inicial
+        await azure_client.search_debt_by_dni(dnis[0])
+
+        start = time.perf_counter()
+        sequential = {dni: await azure_client.search_debt_by_dni(dni) for dni in dnis}
+        sequential_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        batched = await azure_client.search_debt_by_dnis(
+            dnis, batch_size=args.batch_size, concurrency=args.concurrency
+        )
+        batched_s = time.perf_counter() - start
+    finally:
+        await azure_client.close_search_clients()
+        if runner:
+            await runner.cleanup()
+
+    mismatches = sum(1 for dni in dnis if len(sequential[dni]) != len(batched[dni]))
+    requests = -(-len(dnis) // args.batch_size)
+    print(f"{len(dnis)} DNIs ({'Azure' if args.live else f'emulador, {args.latency_ms:.0f} ms/petición'})")
+    print(f"  secuencial   {sequential_s * 1000:9.1f} ms   {len(dnis)} peticiones")
+    print(f"  lote         {batched_s * 1000:9.1f} ms   {requests} peticiones "
+          f"(bloques de {args.batch_size}, concurrencia {args.concurrency})")
+    print(f"  aceleración  {sequential_s / batched_s:9.1f}x   diferencias por clave: {mismatches}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de búsquedas de deuda en lote")
+    parser.add_argument("--keys", type=int, default=500, help="DNIs sintéticos a buscar")
+    parser.add_argument("--dnis-file", help="Archivo con un DNI por línea")
+    parser.add_argument("--batch-size", type=int, default=settings.AZURE_SEARCH_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=settings.AZURE_SEARCH_BATCH_CONCURRENCY)
+    parser.add_argument("--latency-ms", type=float, default=40.0, help="Latencia simulada del emulador")
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--live", action="store_true", help="Usar el índice real de Azure")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
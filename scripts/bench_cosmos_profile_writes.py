@@ -0,0 +1,92 @@
+"""
+Compara el costo de guardar la actividad de un perfil en Cosmos DB:
+upsert del documento completo (comportamiento anterior de save_profile)
+contra patch de contador y marcas de tiempo.
+
+Usa el contenedor configurado (COSMOS_ENDPOINT / COSMOS_KEY) con un perfil
+temporal que se elimina al terminar. Reporta RU y latencia por operación.
+
+Ejecutar: python scripts/bench_cosmos_profile_writes.py --writes 50
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Agregar directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from clients.cosmos_client import async_cosmos_client, cosmos_client
+from models.user_profile import UserProfile
+from utils import metrics
+
+
+def _summary(label: str, operation: str, latencies: list) -> None:
+    snap = metrics.snapshot()["counters"]
+    calls = snap.get(f"cosmos.{operation}.calls", 0) or 1
+    ru = snap.get(f"cosmos.{operation}.ru", 0) / calls
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if len(latencies) > 1 else latencies[0]
+    print(
+        f"  {label:8s} {ru:6.2f} RU/op   p50 {statistics.median(latencies):7.1f} ms   "
+        f"p95 {p95:7.1f} ms   ({len(latencies)} escrituras)"
+    )
+
+
+async def run(writes: int) -> int:
+    if not async_cosmos_client._is_configured():
+        print("Cosmos DB no está configurado (COSMOS_ENDPOINT / COSMOS_KEY)")
+        return 1
+
+    contact_id = f"bench-{int(time.time())}"
+    profile = UserProfile(
+        contactId=contact_id,
+        dni="00000000",
+        phone="900000000",
+        firstName="Bench",
+        channelSource="telegram",
+        metadata={"bench": True}
+    )
+
+    try:
+        upserts = []
+        for _ in range(writes):
+            now = datetime.utcnow()
+            profile.totalMessages += 1
+            profile.lastInteractionAt = profile.updatedAt = now
+            start = time.perf_counter()
+            await async_cosmos_client.upsert_profile(profile.model_dump())
+            upserts.append((time.perf_counter() - start) * 1000)
+
+        patches = []
+        for _ in range(writes):
+            now = datetime.utcnow().isoformat()
+            start = time.perf_counter()
+            await async_cosmos_client.patch_profile(contact_id, [
+                {"op": "incr", "path": "/totalMessages", "value": 1},
+                {"op": "set", "path": "/lastInteractionAt", "value": now},
+                {"op": "set", "path": "/updatedAt", "value": now},
+            ])
+            patches.append((time.perf_counter() - start) * 1000)
+
+        print(f"Perfil de prueba {contact_id}:")
+        _summary("upsert", "upsert", upserts)
+        _summary("patch", "patch", patches)
+        return 0
+    finally:
+        await async_cosmos_client.close()
+        cosmos_client.delete_profile(contact_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark upsert vs patch de perfiles en Cosmos DB")
+    parser.add_argument("--writes", type=int, default=50, help="Escrituras por modo")
+    args = parser.parse_args()
+    return asyncio.run(run(args.writes))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""
+Compara la latencia por envío a Respond.io abriendo un httpx.AsyncClient
+por mensaje (comportamiento anterior) contra el cliente compartido con
+keep-alive de respondio_client.
+
+Levanta un servidor local que imita el endpoint de mensajes, por defecto con
+TLS y un certificado autofirmado generado al vuelo, para que la comparación
+incluya el handshake TCP+TLS que se ahorra al reutilizar conexiones. El
+servidor local solo habla HTTP/1.1, así que aquí no se mide HTTP/2.
+
+Ejecutar:
+    python scripts/bench_respondio_send.py --sends 200
+    python scripts/bench_respondio_send.py --no-tls --latency-ms 20
+"""
+import argparse
+import asyncio
+import datetime
+import ipaddress
+import ssl
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Agregar directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import httpx
+from aiohttp import web
+
+from clients.respondio_client import respondio_client
+
+
+def _self_signed_cert(directory: str):
+    """Genera un certificado autofirmado para 127.0.0.1; devuelve (cert, key)."""
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "127.0.0.1")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=1))
+        .not_valid_after(now + datetime.timedelta(hours=1))
+        .add_extension(x509.SubjectAlternativeName([x509.IPAddress(ipaddress.ip_address("127.0.0.1"))]), critical=False)
+        .sign(key, hashes.SHA256())
+    )
+    cert_path = Path(directory) / "cert.pem"
+    key_path = Path(directory) / "key.pem"
+    cert_path.write_bytes(cert.public_bytes(serialization.Encoding.PEM))
+    key_path.write_bytes(key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ))
+    return str(cert_path), str(key_path)
+
+
+async def _start_server(port: int, latency_ms: float, ssl_context) -> web.AppRunner:
+    """Imita POST /contact/{id}/message respondiendo 200 tras `latency_ms`."""
+
+    async def send(request: web.Request) -> web.Response:
+        await request.json()
+        await asyncio.sleep(latency_ms / 1000)
+        return web.json_response({"messageId": 1})
+
+    app = web.Application()
+    app.router.add_post("/v2/contact/{identifier}/message", send)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port, ssl_context=ssl_context).start()
+    return runner
+
+
+def _summary(label: str, latencies: list) -> float:
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies)
+    p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+    print(f"  {label:18s} p50 {p50:7.2f} ms   p95 {p95:7.2f} ms   ({len(latencies)} envíos)")
+    return p50
+
+
+async def run(args) -> None:
+    tmp = tempfile.TemporaryDirectory()
+    verify = True
+    server_ssl = None
+    scheme = "http"
+    if not args.no_tls:
+        cert, key = _self_signed_cert(tmp.name)
+        server_ssl = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        server_ssl.load_cert_chain(cert, key)
+        verify = ssl.create_default_context(cafile=cert)
+        scheme = "https"
+
+    runner = await _start_server(args.port, args.latency_ms, server_ssl)
+    base_url = f"{scheme}://127.0.0.1:{args.port}/v2"
+    respondio_client.base_url = base_url
+    payload = {"message": {"type": "text", "text": "hola"}, "channelId": 1}
+
+    try:
+        per_call = []
+        for i in range(args.sends):
+            start = time.perf_counter()
+            async with httpx.AsyncClient(timeout=10.0, verify=verify) as client:
+                response = await client.post(
+                    f"{base_url}/contact/id:{i}/message", json=payload, headers=respondio_client.headers
+                )
+            per_call.append((time.perf_counter() - start) * 1000)
+            response.raise_for_status()
+
+        respondio_client.start(verify=verify)
+        shared = []
+        for i in range(args.sends):
+            start = time.perf_counter()
+            if not await respondio_client.send_message(str(i), "hola", channel_id="1"):
+                raise RuntimeError("send_message failed against the local server")
+            shared.append((time.perf_counter() - start) * 1000)
+    finally:
+        await respondio_client.close()
+        await runner.cleanup()
+        tmp.cleanup()
+
+    print(f"Servidor local {scheme.upper()}, {args.latency_ms:.0f} ms de latencia simulada")
+    before = _summary("cliente por envío", per_call)
+    after = _summary("cliente compartido", shared)
+    print(f"  ahorro p50         {before - after:7.2f} ms por envío")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de envíos a Respond.io con y sin keep-alive")
+    parser.add_argument("--sends", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="Latencia simulada del servidor")
+    parser.add_argument("--port", type=int, default=8798)
+    parser.add_argument("--no-tls", action="store_true", help="Servidor HTTP sin TLS")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
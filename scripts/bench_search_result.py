@@ -0,0 +1,96 @@
+"""
+Compara pandas.DataFrame contra SearchResult en el camino de cada búsqueda:
+tiempo de importación, memoria (RSS) tras importar y costo por lookup
+(construir el resultado, .empty, primera fila y lista de registros).
+
+Ejecutar: python scripts/bench_search_result.py
+"""
+import json
+import subprocess
+import sys
+import timeit
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+
+# Agregar directorio raíz al path
+sys.path.insert(0, str(ROOT))
+
+from models.search_result import SearchResult
+
+# Fila típica de deuda con los campos renombrados por azure_client
+_ROW = {
+    "Nombre": "Ana",
+    "Estado": "Vigente",
+    "Monto": 1500.0,
+    "Vencimiento": "2026-11-01T00:00:00Z",
+    "TotalDeuda": 1720.5,
+    "Principal": 1500.0,
+    "Intereses": 120.5,
+    "Gastos": 50.0,
+    "Mora": 30.0,
+    "Penalidad": 20.0,
+}
+_ROWS = [dict(_ROW) for _ in range(10)]
+
+# Mide en un proceso limpio el tiempo de import y el RSS máximo resultante
+_IMPORT_PROBE = """
+import json, resource, sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"ms": elapsed * 1000, "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}}))
+"""
+
+
+def measure_import(module: str) -> dict:
+    code = _IMPORT_PROBE.format(root=str(ROOT), module=module)
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    if out.returncode != 0:
+        return {}
+    return json.loads(out.stdout)
+
+
+def lookup_with_search_result():
+    result = SearchResult(_ROWS)
+    if not result.empty:
+        result.first().get("TotalDeuda")
+        result.to_records()
+
+
+def lookup_with_dataframe():
+    import pandas as pd
+    df = pd.DataFrame(_ROWS)
+    if not df.empty:
+        df.iloc[0].get("TotalDeuda")
+        df.to_dict(orient="records")
+
+
+def main():
+    print("Importación (proceso limpio):")
+    baseline = measure_import("json")
+    for module in ("models.search_result", "pandas"):
+        stats = measure_import(module)
+        if not stats:
+            print(f"  {module:22s} no disponible")
+            continue
+        print(
+            f"  {module:22s} {stats['ms']:8.1f} ms   "
+            f"RSS {stats['rss_mb']:6.1f} MB (+{stats['rss_mb'] - baseline['rss_mb']:.1f} MB)"
+        )
+
+    print("\nCosto por lookup (10 filas):")
+    runs = 5000
+    per_call = timeit.timeit(lookup_with_search_result, number=runs) / runs * 1e6
+    print(f"  SearchResult           {per_call:8.1f} µs")
+    try:
+        import pandas  # noqa: F401
+        per_call = timeit.timeit(lookup_with_dataframe, number=runs // 10) / (runs // 10) * 1e6
+        print(f"  pandas.DataFrame       {per_call:8.1f} µs")
+    except ImportError:
+        print("  pandas.DataFrame       no disponible")
+
+
+if __name__ == "__main__":
+    main()
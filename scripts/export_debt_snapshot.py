@@ -0,0 +1,211 @@
+"""
+Exporta la proyección de deuda del índice de Azure AI Search a un snapshot
+SQLite (DEBT_SNAPSHOT_PATH) que search_debt_by_dni lee antes de ir a Azure.
+
+- Exportación completa: recorre el índice por DocNum (paginación por clave,
+  sin el límite de $skip) y escribe un archivo nuevo.
+- Refresco incremental: si DEBT_SNAPSHOT_CHANGE_FIELD está configurado y ya
+  existe un snapshot, copia el actual y vuelve a traer solo los DNIs con
+  cambios desde la última marca. Las bajas solo se reflejan con --full.
+  Si falla algún bloque de la consulta se aborta el refresco: el snapshot
+  y la marca anteriores quedan intactos y la próxima vuelta lo reintenta.
+
+En ambos casos se escribe en un archivo temporal y se reemplaza con
+os.replace, así los lectores nunca ven un snapshot a medio escribir.
+
+Ejecutar:
+    python scripts/export_debt_snapshot.py --full
+    python scripts/export_debt_snapshot.py --interval 900
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import sqlite3
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Agregar directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from clients.azure_client import (
+    _DEFAULT_DEBT_FIELDS,
+    _DEFAULT_DEBT_RENAME,
+    _get_async_search_client,
+    _project,
+    azure_search_many_async,
+    close_search_clients,
+)
+from clients.debt_snapshot import create_schema, encode_row, read_meta, write_meta
+from config.settings import settings
+
+KEY_FIELD = "DocNum"
+
+
+def _max_mark(current: Optional[str], record: Dict, change_field: Optional[str]) -> Optional[str]:
+    value = record.get(change_field) if change_field else None
+    if value is None:
+        return current
+    value = str(value)
+    return value if current is None or value > current else current
+
+
+async def _export_full(conn: sqlite3.Connection, page_size: int, change_field: Optional[str]) -> Optional[str]:
+    """Recorre el índice ordenado por DocNum y guarda cada fila proyectada."""
+    client = _get_async_search_client(settings.AZURE_INDEX_DEUDA or settings.AZURE_INDEX)
+    if not client:
+        raise RuntimeError("Azure Search client not configured")
+
+    select = [*_DEFAULT_DEBT_FIELDS, KEY_FIELD] + ([change_field] if change_field else [])
+    cursor_op, cursor_key = None, None
+    watermark = None
+    total = 0
+
+    while True:
+        flt = f"{KEY_FIELD} {cursor_op} '{cursor_key}'" if cursor_key else None
+        results = await client.search(
+            search_text="*",
+            filter=flt,
+            order_by=[f"{KEY_FIELD} asc"],
+            select=select,
+            top=page_size
+        )
+        page = [record async for record in results]
+
+        keep = page
+        if len(page) == page_size:
+            # Las filas del último DNI pueden seguir en la página siguiente: se releen completas
+            tail_key = page[-1][KEY_FIELD]
+            keep = [record for record in page if record[KEY_FIELD] != tail_key]
+            if keep:
+                cursor_op, cursor_key = "ge", tail_key
+            else:
+                keep, cursor_op, cursor_key = page, "gt", tail_key
+
+        conn.executemany(
+            "INSERT INTO debt (docnum, row) VALUES (?, ?)",
+            [
+                (str(record[KEY_FIELD]), encode_row(_project(record, _DEFAULT_DEBT_FIELDS, _DEFAULT_DEBT_RENAME)))
+                for record in keep
+            ]
+        )
+        for record in keep:
+            watermark = _max_mark(watermark, record, change_field)
+        total += len(keep)
+        print(f"  {total} filas exportadas", file=sys.stderr)
+
+        if len(page) < page_size:
+            return watermark
+
+
+async def _changed_keys(change_field: str, watermark: str) -> tuple:
+    """DNIs con filas modificadas después de la marca y la nueva marca."""
+    client = _get_async_search_client(settings.AZURE_INDEX_DEUDA or settings.AZURE_INDEX)
+    if not client:
+        raise RuntimeError("Azure Search client not configured")
+
+    results = await client.search(
+        search_text="*",
+        filter=f"{change_field} gt {watermark}",
+        select=[KEY_FIELD, change_field]
+    )
+    keys: List[str] = []
+    new_mark = watermark
+    async for record in results:
+        keys.append(str(record[KEY_FIELD]))
+        new_mark = _max_mark(new_mark, record, change_field)
+    return list(dict.fromkeys(keys)), new_mark
+
+
+async def _refresh_incremental(conn: sqlite3.Connection, change_field: str, watermark: str) -> str:
+    keys, new_mark = await _changed_keys(change_field, watermark)
+    if not keys:
+        return new_mark
+
+    # strict: un bloque fallido volvería vacío y se borrarían esos DNIs del snapshot
+    results = await azure_search_many_async(KEY_FIELD, keys, strict=True)
+    conn.executemany("DELETE FROM debt WHERE docnum = ?", [(key,) for key in keys])
+    conn.executemany(
+        "INSERT INTO debt (docnum, row) VALUES (?, ?)",
+        [(key, encode_row(row)) for key, result in results.items() for row in result]
+    )
+    print(f"  {len(keys)} DNIs actualizados", file=sys.stderr)
+    return new_mark
+
+
+async def refresh_snapshot(path: str, full: bool, page_size: int) -> None:
+    change_field = settings.DEBT_SNAPSHOT_CHANGE_FIELD
+    tmp_path = f"{path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    previous = {}
+    if not full and change_field and os.path.exists(path):
+        shutil.copyfile(path, tmp_path)
+        with sqlite3.connect(path) as current:
+            previous = read_meta(current)
+
+    start = time.perf_counter()
+    conn = sqlite3.connect(tmp_path)
+    try:
+        create_schema(conn)
+        if previous.get("watermark"):
+            mode = "incremental"
+            watermark = await _refresh_incremental(conn, change_field, previous["watermark"])
+        else:
+            mode = "full"
+            conn.execute("DELETE FROM debt")
+            watermark = await _export_full(conn, page_size, change_field)
+
+        rows = conn.execute("SELECT COUNT(*) FROM debt").fetchone()[0]
+        write_meta(conn, exported_at=time.time(), watermark=watermark, rows=rows, mode=mode)
+        conn.commit()
+        if mode == "full":
+            conn.execute("VACUUM")
+    except BaseException:
+        conn.close()
+        os.remove(tmp_path)
+        raise
+    conn.close()
+
+    os.replace(tmp_path, path)
+    print(
+        f"Snapshot {mode} listo: {rows} filas en {time.perf_counter() - start:.1f}s -> {path}",
+        file=sys.stderr
+    )
+
+
+async def run(args) -> int:
+    try:
+        while True:
+            try:
+                await refresh_snapshot(args.output, args.full, args.page_size)
+            except Exception as e:
+                print(f"Error exportando snapshot: {e}", file=sys.stderr)
+                if not args.interval:
+                    return 1
+            if not args.interval:
+                return 0
+            # Solo la primera vuelta es completa si se pidió --full
+            args.full = False
+            await asyncio.sleep(args.interval)
+    finally:
+        await close_search_clients()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta el índice de deuda a un snapshot SQLite")
+    parser.add_argument("--output", default=settings.DEBT_SNAPSHOT_PATH, help="Ruta del snapshot")
+    parser.add_argument("--full", action="store_true", help="Forzar exportación completa")
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--interval", type=int, default=0, help="Repetir cada N segundos (0 = una vez)")
+    args = parser.parse_args()
+    if not args.output:
+        parser.error("--output o DEBT_SNAPSHOT_PATH es obligatorio")
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,215 @@
+"""
+Exporta los perfiles de Cosmos DB a NDJSON o Parquet en memoria constante.
+
+Recorre el contenedor página por página (iter_profile_pages) y escribe cada
+página en cuanto llega. Con --fields solo se traen esos campos (proyección
+en la consulta) y --filter agrega condiciones de igualdad.
+
+Tras cada página se guarda el continuation token en <salida>.checkpoint; con
+--resume una exportación NDJSON interrumpida continúa desde ahí agregando al
+final del archivo (como mucho se repite la página que estaba escribiéndose).
+Parquet no admite agregar a un archivo existente, así que siempre se exporta
+completo (requiere pyarrow, que no es dependencia del servicio).
+
+Ejecutar:
+    python scripts/export_profiles.py --output profiles.ndjson
+    python scripts/export_profiles.py --output profiles.ndjson --resume
+    python scripts/export_profiles.py --format parquet --output profiles.parquet \\
+        --fields contactId,dni,phone,isVerified --filter channelSource=telegram
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import typing
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# Agregar directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from clients.cosmos_client import cosmos_client
+from models.user_profile import UserProfile
+
+
+def _parse_filters(values: List[str]) -> Dict[str, Any]:
+    """Convierte 'campo=valor' en filtros; true/false/números se interpretan como JSON."""
+    filters = {}
+    for item in values:
+        name, sep, raw = item.partition("=")
+        if not sep:
+            raise ValueError(f"Filtro inválido (se espera campo=valor): {item}")
+        try:
+            filters[name] = json.loads(raw)
+        except ValueError:
+            filters[name] = raw
+    return filters
+
+
+def _read_checkpoint(path: str) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_checkpoint(path: str, continuation: Optional[str], exported: int) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"continuation": continuation, "exported": exported}, f)
+    os.replace(tmp, path)
+
+
+class _NdjsonWriter:
+    def __init__(self, path: str, append: bool):
+        self.file = open(path, "a" if append else "w", encoding="utf-8")
+
+    def write(self, rows: List[Dict[str, Any]]) -> None:
+        for row in rows:
+            self.file.write(json.dumps(row, ensure_ascii=False, default=str))
+            self.file.write("\n")
+        # El checkpoint solo avanza cuando la página ya está en disco
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def _base_type(annotation: Any) -> Any:
+    """Tipo de un campo del modelo sin Optional (Dict[...] -> dict)."""
+    if typing.get_origin(annotation) is typing.Union:
+        annotation = next(arg for arg in typing.get_args(annotation) if arg is not type(None))
+    return typing.get_origin(annotation) or annotation
+
+
+def _parse_timestamp(value: Any) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return value
+    parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+class _ParquetWriter:
+    """
+    Un row group por página con esquema explícito: los campos de UserProfile
+    (o los pedidos con --fields). No se infiere de la primera página porque
+    una columna vacía ahí (p. ej. verifiedAt) quedaría con tipo null y las
+    páginas siguientes fallarían.
+    """
+
+    def __init__(self, path: str, fields: Optional[List[str]]):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("La salida Parquet requiere pyarrow (pip install pyarrow)")
+        self.pa = pa
+        self.pq = pq
+        self.path = path
+        model_types = {name: _base_type(info.annotation) for name, info in UserProfile.model_fields.items()}
+        model_types.setdefault("_ts", int)
+        # Otros campos fuera del modelo (id, _etag...) se exportan como texto
+        self.types = {
+            name: model_types.get(name, str) for name in (fields or UserProfile.model_fields)
+        }
+        self.schema = pa.schema([(name, self._arrow_type(kind)) for name, kind in self.types.items()])
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def _arrow_type(self, kind: Any):
+        if kind is bool:
+            return self.pa.bool_()
+        if kind is int:
+            return self.pa.int64()
+        if kind is float:
+            return self.pa.float64()
+        if kind is datetime:
+            return self.pa.timestamp("us")
+        return self.pa.string()
+
+    def _convert(self, kind: Any, value: Any) -> Any:
+        if value is None:
+            return None
+        if kind is datetime:
+            return _parse_timestamp(value)
+        if kind in (bool, int, float):
+            return kind(value)
+        if isinstance(value, (dict, list)):
+            # Objetos anidados (metadata) como JSON
+            return json.dumps(value, ensure_ascii=False, default=str)
+        return value if isinstance(value, str) else str(value)
+
+    def write(self, rows: List[Dict[str, Any]]) -> None:
+        if not rows:
+            return
+        rows = [
+            {name: self._convert(kind, row.get(name)) for name, kind in self.types.items()}
+            for row in rows
+        ]
+        self.writer.write_table(self.pa.Table.from_pylist(rows, schema=self.schema))
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta perfiles de Cosmos DB a NDJSON o Parquet")
+    parser.add_argument("--output", required=True, help="Archivo de salida")
+    parser.add_argument("--format", choices=("ndjson", "parquet"), default="ndjson")
+    parser.add_argument("--fields", help="Campos a exportar separados por coma (proyección)")
+    parser.add_argument("--filter", action="append", default=[], help="campo=valor (repetible)")
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--resume", action="store_true", help="Continuar desde el último checkpoint (solo NDJSON)")
+    args = parser.parse_args()
+
+    if not cosmos_client._is_configured():
+        print("Cosmos DB no está configurado (COSMOS_ENDPOINT / COSMOS_KEY)")
+        return 1
+
+    fields = [name.strip() for name in args.fields.split(",") if name.strip()] if args.fields else None
+    filters = _parse_filters(args.filter)
+    checkpoint_path = f"{args.output}.checkpoint"
+
+    continuation = None
+    exported = 0
+    if args.resume:
+        if args.format != "ndjson":
+            print("--resume solo está disponible para NDJSON", file=sys.stderr)
+            return 1
+        checkpoint = _read_checkpoint(checkpoint_path)
+        continuation = checkpoint.get("continuation")
+        exported = checkpoint.get("exported", 0)
+        if checkpoint and not continuation:
+            print(f"La exportación ya estaba completa ({exported} perfiles)")
+            return 0
+        print(f"Reanudando después de {exported} perfiles", file=sys.stderr)
+
+    if args.format == "parquet":
+        writer = _ParquetWriter(args.output, fields)
+    else:
+        writer = _NdjsonWriter(args.output, append=bool(continuation))
+
+    start = time.perf_counter()
+    session = 0
+    try:
+        pages = cosmos_client.iter_profile_pages(fields, filters, args.page_size, continuation)
+        for rows, continuation in pages:
+            writer.write(rows)
+            session += len(rows)
+            exported += len(rows)
+            _write_checkpoint(checkpoint_path, continuation, exported)
+            elapsed = time.perf_counter() - start
+            print(f"  {exported} perfiles ({session / max(elapsed, 1e-6):.0f}/s)", file=sys.stderr)
+    finally:
+        writer.close()
+
+    print(f"{exported} perfiles exportados a {args.output} en {time.perf_counter() - start:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""
+Clasifica mensajes históricos en lote y escribe los resultados como NDJSON.
+
+La entrada puede ser texto plano (un mensaje por línea) o NDJSON con el
+mensaje en el campo indicado por --text-field; en ese caso los demás campos
+(id, intent esperado, etc.) se copian a la salida.
+
+Ejecutar:
+    python scripts/route_batch.py --input mensajes.ndjson --output rutas.ndjson
+    python scripts/route_batch.py --input mensajes.txt --output - --no-llm
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+# Agregar directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from services.router_service import route_messages_batch
+
+
+def _read_chunks(path: str, text_field: str, chunk_size: int):
+    """Lee la entrada en bloques para mantener la memoria acotada."""
+    chunk = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                record = json.loads(line)
+                text = str(record.get(text_field) or "")
+            else:
+                record, text = {}, line
+            chunk.append((record, text))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+async def run(args) -> int:
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    known = {}
+    sources = Counter()
+    total = 0
+    start = time.perf_counter()
+
+    try:
+        for chunk in _read_chunks(args.input, args.text_field, args.chunk_size):
+            texts = [text for _, text in chunk]
+            routes = await route_messages_batch(
+                texts,
+                concurrency=args.concurrency,
+                use_cache=not args.no_cache,
+                use_llm=not args.no_llm,
+                known=known
+            )
+            for (record, text), route in zip(chunk, routes):
+                row = {**record, args.text_field: text, **{f"route_{k}": v for k, v in route.items()}}
+                out.write(json.dumps(row, ensure_ascii=False) + "\n")
+                sources[route.get("source")] += 1
+            total += len(chunk)
+            print(
+                f"{total} mensajes ({len(known)} únicos) en {time.perf_counter() - start:.1f}s",
+                file=sys.stderr
+            )
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    print(f"Resueltos por etapa: {dict(sources)}", file=sys.stderr)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Clasificación de intención en lote")
+    parser.add_argument("--input", required=True, help="Archivo de texto o NDJSON")
+    parser.add_argument("--output", required=True, help="Archivo NDJSON de salida ('-' para stdout)")
+    parser.add_argument("--text-field", default="text", help="Campo con el mensaje en entradas NDJSON")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=8, help="Llamadas simultáneas al LLM")
+    parser.add_argument("--no-cache", action="store_true", help="Sin caché de rutas ni muestras de entrenamiento (evaluar prompts)")
+    parser.add_argument("--no-llm", action="store_true", help="Solo reglas, caché y modelo local")
+    args = parser.parse_args()
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
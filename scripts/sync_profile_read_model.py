@@ -0,0 +1,100 @@
+"""
+Mantiene el modelo de lectura local de perfiles (PROFILE_READ_MODEL_PATH)
+aplicando el change feed del contenedor de Cosmos DB.
+
+Cada página del feed se escribe junto con su continuation token en una sola
+transacción SQLite, así que al reiniciar se sigue desde el último lote
+aplicado en lugar de recorrer todo el contenedor. La primera ejecución (o
+--rebuild) lee el feed desde el inicio.
+
+Con --interval se queda consultando el feed; sin él, se detiene al ponerse
+al día. --stats imprime los totales del modelo para reportes.
+
+Ejecutar:
+    python scripts/sync_profile_read_model.py --interval 10
+    python scripts/sync_profile_read_model.py --rebuild
+    python scripts/sync_profile_read_model.py --stats
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+# Agregar directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from clients.cosmos_client import cosmos_client
+from clients.profile_read_model import ProfileReadModel
+from config.settings import settings
+
+
+def sync_once(model: ProfileReadModel, page_size: int) -> int:
+    """Aplica los cambios pendientes del feed; devuelve la cantidad de perfiles escritos."""
+    container = cosmos_client.container
+    token = model.checkpoint()
+    if token:
+        feed = container.query_items_change_feed(continuation=token, max_item_count=page_size)
+    else:
+        feed = container.query_items_change_feed(start_time="Beginning", max_item_count=page_size)
+
+    applied = 0
+    for page in feed.by_page():
+        documents = list(page)
+        # El etag de la respuesta es el continuation token del change feed
+        token = container.client_connection.last_response_headers.get("etag")
+        applied += model.apply_changes(documents, token)
+        print(f"  {applied} perfiles aplicados", file=sys.stderr)
+
+    # Sin cambios nuevos el feed igual devuelve un token actualizado
+    latest = container.client_connection.last_response_headers.get("etag")
+    if latest and latest != token:
+        model.apply_changes([], latest)
+    model.mark_synced()
+    return applied
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sincroniza el modelo de lectura de perfiles con el change feed")
+    parser.add_argument("--output", default=settings.PROFILE_READ_MODEL_PATH, help="Ruta del SQLite")
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--interval", type=int, default=0, help="Consultar el feed cada N segundos (0 = una vez)")
+    parser.add_argument("--rebuild", action="store_true", help="Vaciar el modelo y leer el feed desde el inicio")
+    parser.add_argument("--stats", action="store_true", help="Solo imprimir los totales del modelo")
+    args = parser.parse_args()
+
+    if not args.output:
+        print("Indicar --output o PROFILE_READ_MODEL_PATH")
+        return 1
+
+    model = ProfileReadModel(args.output, readonly=False)
+    if args.stats:
+        print(json.dumps(model.stats(), indent=2, ensure_ascii=False))
+        return 0
+
+    if not cosmos_client._is_configured():
+        print("Cosmos DB no está configurado (COSMOS_ENDPOINT / COSMOS_KEY)")
+        return 1
+
+    if args.rebuild:
+        model.reset()
+
+    while True:
+        start = time.perf_counter()
+        try:
+            applied = sync_once(model, args.page_size)
+            print(f"{applied} perfiles sincronizados en {time.perf_counter() - start:.1f}s", file=sys.stderr)
+        except Exception as e:
+            if not args.interval:
+                raise
+            print(f"Error leyendo el change feed: {e}", file=sys.stderr)
+        if not args.interval:
+            break
+        time.sleep(args.interval)
+
+    model.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,55 @@
+"""
+Pruebas de normalize_message: la normalización debe ser idempotente, porque
+las muestras del router se guardan ya normalizadas y el entrenamiento del
+clasificador las vuelve a normalizar (featurize lo hace una sola vez).
+Ejecutar: python scripts/test_normalize_message.py
+"""
+import sys
+from pathlib import Path
+
+# Agregar directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.parsing import normalize_message
+
+SAMPLES = [
+    "Mi DNI es 12345678, ¿cuánto debo?",
+    "mi celular es +51 987654321",
+    "llámame al 987654321 por favor",
+    "hola_que tal__amigo",
+    "dni_mask y telefono_mask",
+    "¿Cuándo VENCE mi préstamo?",
+    "",
+]
+
+
+def test_idempotent():
+    """normalize_message(normalize_message(x)) == normalize_message(x)"""
+    for text in SAMPLES:
+        once = normalize_message(text)
+        assert normalize_message(once) == once, (text, once, normalize_message(once))
+
+
+def test_masks():
+    """Los DNI y teléfonos se enmascaran con tokens que no se parten"""
+    assert normalize_message("Mi DNI es 12345678") == "mi dni es dni_mask"
+    assert normalize_message("llámame al 987654321") == "llamame al telefono_mask"
+
+
+def main():
+    results = []
+    for test in (test_idempotent, test_masks):
+        try:
+            test()
+            results.append((test.__doc__, True))
+        except AssertionError as e:
+            print(f"  {test.__name__}: {e}")
+            results.append((test.__doc__, False))
+
+    for name, passed in results:
+        print(f"  {'PASS' if passed else 'FAIL'} - {name}")
+    return 0 if all(passed for _, passed in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
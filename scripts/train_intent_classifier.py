@@ -0,0 +1,102 @@
+"""
+Entrena el clasificador local de intención con los pares (mensaje, intent)
+que el router guarda en Redis o con un archivo NDJSON ({"text", "intent"}).
+
+Ejecutar:
+    python scripts/train_intent_classifier.py --output models/intent_classifier.npz
+    python scripts/train_intent_classifier.py --input samples.ndjson --output models/intent_classifier.npz
+
+Luego configurar INTENT_MODEL_PATH con la ruta del .npz generado.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+# Agregar directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config.settings import settings
+from services.intent_classifier import IntentClassifier, accuracy
+from utils.parsing import normalize_message
+
+
+def load_samples_from_redis():
+    """Lee los pares que guarda record_routed_sample."""
+    from clients.queue_client import get_redis_client
+    client = get_redis_client()
+    for raw in client.lrange(settings.ROUTER_SAMPLES_KEY, 0, -1):
+        yield json.loads(raw)
+
+
+def load_samples_from_file(path: str):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Entrena el clasificador local de intención")
+    parser.add_argument("--input", help="Archivo NDJSON con text/intent (por defecto: Redis)")
+    parser.add_argument("--output", required=True, help="Ruta del modelo .npz a generar")
+    parser.add_argument("--holdout", type=float, default=0.1, help="Fracción para validación")
+    parser.add_argument("--epochs", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=13)
+    args = parser.parse_args()
+
+    samples = load_samples_from_file(args.input) if args.input else load_samples_from_redis()
+
+    # Deduplicar por texto normalizado; ante etiquetas en conflicto gana la mayoritaria
+    votes = {}
+    for sample in samples:
+        text = normalize_message(sample.get("text") or "")
+        if text and sample.get("intent"):
+            votes.setdefault(text, Counter())[sample["intent"]] += 1
+    dataset = [(text, counter.most_common(1)[0][0]) for text, counter in votes.items()]
+
+    if len(dataset) < 10:
+        print(f"ERROR: muy pocos ejemplos para entrenar ({len(dataset)})")
+        return 1
+
+    random.Random(args.seed).shuffle(dataset)
+    split = int(len(dataset) * (1 - args.holdout))
+    train, holdout = dataset[:split], dataset[split:]
+
+    print(f"Ejemplos únicos: {len(dataset)} (train={len(train)}, holdout={len(holdout)})")
+    print(f"Distribución: {dict(Counter(intent for _, intent in dataset))}")
+
+    start = time.perf_counter()
+    model = IntentClassifier.train(
+        [text for text, _ in train],
+        [intent for _, intent in train],
+        epochs=args.epochs
+    )
+    print(f"Entrenado en {time.perf_counter() - start:.1f}s")
+
+    print(f"Exactitud train: {accuracy(model, *zip(*train)):.3f}")
+    if holdout:
+        print(f"Exactitud holdout: {accuracy(model, *zip(*holdout)):.3f}")
+        predictions = model.predict([text for text, _ in holdout])
+        confident = [
+            (label, intent) for (label, conf), (_, intent) in zip(predictions, holdout)
+            if label in {"debt", "otp"} and conf >= settings.INTENT_MODEL_THRESHOLD
+        ]
+        if confident:
+            precision = sum(label == intent for label, intent in confident) / len(confident)
+            print(
+                f"Sobre el umbral {settings.INTENT_MODEL_THRESHOLD}: "
+                f"{len(confident)}/{len(holdout)} resueltos localmente, precisión {precision:.3f}"
+            )
+
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    model.save(args.output)
+    print(f"Modelo guardado en {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
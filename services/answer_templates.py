@@ -0,0 +1,149 @@
+# Motor de respuestas con plantillas para preguntas estándar de deuda (sin llamar al LLM)
+import re
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from utils.parsing import normalize_message
+
+QUESTION_TOTAL = "total"
+QUESTION_DUE_DATE = "due_date"
+QUESTION_BREAKDOWN = "breakdown"
+QUESTION_STATUS = "status"
+
+# Preguntas abiertas (pagos, cuotas, reclamos...) que siempre van al LLM aunque mencionen la deuda.
+_FREE_FORM_RE = re.compile(
+    r"\b(puedo|podria|como|donde|por que|porque|cuotas?|fraccionar|refinanci\w*|descuento|"
+    r"reclamo|error|no reconozco|pague|abono|transferencia|cuenta|banco)\b"
+)
+
+# Orden de evaluación: de la categoría más específica a la más general.
+_QUESTION_PATTERNS = (
+    (QUESTION_BREAKDOWN, re.compile(
+        r"\b(desglose|detalle|detallado|intereses?|mora|penalidad|gastos|capital|compone)\b"
+    )),
+    (QUESTION_DUE_DATE, re.compile(
+        r"\b(vence|vencimiento|vencida|fecha|cuando|plazo)\b"
+    )),
+    (QUESTION_STATUS, re.compile(
+        r"\b(estado|situacion|al dia)\b"
+    )),
+    (QUESTION_TOTAL, re.compile(
+        r"\b(cuanto debo|cuanto es|cuanto tengo|total|monto|saldo|deuda|debo)\b"
+    )),
+)
+
+# Palabras que confirman que el mensaje trata de la deuda (para enrutar sin LLM).
+_DEBT_TOPIC_RE = re.compile(
+    r"\b(deuda|debo|saldo|prestamo|credito|vence|vencimiento|intereses?|mora|penalidad)\b"
+)
+
+# Razones que ya usa el router/heurística para las mismas preguntas.
+_REASON_HINTS = {
+    "total_debt": QUESTION_TOTAL,
+    "heuristic_debt": QUESTION_TOTAL,
+    "due_date": QUESTION_DUE_DATE,
+    "heuristic_due_date": QUESTION_DUE_DATE,
+}
+
+_TEMPLATES = {
+    QUESTION_TOTAL: "{name}: tu deuda total es S/ {total}{due_suffix}.",
+    QUESTION_DUE_DATE: "{name}: tu deuda vence el {due_date}. El total pendiente es S/ {total}.",
+    QUESTION_BREAKDOWN: "{name}: el detalle de tu deuda es {items}. Total: S/ {total}.",
+    QUESTION_STATUS: "{name}: el estado de tu deuda es {status}, con un total pendiente de S/ {total}.",
+}
+
+# Campos del desglose en el orden en que se muestran.
+_BREAKDOWN_FIELDS = (
+    ("Principal", "capital"),
+    ("Intereses", "intereses"),
+    ("Gastos", "gastos"),
+    ("Mora", "mora"),
+    ("Penalidad", "penalidad"),
+)
+
+
+def classify_debt_question(user_msg: str, reason: Optional[str] = None) -> Optional[str]:
+    """
+    Identifica la sub-intención de una pregunta de deuda.
+
+    Returns:
+        total / due_date / breakdown / status, o None si es una pregunta abierta
+    """
+    text = normalize_message(user_msg)
+    if _FREE_FORM_RE.search(text):
+        return None
+    for question_class, pattern in _QUESTION_PATTERNS:
+        if pattern.search(text):
+            return question_class
+    return _REASON_HINTS.get(reason or "")
+
+
+def standard_debt_question(user_msg: str) -> Optional[str]:
+    """
+    Sub-intención si el mensaje es, sin ambigüedad, una pregunta estándar de deuda.
+    Permite enrutar como 'debt' sin LLM cuando ya conocemos el DNI.
+    """
+    if not _DEBT_TOPIC_RE.search(normalize_message(user_msg)):
+        return None
+    return classify_debt_question(user_msg)
+
+
+def _money(value: Any) -> Optional[str]:
+    if value is None or value == "":
+        return None
+    try:
+        return f"{float(value):,.2f}"
+    except (TypeError, ValueError):
+        return str(value)
+
+
+def _date(value: Any) -> Optional[str]:
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value.strftime("%d/%m/%Y")
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).strftime("%d/%m/%Y")
+    except ValueError:
+        return str(value)
+
+
+def render_debt_answer(question_class: str, record: Dict[str, Any], display_name: str) -> Optional[str]:
+    """
+    Rellena la plantilla de la sub-intención con los datos de Azure.
+
+    Returns:
+        Respuesta final o None si faltan los campos que la plantilla necesita
+    """
+    total = _money(record.get("TotalDeuda"))
+    if total is None:
+        return None
+
+    if question_class == QUESTION_TOTAL:
+        due_date = _date(record.get("Vencimiento"))
+        due_suffix = f", con vencimiento el {due_date}" if due_date else ""
+        return _TEMPLATES[QUESTION_TOTAL].format(name=display_name, total=total, due_suffix=due_suffix)
+
+    if question_class == QUESTION_DUE_DATE:
+        due_date = _date(record.get("Vencimiento"))
+        if not due_date:
+            return None
+        return _TEMPLATES[QUESTION_DUE_DATE].format(name=display_name, due_date=due_date, total=total)
+
+    if question_class == QUESTION_BREAKDOWN:
+        items = [
+            f"{label} S/ {amount}"
+            for field, label in _BREAKDOWN_FIELDS
+            if (amount := _money(record.get(field))) is not None
+        ]
+        if not items:
+            return None
+        return _TEMPLATES[QUESTION_BREAKDOWN].format(name=display_name, items=", ".join(items), total=total)
+
+    if question_class == QUESTION_STATUS:
+        status = record.get("Estado")
+        if not status:
+            return None
+        return _TEMPLATES[QUESTION_STATUS].format(name=display_name, status=status, total=total)
+
+    return None
@@ -0,0 +1,181 @@
+# Clasificador local de intención: n-gramas de caracteres con hashing + modelo lineal en NumPy
+import logging
+import zlib
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.parsing import normalize_message
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_N_FEATURES = 2 ** 15
+DEFAULT_NGRAM_RANGE = (2, 4)
+
+
+def _hashed_ngrams(text: str, n_features: int, ngram_range: Tuple[int, int]) -> Tuple[np.ndarray, np.ndarray]:
+    """Índices y pesos (log-frecuencia normalizada L2) de los n-gramas de un texto."""
+    padded = f" {normalize_message(text)} "
+    low, high = ngram_range
+    counts: dict = {}
+    for n in range(low, high + 1):
+        for i in range(len(padded) - n + 1):
+            index = zlib.crc32(padded[i:i + n].encode("utf-8")) % n_features
+            counts[index] = counts.get(index, 0) + 1
+
+    if not counts:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+    indices = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+    values = np.log1p(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+    values /= np.linalg.norm(values)
+    return indices, values
+
+
+def featurize(
+    texts: Sequence[str],
+    n_features: int = DEFAULT_N_FEATURES,
+    ngram_range: Tuple[int, int] = DEFAULT_NGRAM_RANGE
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Convierte un lote de textos a una matriz dispersa en formato COO.
+
+    Returns:
+        (filas, columnas, valores) de las entradas no nulas
+    """
+    rows, cols, vals = [], [], []
+    for row, text in enumerate(texts):
+        indices, values = _hashed_ngrams(text, n_features, ngram_range)
+        rows.append(np.full(len(indices), row, dtype=np.int64))
+        cols.append(indices)
+        vals.append(values)
+
+    if not rows:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0, dtype=np.float32)
+    return np.concatenate(rows), np.concatenate(cols), np.concatenate(vals)
+
+
+def _softmax(scores: np.ndarray) -> np.ndarray:
+    scores = scores - scores.max(axis=1, keepdims=True)
+    exp = np.exp(scores)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+class IntentClassifier:
+    """Modelo lineal (regresión logística multinomial) sobre n-gramas con hashing."""
+
+    def __init__(
+        self,
+        weights: np.ndarray,
+        bias: np.ndarray,
+        labels: Sequence[str],
+        ngram_range: Tuple[int, int] = DEFAULT_NGRAM_RANGE
+    ):
+        self.weights = weights.astype(np.float32, copy=False)
+        self.bias = bias.astype(np.float32, copy=False)
+        self.labels = list(labels)
+        self.n_features = weights.shape[0]
+        self.ngram_range = tuple(ngram_range)
+
+    def _scores(self, rows: np.ndarray, cols: np.ndarray, vals: np.ndarray, n_rows: int) -> np.ndarray:
+        scores = np.tile(self.bias, (n_rows, 1))
+        np.add.at(scores, rows, self.weights[cols] * vals[:, None])
+        return scores
+
+    def predict_proba(self, texts: Sequence[str]) -> np.ndarray:
+        """Probabilidades por clase para un lote de textos (n_textos x n_clases)."""
+        rows, cols, vals = featurize(texts, self.n_features, self.ngram_range)
+        return _softmax(self._scores(rows, cols, vals, len(texts)))
+
+    def predict(self, texts: Sequence[str]) -> List[Tuple[str, float]]:
+        """Intención más probable y su confianza para cada texto del lote."""
+        if not texts:
+            return []
+        probs = self.predict_proba(texts)
+        best = probs.argmax(axis=1)
+        return [(self.labels[i], float(probs[row, i])) for row, i in enumerate(best)]
+
+    def save(self, path: str) -> None:
+        """Guarda el modelo como .npz (carga en milisegundos)."""
+        np.savez(
+            path,
+            weights=self.weights,
+            bias=self.bias,
+            labels=np.array(self.labels),
+            ngram_range=np.array(self.ngram_range)
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "IntentClassifier":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                weights=data["weights"],
+                bias=data["bias"],
+                labels=[str(label) for label in data["labels"]],
+                ngram_range=tuple(int(n) for n in data["ngram_range"])
+            )
+
+    @classmethod
+    def train(
+        cls,
+        texts: Sequence[str],
+        intents: Sequence[str],
+        *,
+        n_features: int = DEFAULT_N_FEATURES,
+        ngram_range: Tuple[int, int] = DEFAULT_NGRAM_RANGE,
+        epochs: int = 300,
+        learning_rate: float = 2.0,
+        l2: float = 1e-4
+    ) -> "IntentClassifier":
+        """
+        Entrena por descenso de gradiente (lote completo) sobre la matriz dispersa.
+
+        Args:
+            texts: Mensajes de entrenamiento
+            intents: Intención etiquetada para cada mensaje
+        """
+        labels = sorted(set(intents))
+        label_index = {label: i for i, label in enumerate(labels)}
+        targets = np.zeros((len(texts), len(labels)), dtype=np.float32)
+        targets[np.arange(len(texts)), [label_index[i] for i in intents]] = 1.0
+
+        rows, cols, vals = featurize(texts, n_features, ngram_range)
+        model = cls(
+            weights=np.zeros((n_features, len(labels)), dtype=np.float32),
+            bias=np.zeros(len(labels), dtype=np.float32),
+            labels=labels,
+            ngram_range=ngram_range
+        )
+
+        n = len(texts)
+        for _ in range(epochs):
+            error = (_softmax(model._scores(rows, cols, vals, n)) - targets) / n
+            grad = np.zeros_like(model.weights)
+            np.add.at(grad, cols, error[rows] * vals[:, None])
+            model.weights -= learning_rate * (grad + l2 * model.weights)
+            model.bias -= learning_rate * error.sum(axis=0)
+
+        return model
+
+
+def load_intent_classifier(path: Optional[str]) -> Optional[IntentClassifier]:
+    """Carga el modelo si está configurado; cualquier error deja el router en modo LLM."""
+    if not path:
+        return None
+    try:
+        model = IntentClassifier.load(path)
+        logger.info(f"Intent classifier loaded from {path} (labels: {model.labels})")
+        return model
+    except Exception as e:
+        logger.warning(f"Could not load intent classifier from {path}: {e}")
+        return None
+
+
+def accuracy(model: IntentClassifier, texts: Iterable[str], intents: Iterable[str]) -> float:
+    """Exactitud del modelo sobre un conjunto etiquetado."""
+    texts, intents = list(texts), list(intents)
+    if not texts:
+        return 0.0
+    predicted = [label for label, _ in model.predict(texts)]
+    return sum(p == t for p, t in zip(predicted, intents)) / len(texts)
@@ -1,7 +1,8 @@
-import pandas as pd
 from typing import Optional, Tuple
+from models.search_result import SearchResult
 from models.user_profile import UserProfile
-from clients.azure_client import search_debt_by_dni, search_otp_by_phone
+from clients.azure_client import SearchTimeoutError, search_debt_by_dni, search_otp_by_phone
+from utils.circuit_breaker import CircuitOpenError
 import logging
 
 logger = logging.getLogger(__name__)
@@ -9,37 +10,45 @@ logger = logging.getLogger(__name__)
 class MatchingService:
     """Servicio para hacer matching entre perfiles y Azure Search."""
     
-    def find_debt_info(self, profile: UserProfile) -> Optional[pd.DataFrame]:
+    async def find_debt_info(self, profile: UserProfile) -> Optional[SearchResult]:
         """Busca información de deuda usando DNI del perfil."""
         if not profile.dni:
             logger.warning(f"Profile {profile.contactId} has no DNI")
             return None
         
-        df = search_debt_by_dni(profile.dni)
+        try:
+            result = await search_debt_by_dni(profile.dni)
+        except (CircuitOpenError, SearchTimeoutError):
+            logger.warning(f"Azure Search unavailable, skipping debt match for {profile.contactId}")
+            return None
         
-        if df.empty:
+        if result.empty:
             logger.info(f"No debt found for DNI {profile.dni}")
             return None
         
-        logger.info(f"Debt info found for {profile.dni}: {len(df)} records")
-        return df
+        logger.info(f"Debt info found for {profile.dni}: {len(result)} records")
+        return result
     
-    def find_otp_code(self, profile: UserProfile) -> Optional[pd.DataFrame]:
+    async def find_otp_code(self, profile: UserProfile) -> Optional[SearchResult]:
         """Busca código OTP usando teléfono del perfil."""
         if not profile.phone:
             logger.warning(f"Profile {profile.contactId} has no phone")
             return None
         
-        df = search_otp_by_phone(profile.phone)
+        try:
+            result = await search_otp_by_phone(profile.phone)
+        except CircuitOpenError:
+            logger.warning(f"Azure Search unavailable, skipping OTP match for {profile.contactId}")
+            return None
         
-        if df.empty:
+        if result.empty:
             logger.info(f"No OTP found for phone {profile.phone}")
             return None
         
         logger.info(f"OTP found for {profile.phone}")
-        return df
+        return result
     
-    def auto_match_profile(self, profile: UserProfile) -> Tuple[bool, str]:
+    async def auto_match_profile(self, profile: UserProfile) -> Tuple[bool, str]:
         """
         Intenta hacer matching automático.
         
@@ -47,13 +56,13 @@ class MatchingService:
             (success, message)
         """
         if profile.dni:
-            df = self.find_debt_info(profile)
-            if df is not None and not df.empty:
+            result = await self.find_debt_info(profile)
+            if result is not None and not result.empty:
                 return (True, "debt_found")
         
         if profile.phone:
-            df = self.find_otp_code(profile)
-            if df is not None and not df.empty:
+            result = await self.find_otp_code(profile)
+            if result is not None and not result.empty:
                 return (True, "otp_found")
         
         return (False, "no_match")
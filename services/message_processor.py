@@ -1,16 +1,112 @@
+import asyncio
 import logging
-from typing import Dict, Any, Optional
+import re
+import time
+from typing import Dict, Any, Optional, Set, Tuple
 
-from services.router_service import route_message
-from services.rag_service import build_personalized_answer
-from services.session_service import get_session, save_session, set_pending_intent, clear_pending_intent
-from services.extraction_service import enrich_session_from_message, format_response_with_name
+from config.settings import settings
+from services.router_service import looks_like_debt_question, route_message, resolve_route_without_llm_async
+from services.rag_service import build_personalized_answer, route_and_answer_debt
+from services.answer_templates import standard_debt_question
+from services.session_service import get_session, save_session, mark_pending_intent, drop_pending_intent
+from services.profile_service import profile_service
+from services.extraction_service import (
+    enrich_session_from_message,
+    extract_dni,
+    extract_phone,
+    format_response_with_name
+)
 
-from clients.azure_client import search_debt_by_dni, search_otp_by_phone
+from clients.azure_client import SearchTimeoutError, search_debt_by_dni, search_otp_by_phone
+from clients.cosmos_client import async_cosmos_client
 from clients.respondio_client import respondio_client
+from utils import deadline, metrics
+from utils.circuit_breaker import CircuitOpenError
 
 logger = logging.getLogger(__name__)
 
+# Respuesta compuesta solo por dígitos (y separadores): un identificador incompleto
+_DIGITS_ONLY_RE = re.compile(r"[\d\s.\-]*\d[\d\s.\-]*")
+
+# Identificadores ya guardados en el perfil durable (para detectar los nuevos)
+_PROFILE_IDENTIFIERS_KEY = "profile_identifiers"
+_IDENTIFIER_FIELDS = ("dni", "phone")
+
+# Escrituras en segundo plano: se guarda la referencia hasta que terminan
+_background_tasks: Set[asyncio.Task] = set()
+
+
+class _Prefetch:
+    """
+    Búsqueda en Azure lanzada en paralelo al enrutamiento.
+
+    Si la intención coincide se usa su resultado; si no, se descarta sin
+    cancelarla (la búsqueda de deuda igual deja el resultado en caché).
+    """
+
+    def __init__(self, kind: str, key: str, coro):
+        self.kind = kind
+        self.key = key
+        self.used = False
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+        self.task = asyncio.ensure_future(self._run(coro))
+
+    async def _run(self, coro):
+        try:
+            return await coro
+        finally:
+            self.finished = time.perf_counter()
+
+    async def result(self):
+        """Espera el resultado y registra cuánta latencia se ahorró."""
+        self.used = True
+        requested = time.perf_counter()
+        result = await self.task
+        # Sin prefetch la búsqueda habría empezado ahora y tardado lo mismo
+        saved = min(self.finished - self.started, requested - self.started)
+        metrics.increment(f"prefetch.{self.kind}.hit")
+        metrics.observe(f"prefetch.{self.kind}.saved_ms", saved * 1000)
+        return result
+
+
+def _start_prefetches(session: Dict[str, Any], message_text: str) -> Dict[str, _Prefetch]:
+    """Lanza las búsquedas de los identificadores que trae el mensaje."""
+    prefetches: Dict[str, _Prefetch] = {}
+    if not settings.SPECULATIVE_PREFETCH_ENABLED:
+        return prefetches
+    
+    dni = session.get("dni")
+    if dni and extract_dni(message_text):
+        prefetches["debt"] = _Prefetch("debt", dni, search_debt_by_dni(dni))
+    
+    phone = session.get("phone")
+    if phone and extract_phone(message_text):
+        prefetches["otp"] = _Prefetch("otp", phone, search_otp_by_phone(phone))
+    
+    return prefetches
+
+
+def _discard_prefetches(prefetches: Dict[str, _Prefetch]) -> None:
+    for prefetch in prefetches.values():
+        if not prefetch.used:
+            metrics.increment(f"prefetch.{prefetch.kind}.discarded")
+            # Consumir el posible error (p. ej. circuito abierto) para no dejarlo sin recoger
+            prefetch.task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+
+async def _lookup(
+    kind: str,
+    key: str,
+    prefetches: Optional[Dict[str, _Prefetch]],
+    search
+):
+    """Usa el prefetch del mismo identificador si existe; si no, busca ahora."""
+    prefetch = (prefetches or {}).get(kind)
+    if prefetch is not None and not prefetch.used and prefetch.key == key:
+        return await prefetch.result()
+    return await search(key)
+
 async def process_message_for_webhook(event_data: Dict[str, Any]) -> None:
     """
     Procesa un evento message.received del webhook de Respond.io.
@@ -117,12 +213,13 @@ async def process_message_for_api(
     Procesa un mensaje desde el endpoint HTTP de la API.
     Usado por el endpoint REST.
     """
-    response_text = await process_message_internal(
-        contact_id=contact_id,
-        message_text=message_text,
-        contact_name=contact_name,
-        contact_phone=contact_phone
-    )
+    with deadline.turn_deadline():
+        response_text = await process_message_internal(
+            contact_id=contact_id,
+            message_text=message_text,
+            contact_name=contact_name,
+            contact_phone=contact_phone
+        )
     
     session = get_session(contact_id)
     
@@ -143,8 +240,10 @@ async def process_message_internal(
     
     logger.info(f"Processing message internally for {contact_id} via {channel_source}")
     
-    # 1. Obtener y enriquecer sesión
+    # 1. Obtener sesión (si venció, sembrarla desde el perfil) y enriquecerla
     session = get_session(contact_id)
+    if not session:
+        await _hydrate_session(contact_id, session)
     session["last_channel"] = channel_source
     
     session = enrich_session_from_message(
@@ -154,80 +253,306 @@ async def process_message_internal(
         contact_phone
     )
     
-    # 2. Enrutar mensaje
-    route = route_message(message_text)
+    # 2. Retomar la intención pendiente si este mensaje trae el dato que faltaba
+    response_text = await _resume_pending_intent(contact_id, session, message_text)
+    
+    # 3. Si no, enrutar y procesar según intención
+    if response_text is None:
+        response_text = await _route_and_process(contact_id, session, message_text)
+    
+    # 4. Personalizar con nombre preferido
+    response_text = format_response_with_name(session, response_text)  # Ahora pasa sesión completa
+    
+    # 5. Guardar sesión actualizada (y en segundo plano los identificadores nuevos en el perfil)
+    _persist_new_identifiers(contact_id, session, contact_name, contact_phone, channel_source)
+    save_session(contact_id, session)
+    
+    logger.info(f"Response ready for {contact_id} via {channel_source}")
+    return response_text
+
+async def _hydrate_session(contact_id: str, session: Dict[str, Any]) -> None:
+    """
+    Siembra una sesión nueva con DNI/teléfono/nombre del perfil durable.
+    
+    Evita volver a pedir el DNI a un cliente que ya lo dio cuando su sesión
+    de Redis venció (SESSION_TTL). La lectura se acota al presupuesto del
+    turno; si no llega a tiempo o Cosmos falla se sigue con la sesión vacía
+    y sin registrar identificadores conocidos (no se persisten en este turno).
+    """
+    if not settings.SESSION_HYDRATION_ENABLED or not async_cosmos_client._is_configured():
+        return
+    
+    timeout = deadline.stage_timeout(settings.SESSION_HYDRATION_TIMEOUT)
+    try:
+        if timeout <= 0:
+            raise asyncio.TimeoutError
+        profile = await asyncio.wait_for(async_cosmos_client.get_profile(contact_id), timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"Profile load timed out for {contact_id}, continuing without it")
+        metrics.increment("session.hydration_timeout")
+        return
+    except Exception as e:
+        logger.warning(f"Profile load failed for {contact_id}, continuing without it: {e}")
+        metrics.increment("session.hydration_error")
+        return
+    
+    session[_PROFILE_IDENTIFIERS_KEY] = {
+        field: profile.get(field) for field in _IDENTIFIER_FIELDS if profile and profile.get(field)
+    }
+    if not profile:
+        metrics.increment("session.hydration_miss")
+        return
+    
+    for key, field in (("dni", "dni"), ("phone", "phone"), ("name", "firstName")):
+        if profile.get(field):
+            session[key] = profile[field]
+    metrics.increment("session.hydrated")
+    logger.info(f"Session hydrated from profile for {contact_id}: {list(session[_PROFILE_IDENTIFIERS_KEY])}")
+
+def _persist_new_identifiers(
+    contact_id: str,
+    session: Dict[str, Any],
+    contact_name: Optional[str],
+    contact_phone: Optional[str],
+    channel_source: str
+) -> None:
+    """
+    Lanza en segundo plano el guardado en el perfil de los identificadores
+    capturados en esta sesión, sin demorar la respuesta.
+    
+    Solo aplica a sesiones sembradas con `_hydrate_session`, que registran
+    qué identificadores ya estaban guardados.
+    """
+    known = session.get(_PROFILE_IDENTIFIERS_KEY)
+    if known is None:
+        return
+    captured = {
+        field: session[field] for field in _IDENTIFIER_FIELDS
+        if session.get(field) and session[field] != known.get(field)
+    }
+    if not captured:
+        return
+    
+    known.update(captured)
+    task = asyncio.create_task(_save_identifiers(
+        contact_id,
+        captured,
+        {"firstName": contact_name, "phone": contact_phone},
+        {"source": channel_source}
+    ))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+async def drain_background_tasks() -> None:
+    """Espera las escrituras en segundo plano pendientes (al apagar el proceso)."""
+    if _background_tasks:
+        logger.info(f"Waiting for {len(_background_tasks)} background profile writes")
+        await asyncio.gather(*_background_tasks, return_exceptions=True)
+
+async def _save_identifiers(
+    contact_id: str,
+    identifiers: Dict[str, str],
+    contact_data: Dict[str, Any],
+    channel_data: Dict[str, Any]
+) -> None:
+    try:
+        await profile_service.save_identifiers(contact_id, identifiers, contact_data, channel_data)
+        metrics.increment("session.identifiers_persisted")
+    except Exception as e:
+        logger.warning(f"Could not persist identifiers for {contact_id}: {e}")
+        metrics.increment("session.identifiers_failed")
+
+async def _resume_pending_intent(
+    contact_id: str,
+    session: Dict[str, Any],
+    message_text: str
+) -> Optional[str]:
+    """
+    Responde la pregunta pendiente sin pasar por el router.
+    
+    Cuando pedimos el DNI (o el celular) y el usuario responde solo con el
+    dato, enrutar ese número lo clasificaría como 'general'. Si el mensaje
+    trae el identificador que faltaba, se retoma la pregunta original.
+    
+    Returns:
+        Respuesta o None si hay que enrutar el mensaje normalmente
+    """
+    pending = session.get("pending_intent")
+    pending_msg = session.get("pending_user_msg")
+    if not pending or not pending_msg:
+        return None
+    
+    reason = session.get("pending_reason")
+    route = {"intent": pending, "requires_identity": True, "reason": reason}
+    only_digits = bool(_DIGITS_ONLY_RE.fullmatch(message_text))
+    
+    if pending == "debt":
+        if extract_dni(message_text):
+            logger.info(f"Resuming pending debt question for {contact_id}")
+            metrics.increment("route.pending_resumed")
+            return await _process_debt_intent(contact_id, session, pending_msg, route, reason)
+        if only_digits:
+            return "Necesito un DNI válido de 8 dígitos."
+    
+    elif pending == "otp":
+        if extract_phone(message_text):
+            logger.info(f"Resuming pending OTP question for {contact_id}")
+            metrics.increment("route.pending_resumed")
+            return await _process_otp_intent(contact_id, session, pending_msg, route, reason)
+        if only_digits:
+            return "Recuerda que el número debe tener 9 dígitos y empezar en 9."
+    
+    return None
+
+async def _route_and_process(
+    contact_id: str,
+    session: Dict[str, Any],
+    message_text: str
+) -> str:
+    """Enruta el mensaje y genera la respuesta según la intención."""
+    # Las búsquedas en Azure corren mientras se resuelve la ruta
+    prefetches = _start_prefetches(session, message_text)
+    try:
+        return await _route_and_answer(contact_id, session, message_text, prefetches)
+    finally:
+        _discard_prefetches(prefetches)
+
+async def _route_and_answer(
+    contact_id: str,
+    session: Dict[str, Any],
+    message_text: str,
+    prefetches: Dict[str, _Prefetch]
+) -> str:
+    # Si ya conocemos el DNI, enrutar y responder en una sola llamada
+    route, combined_answer = await _route_turn(session, message_text, prefetches)
     intent = route.get("intent", "general")
     requires_identity = route.get("requires_identity", False)
     reason = route.get("reason")
     
     logger.info(f"Intent: {intent}, requires_identity: {requires_identity}")
     
-    response_text = ""
-    
-    # 3. Procesar según intención
     if intent == "general" or not requires_identity:
-        response_text = route.get("concise_answer", "¿En qué puedo ayudarte?")
-        clear_pending_intent(contact_id)
+        drop_pending_intent(session)
+        return route.get("concise_answer", "¿En qué puedo ayudarte?")
     
-    elif intent == "debt":
-        response_text = await _process_debt_intent(
-            contact_id, session, message_text, route, reason
-        )
+    if intent == "debt" and combined_answer:
+        drop_pending_intent(session)
+        return combined_answer
     
-    elif intent == "otp":
-        response_text = await _process_otp_intent(
-            contact_id, session, message_text, route, reason
+    if intent == "debt":
+        return await _process_debt_intent(
+            contact_id, session, message_text, route, reason, prefetches
         )
     
-    else:
-        response_text = "Puedo ayudarte con consultas de deuda o claves OTP. ¿Qué necesitas?"
-        clear_pending_intent(contact_id)
+    if intent == "otp":
+        return await _process_otp_intent(
+            contact_id, session, message_text, route, reason, prefetches
+        )
     
-    # 4. Personalizar con nombre preferido
-    response_text = format_response_with_name(session, response_text)  # Ahora pasa sesión completa
+    drop_pending_intent(session)
+    return "Puedo ayudarte con consultas de deuda o claves OTP. ¿Qué necesitas?"
+
+async def _route_turn(
+    session: Dict[str, Any],
+    message_text: str,
+    prefetches: Optional[Dict[str, _Prefetch]] = None
+) -> Tuple[Dict[str, Any], Optional[str]]:
+    """
+    Obtiene la ruta del mensaje y, cuando es posible, también la respuesta de deuda.
     
-    # 5. Guardar sesión actualizada
-    save_session(contact_id, session)
+    Si la sesión ya tiene DNI, la ruta no se resuelve sin LLM y el mensaje parece
+    una consulta de deuda, consulta Azure y hace una sola llamada al LLM que
+    devuelve intención y respuesta. Si la intención no es deuda o algo falla, se
+    usa la ruta obtenida (o route_message) y el flujo normal continúa.
     
-    logger.info(f"Response ready for {contact_id} via {channel_source}")
-    return response_text
+    Returns:
+        (ruta, respuesta combinada o None)
+    """
+    dni = session.get("dni")
+    # Caché y modelo local ya consultados en este turno (route_message no los repite)
+    checked = False
+    if (
+        settings.COMBINED_ROUTE_ANSWER_ENABLED
+        and dni
+        and not session.get("pending_intent")
+    ):
+        if (resolved := await resolve_route_without_llm_async(message_text)) is not None:
+            return resolved, None
+        checked = True
+        
+        # Pregunta estándar de deuda: la responde una plantilla, no hace falta el LLM
+        if question_class := standard_debt_question(message_text):
+            metrics.increment("route.template_debt")
+            return {"intent": "debt", "requires_identity": True, "reason": question_class}, None
+        
+        if not deadline.can_call_llm():
+            return await route_message(message_text, resolve=False), None
+        
+        # Saludos, agradecimientos u OTP: sin consulta a Azure ni datos de deuda en el prompt
+        if not looks_like_debt_question(message_text):
+            metrics.increment("route.combined.skipped")
+            return await route_message(message_text, resolve=False), None
+        
+        try:
+            result = await _lookup("debt", dni, prefetches, search_debt_by_dni)
+            combined = await route_and_answer_debt(message_text, result, session)
+        except Exception as e:
+            logger.warning(f"Combined routing failed, using regular flow: {e}")
+            combined = None
+        
+        if combined:
+            answer = combined.pop("answer", "")
+            if combined.get("intent") == "debt" and answer:
+                combined["requires_identity"] = True
+                metrics.increment("route.combined.answered")
+                return combined, answer
+            metrics.increment("route.combined.other_intent")
+            # No se cachea: la ruta salió de otro prompt y con los datos de deuda de este contacto
+            return combined, None
+        metrics.increment("route.combined.fallback")
+    
+    return await route_message(message_text, resolve=not checked), None
 
 async def _process_debt_intent(
     contact_id: str,
     session: Dict[str, Any],
     message_text: str,
     route: Dict[str, Any],
-    reason: Optional[str]
+    reason: Optional[str],
+    prefetches: Optional[Dict[str, _Prefetch]] = None
 ) -> str:
     """Procesa deuda con fallback graceful."""
     
     dni = session.get("dni")
     
     if not dni:
-        set_pending_intent(contact_id, "debt", reason, message_text)
+        mark_pending_intent(session, "debt", reason, message_text)
         return route.get("followup_question", "Para consultar tu deuda, necesito tu DNI (8 dígitos).")
     
     logger.info(f"Searching debt for DNI: {dni}")
     
     try:
-        df = search_debt_by_dni(dni)
+        result = await _lookup("debt", dni, prefetches, search_debt_by_dni)
         
-        if df.empty:
-            clear_pending_intent(contact_id)
+        if result.empty:
+            drop_pending_intent(session)
             return f"No encontré información para el DNI {dni}. Por favor verifica que sea correcto."
         
-        clear_pending_intent(contact_id)
-        return build_personalized_answer(
+        drop_pending_intent(session)
+        return await build_personalized_answer(
             message_text,
-            df,
+            result,
             session,
             reason,
             intent="debt"
         )
     
     except Exception as e:
-        logger.exception(f"Error processing debt intent: {e}")
-        clear_pending_intent(contact_id)
+        if isinstance(e, (CircuitOpenError, SearchTimeoutError)):
+            logger.warning(f"Debt lookup unavailable: {e}")
+        else:
+            logger.exception(f"Error processing debt intent: {e}")
+        drop_pending_intent(session)
         # P1-2: Respuesta de fallback en lugar de error genérico
         display_name = session.get("preferred_name") or session.get("name") or "Disculpa"
         return (
@@ -241,32 +566,33 @@ async def _process_otp_intent(
     session: Dict[str, Any],
     message_text: str,
     route: Dict[str, Any],
-    reason: Optional[str]
+    reason: Optional[str],
+    prefetches: Optional[Dict[str, _Prefetch]] = None
 ) -> str:
     """Procesa OTP con fallback graceful."""
     
     phone = session.get("phone")
     
     if not phone:
-        set_pending_intent(contact_id, "otp", reason, message_text)
+        mark_pending_intent(session, "otp", reason, message_text)
         return route.get("followup_question", "Para encontrar tu clave OTP, necesito tu número de celular (9 dígitos).")
     
     logger.info(f"Searching OTP for phone: {phone}")
     
     try:
-        df = search_otp_by_phone(phone)
+        result = await _lookup("otp", phone, prefetches, search_otp_by_phone)
         
-        if df.empty:
-            clear_pending_intent(contact_id)
+        if result.empty:
+            drop_pending_intent(session)
             return (
                 f"No encontré una clave OTP activa para el número que termina en {phone[-4:]}. "
                 f"¿Es correcto este número?"
             )
         
-        clear_pending_intent(contact_id)
-        return build_personalized_answer(
+        drop_pending_intent(session)
+        return await build_personalized_answer(
             message_text,
-            df,
+            result,
             session,
             reason,
             intent="otp",
@@ -274,8 +600,11 @@ async def _process_otp_intent(
         )
     
     except Exception as e:
-        logger.exception(f"Error processing OTP intent: {e}")
-        clear_pending_intent(contact_id)
+        if isinstance(e, CircuitOpenError):
+            logger.warning(f"OTP lookup skipped: {e}")
+        else:
+            logger.exception(f"Error processing OTP intent: {e}")
+        drop_pending_intent(session)
         # P1-2: Respuesta de fallback
         display_name = session.get("preferred_name") or session.get("name") or "Disculpa"
         return (
@@ -1,15 +1,26 @@
 import logging
+from datetime import datetime
 from typing import Optional, Dict, Any
-from clients.cosmos_client import cosmos_client
+from azure.cosmos import exceptions
+from clients.cosmos_client import async_cosmos_client
+from config.settings import settings
 from models.user_profile import UserProfile
+from services.profile_writer import profile_writer
 from services.extraction_service import extract_dni, extract_phone
 
 logger = logging.getLogger(__name__)
 
+# Campos que cambian en cada mensaje: se actualizan con patch, sin reemplazar el documento
+_ACTIVITY_FIELDS = {"totalMessages", "lastInteractionAt", "updatedAt"}
+
+def _document_state(profile: UserProfile) -> Dict[str, Any]:
+    """Campos del perfil que obligan a reescribir el documento completo si cambian."""
+    return profile.model_dump(exclude=_ACTIVITY_FIELDS)
+
 class ProfileService:
     """Servicio para gestionar perfiles de usuario."""
     
-    def load_or_create_profile(
+    async def load_or_create_profile(
         self, 
         contact_id: str,
         contact_data: Dict[str, Any],
@@ -17,12 +28,21 @@ class ProfileService:
     ) -> UserProfile:
         """
         Carga perfil existente o crea uno nuevo.
+        
+        Un error de Cosmos al leer se propaga: crear un perfil en blanco
+        pisaría el documento real.
         """
-        # Intentar cargar de Cosmos DB
-        profile_data = cosmos_client.get_profile(contact_id)
+        # Cambios aún en el buffer de escritura o, si no hay, Cosmos DB
+        profile_data = None
+        if settings.PROFILE_WRITE_BEHIND_ENABLED:
+            profile_data = profile_writer.pending_document(contact_id)
+        if not profile_data:
+            profile_data = await async_cosmos_client.get_profile(contact_id)
         
         if profile_data:
             profile = UserProfile(**profile_data)
+            profile._persisted_state = _document_state(profile)
+            profile._etag = profile_data.get("_etag")
             logger.info(f"Profile loaded for {contact_id}")
         else:
             # Crear nuevo perfil
@@ -67,16 +87,120 @@ class ProfileService:
         """
         return bool(profile.dni or profile.phone)
     
-    def save_profile(self, profile: UserProfile) -> None:
+    async def save_profile(self, profile: UserProfile) -> None:
         """
         Guarda perfil en Cosmos DB.
+        
+        Con write-behind activo el cambio se acumula en Redis (ver
+        services/profile_writer.py). Si no, cuando solo cambiaron el contador y
+        las marcas de tiempo se aplica un patch (incremento atómico); el upsert
+        completo queda para perfiles nuevos o con cambios de identidad/datos.
         """
-        from datetime import datetime
-        profile.updatedAt = datetime.utcnow()
+        now = datetime.utcnow()
+        profile.updatedAt = now
         profile.totalMessages += 1
-        profile.lastInteractionAt = datetime.utcnow()
+        profile.lastInteractionAt = now
+        
+        state = _document_state(profile)
+        full = profile._persisted_state is None or state != profile._persisted_state
         
-        cosmos_client.upsert_profile(profile.model_dump())
+        # Write-behind: el cambio se agrupa en Redis y se aplica en el próximo vaciado
+        if settings.PROFILE_WRITE_BEHIND_ENABLED and profile_writer.buffer(profile, full):
+            profile._persisted_state = state
+            logger.info(f"Profile changes buffered for {profile.contactId}")
+            return
+        
+        if not full:
+            updated = await async_cosmos_client.patch_profile(profile.contactId, [
+                {"op": "incr", "path": "/totalMessages", "value": 1},
+                {"op": "set", "path": "/lastInteractionAt", "value": now.isoformat()},
+                {"op": "set", "path": "/updatedAt", "value": now.isoformat()},
+            ])
+            if updated is not None:
+                profile.totalMessages = updated.get("totalMessages", profile.totalMessages)
+                # El patch genera una versión nueva: sin esto el próximo upsert falla por etag
+                profile._etag = updated.get("_etag")
+                logger.info(f"Profile activity patched for {profile.contactId}")
+                return
+        
+        try:
+            saved = await async_cosmos_client.upsert_profile(profile.model_dump(), etag=profile._etag)
+        except exceptions.CosmosAccessConditionFailedError:
+            # Otro proceso escribió el perfil: se reaplican nuestros cambios sobre la versión actual
+            saved = await self._rebase_and_save(profile, state)
+        
+        profile._etag = saved.get("_etag")
+        profile._persisted_state = state
         logger.info(f"Profile saved for {profile.contactId}")
+    
+    async def save_identifiers(
+        self,
+        contact_id: str,
+        identifiers: Dict[str, str],
+        contact_data: Dict[str, Any],
+        channel_data: Dict[str, Any]
+    ) -> bool:
+        """
+        Guarda en el perfil el DNI/teléfono capturados en la conversación
+        (sin contarlo como mensaje).
+        
+        Args:
+            contact_id: Contact ID
+            identifiers: Campos del perfil a fijar, p. ej. {"dni": "12345678"}
+            contact_data: Datos del contacto si hay que crear el perfil
+            channel_data: Canal de origen si hay que crear el perfil
+            
+        Returns:
+            True si el perfil cambió
+        """
+        profile = await self.load_or_create_profile(contact_id, contact_data, channel_data)
+        changes = {key: value for key, value in identifiers.items() if value and getattr(profile, key) != value}
+        if not changes:
+            return False
+        
+        for key, value in changes.items():
+            setattr(profile, key, value)
+        profile.updatedAt = datetime.utcnow()
+        state = _document_state(profile)
+        
+        if settings.PROFILE_WRITE_BEHIND_ENABLED and profile_writer.buffer(profile, full=True, messages=0):
+            profile._persisted_state = state
+            return True
+        
+        try:
+            saved = await async_cosmos_client.upsert_profile(profile.model_dump(), etag=profile._etag)
+        except exceptions.CosmosAccessConditionFailedError:
+            saved = await self._rebase_and_save(profile, state, messages=0)
+        profile._etag = saved.get("_etag")
+        profile._persisted_state = state
+        logger.info(f"Profile identifiers saved for {contact_id}: {list(changes)}")
+        return True
+    
+    async def _rebase_and_save(
+        self,
+        profile: UserProfile,
+        state: Dict[str, Any],
+        messages: int = 1
+    ) -> Dict[str, Any]:
+        """
+        Aplica los campos que cambiaron en este turno sobre el documento
+        actual de Cosmos y lo guarda condicionado a su nuevo ETag.
+        """
+        current = await async_cosmos_client.get_profile(profile.contactId)
+        if not current:
+            return await async_cosmos_client.upsert_profile(profile.model_dump())
+        
+        persisted = profile._persisted_state or {}
+        changes = {key: value for key, value in state.items() if persisted.get(key) != value}
+        document = {
+            **current,
+            **changes,
+            "totalMessages": current.get("totalMessages", 0) + messages,
+            "lastInteractionAt": profile.lastInteractionAt,
+            "updatedAt": profile.updatedAt,
+        }
+        saved = await async_cosmos_client.upsert_profile(document, etag=current.get("_etag"))
+        profile.totalMessages = saved.get("totalMessages", profile.totalMessages)
+        return saved
 
 profile_service = ProfileService()
@@ -0,0 +1,309 @@
+# Escritura diferida (write-behind) de perfiles: agrupa en Redis los cambios por contacto
+# y los aplica en Cosmos DB por intervalos o al superar un umbral de contactos pendientes
+import asyncio
+import json
+import logging
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+from redis.exceptions import WatchError
+
+from clients.cosmos_client import _serialize_for_cosmos, async_cosmos_client
+from clients.queue_client import get_redis_client
+from config.settings import settings
+from models.user_profile import UserProfile
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+DIRTY_KEY = "profile:dirty"
+PENDING_PREFIX = "profile:pending:"
+INFLIGHT_PREFIX = "profile:inflight:"
+LOCK_PREFIX = "profile:lock:"
+
+
+class ProfileWriteBehind:
+    """
+    Buffer de escrituras de perfiles respaldado en Redis.
+
+    Por contacto se guarda un hash con los mensajes acumulados, las últimas
+    marcas de tiempo y, si hubo cambios de identidad/datos, el documento
+    completo más reciente. Al vaciarlo, cada contacto se mueve con RENAMENX a
+    una clave "inflight" y solo se borra cuando Cosmos confirma la escritura.
+    La app y el worker vacían el mismo Redis, así que cada contacto se toma
+    con un lock (SET NX con expiración): solo su dueño toca la clave
+    inflight. Si el proceso se cae a mitad, el lock expira y la escritura
+    pendiente se retoma en el siguiente vaciado.
+    """
+
+    def __init__(self):
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def buffer(self, profile: UserProfile, full: bool, messages: int = 1) -> bool:
+        """
+        Registra `messages` mensajes del perfil (y el documento completo si `full`).
+
+        Returns:
+            False si Redis no está disponible (el llamador escribe directo)
+        """
+        key = f"{PENDING_PREFIX}{profile.contactId}"
+        fields = {
+            "lastInteractionAt": profile.lastInteractionAt.isoformat() if profile.lastInteractionAt else "",
+            "updatedAt": profile.updatedAt.isoformat(),
+        }
+        if full:
+            fields["document"] = json.dumps(_serialize_for_cosmos(profile.model_dump()), default=str)
+
+        try:
+            pipe = get_redis_client().pipeline(transaction=True)
+            pipe.hincrby(key, "messages", messages)
+            pipe.hset(key, mapping=fields)
+            pipe.sadd(DIRTY_KEY, profile.contactId)
+            pipe.scard(DIRTY_KEY)
+            *_, dirty = pipe.execute()
+        except Exception as e:
+            logger.warning(f"Write-behind buffer unavailable for {profile.contactId}: {e}")
+            return False
+
+        metrics.increment("profile_writes.buffered")
+        if dirty >= settings.PROFILE_FLUSH_MAX_PENDING and self._wake is not None:
+            self._wake.set()
+        return True
+
+    def pending_document(self, contact_id: str) -> Optional[Dict[str, Any]]:
+        """Documento completo aún no escrito en Cosmos (para leer lo propio antes del vaciado)."""
+        try:
+            client = get_redis_client()
+            raw = (
+                client.hget(f"{PENDING_PREFIX}{contact_id}", "document")
+                or client.hget(f"{INFLIGHT_PREFIX}{contact_id}", "document")
+            )
+        except Exception:
+            return None
+        return json.loads(raw) if raw else None
+
+    def _lock(self, contact_id: str) -> Optional[str]:
+        """Toma el lock del contacto; devuelve el token del dueño o None si otro proceso lo tiene."""
+        token = uuid.uuid4().hex
+        acquired = get_redis_client().set(
+            f"{LOCK_PREFIX}{contact_id}", token, nx=True, ex=settings.PROFILE_FLUSH_LOCK_TTL
+        )
+        return token if acquired else None
+
+    def _unlock(self, contact_id: str, token: str) -> None:
+        """Libera el lock solo si sigue siendo nuestro (pudo expirar y tomarlo otro)."""
+        key = f"{LOCK_PREFIX}{contact_id}"
+        with get_redis_client().pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                if pipe.get(key) == token:
+                    pipe.multi()
+                    pipe.delete(key)
+                    pipe.execute()
+            except WatchError:
+                pass
+
+    def _claim(self, contact_id: str) -> Optional[Dict[str, str]]:
+        """Mueve los cambios pendientes a la clave inflight y los devuelve (con el lock tomado)."""
+        client = get_redis_client()
+        pending = f"{PENDING_PREFIX}{contact_id}"
+        inflight = f"{INFLIGHT_PREFIX}{contact_id}"
+        try:
+            if not client.renamenx(pending, inflight):
+                # Quedó una escritura a medias de un dueño cuyo lock expiró:
+                # se procesa primero y lo nuevo sigue pendiente
+                client.sadd(DIRTY_KEY, contact_id)
+        except Exception:
+            # RENAMENX falla si no hay nada pendiente para el contacto
+            pass
+        return client.hgetall(inflight) or None
+
+    def _release(self, contact_id: str, data: Dict[str, str], success: bool) -> None:
+        """Borra la clave inflight; si la escritura falló, devuelve los cambios al buffer."""
+        client = get_redis_client()
+        pending = f"{PENDING_PREFIX}{contact_id}"
+        pipe = client.pipeline(transaction=True)
+        if not success:
+            # Lo pendiente es más reciente: solo se completa lo que falte
+            pipe.hincrby(pending, "messages", int(data.get("messages") or 0))
+            for field in ("lastInteractionAt", "updatedAt", "document"):
+                if data.get(field):
+                    pipe.hsetnx(pending, field, data[field])
+            pipe.sadd(DIRTY_KEY, contact_id)
+        pipe.delete(f"{INFLIGHT_PREFIX}{contact_id}")
+        pipe.execute()
+
+    async def _write(self, contact_id: str, data: Dict[str, str]) -> None:
+        """Aplica en Cosmos los cambios acumulados de un contacto (patch y, si hace falta, upsert)."""
+        messages = int(data.get("messages") or 0)
+        last_interaction = data.get("lastInteractionAt") or None
+        updated_at = data.get("updatedAt") or None
+
+        operations = []
+        if messages:
+            operations.append({"op": "incr", "path": "/totalMessages", "value": messages})
+        if last_interaction:
+            operations.append({"op": "set", "path": "/lastInteractionAt", "value": last_interaction})
+        if updated_at:
+            operations.append({"op": "set", "path": "/updatedAt", "value": updated_at})
+
+        patched = await async_cosmos_client.patch_profile(contact_id, operations) if operations else None
+        # El incremento ya está aplicado: si el upsert falla solo se reintenta el documento
+        data["messages"] = "0"
+
+        if data.get("document"):
+            document: Dict[str, Any] = json.loads(data["document"])
+            # El contador real es el de Cosmos tras el incremento (o el acumulado si el perfil es nuevo)
+            if patched:
+                document["totalMessages"] = patched.get("totalMessages", messages)
+            else:
+                document["totalMessages"] = max(messages, document.get("totalMessages") or 0)
+            document["lastInteractionAt"] = last_interaction or document.get("lastInteractionAt")
+            document["updatedAt"] = updated_at or document.get("updatedAt")
+            # Condicionado a la versión recién parcheada: si otro proceso escribe en medio, se reintenta
+            await async_cosmos_client.upsert_profile(document, etag=patched.get("_etag") if patched else None)
+        elif patched is None and operations:
+            logger.warning(f"Buffered activity dropped for missing profile {contact_id}")
+
+        metrics.increment("profile_writes.flushed")
+        metrics.increment("profile_writes.coalesced", max(0, messages - 1))
+
+    async def _flush_contact(self, contact_id: str, semaphore: asyncio.Semaphore) -> bool:
+        """
+        Returns:
+            False si el contacto quedó pendiente porque otro proceso tiene su lock
+        """
+        async with semaphore:
+            try:
+                token = self._lock(contact_id)
+                if token is None:
+                    # Otro proceso está escribiendo este contacto: se reintenta en el próximo vaciado
+                    get_redis_client().sadd(DIRTY_KEY, contact_id)
+                    metrics.increment("profile_writes.locked")
+                    return False
+            except Exception as e:
+                logger.warning(f"Could not lock buffered profile {contact_id}: {e}")
+                return True
+            try:
+                data = self._claim(contact_id)
+                if not data:
+                    return True
+                try:
+                    await self._write(contact_id, data)
+                    success = True
+                except Exception as e:
+                    logger.warning(f"Profile flush failed for {contact_id}, will retry: {e}")
+                    metrics.increment("profile_writes.failed")
+                    success = False
+                self._release(contact_id, data, success)
+            except Exception as e:
+                logger.warning(f"Could not claim buffered profile {contact_id}: {e}")
+            finally:
+                self._unlock(contact_id, token)
+            return True
+
+    async def flush(self, max_contacts: Optional[int] = None) -> int:
+        """
+        Vacía hasta `max_contacts` contactos pendientes con escrituras concurrentes.
+
+        Returns:
+            Cantidad de contactos procesados (sin contar los que tenían el
+            lock tomado por otro proceso y volvieron a quedar pendientes)
+        """
+        try:
+            client = get_redis_client()
+            contact_ids = client.spop(DIRTY_KEY, max_contacts or settings.PROFILE_FLUSH_MAX_PENDING) or []
+            metrics.set_gauge("profile_writes.dirty", client.scard(DIRTY_KEY))
+        except Exception as e:
+            logger.warning(f"Write-behind flush skipped, Redis unavailable: {e}")
+            return 0
+
+        if contact_ids:
+            # El SDK de Python no tiene ejecutor bulk: patches concurrentes acotados
+            semaphore = asyncio.Semaphore(settings.PROFILE_FLUSH_CONCURRENCY)
+            return sum(await asyncio.gather(*(self._flush_contact(cid, semaphore) for cid in contact_ids)))
+        return 0
+
+    def recover(self) -> int:
+        """
+        Vuelve a marcar como pendientes las escrituras que quedaron inflight
+        por una caída (las que ya no tienen lock vigente). El siguiente
+        vaciado toma el lock y aplica la clave inflight antes que lo nuevo.
+        """
+        client = get_redis_client()
+        recovered = 0
+        for key in client.scan_iter(match=f"{INFLIGHT_PREFIX}*"):
+            contact_id = key[len(INFLIGHT_PREFIX):]
+            if client.exists(f"{LOCK_PREFIX}{contact_id}"):
+                # Un proceso vivo la está escribiendo
+                continue
+            client.sadd(DIRTY_KEY, contact_id)
+            recovered += 1
+        if recovered:
+            logger.info(f"Recovered {recovered} in-flight profile writes")
+        return recovered
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=settings.PROFILE_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.exception(f"Profile write-behind flush error: {e}")
+
+    def start(self) -> None:
+        """Inicia el ciclo de vaciado (llamar dentro del event loop)."""
+        if self._task is not None or not settings.PROFILE_WRITE_BEHIND_ENABLED:
+            return
+        try:
+            self.recover()
+        except Exception as e:
+            logger.warning(f"Could not recover in-flight profile writes: {e}")
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def drain(self, timeout: float = settings.PROFILE_DRAIN_TIMEOUT) -> None:
+        """
+        Detiene el ciclo y escribe lo pendiente (al apagar el proceso) durante
+        hasta `timeout` segundos. Si solo quedan contactos con el lock tomado
+        por otro proceso se espera con backoff; lo que no alcance a escribirse
+        queda en Redis para el próximo vaciado o `recover`.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if not settings.PROFILE_WRITE_BEHIND_ENABLED:
+            return
+        deadline = time.monotonic() + timeout
+        backoff = 0.1
+        while True:
+            processed = await self.flush()
+            try:
+                pending = get_redis_client().scard(DIRTY_KEY)
+            except Exception:
+                return
+            if not pending:
+                return
+            left = deadline - time.monotonic()
+            if left <= 0:
+                logger.warning(f"Profile drain timed out, {pending} contacts left for the next flush")
+                return
+            if processed:
+                backoff = 0.1
+            else:
+                # Solo quedan contactos bloqueados por otro proceso
+                await asyncio.sleep(min(backoff, left))
+                backoff = min(backoff * 2, 2.0)
+
+
+profile_writer = ProfileWriteBehind()
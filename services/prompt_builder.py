@@ -0,0 +1,93 @@
+# Construcción de payloads compactos para los prompts de deuda
+import logging
+from typing import Any, Dict, List, Optional, Sequence
+
+from services.answer_templates import (
+    QUESTION_BREAKDOWN,
+    QUESTION_DUE_DATE,
+    QUESTION_STATUS,
+    QUESTION_TOTAL,
+)
+
+logger = logging.getLogger(__name__)
+
+# Todos los campos (renombrados) que puede usar una pregunta abierta, por prioridad.
+_ALL_FIELDS = (
+    "TotalDeuda",
+    "Vencimiento",
+    "Estado",
+    "Monto",
+    "Principal",
+    "Intereses",
+    "Gastos",
+    "Mora",
+    "Penalidad",
+)
+
+# Campos que necesita cada tipo de pregunta.
+_FIELDS_BY_CLASS = {
+    QUESTION_TOTAL: ("TotalDeuda", "Vencimiento", "Estado"),
+    QUESTION_DUE_DATE: ("Vencimiento", "TotalDeuda"),
+    QUESTION_BREAKDOWN: ("TotalDeuda", "Principal", "Intereses", "Gastos", "Mora", "Penalidad"),
+    QUESTION_STATUS: ("Estado", "TotalDeuda", "Vencimiento"),
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimación rápida (~4 caracteres por token) para no depender de un tokenizador."""
+    return (len(text) + 3) // 4
+
+
+def fields_for(question_class: Optional[str]) -> Sequence[str]:
+    return _FIELDS_BY_CLASS.get(question_class or "", _ALL_FIELDS)
+
+
+def project_rows(rows: List[Dict[str, Any]], question_class: Optional[str]) -> List[Dict[str, Any]]:
+    """Deja en cada fila solo los campos que necesita el tipo de pregunta."""
+    fields = fields_for(question_class)
+    return [{field: row.get(field) for field in fields} for row in rows]
+
+
+def _cell(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).replace("|", "/").replace("\n", " ")
+
+
+def _encode(rows: List[Dict[str, Any]], columns: List[str]) -> str:
+    lines = ["|".join(columns)]
+    lines.extend("|".join(_cell(row.get(col)) for col in columns) for row in rows)
+    return "\n".join(lines)
+
+
+def build_debt_table(
+    rows: List[Dict[str, Any]],
+    question_class: Optional[str],
+    token_budget: int
+) -> str:
+    """
+    Codifica las filas de deuda como tabla compacta separada por '|'
+    (una cabecera y una línea por registro) respetando el presupuesto de tokens.
+
+    Primero se descartan columnas vacías, luego filas del final y, si aún no
+    cabe, las columnas de menor prioridad.
+    """
+    projected = project_rows(rows, question_class)
+    columns = [
+        col for col in fields_for(question_class)
+        if any(row.get(col) not in (None, "") for row in projected)
+    ]
+
+    table = _encode(projected, columns)
+    while estimate_tokens(table) > token_budget and len(projected) > 1:
+        projected = projected[:-1]
+        table = _encode(projected, columns)
+    while estimate_tokens(table) > token_budget and len(columns) > 1:
+        columns = columns[:-1]
+        table = _encode(projected, columns)
+
+    if len(projected) < len(rows):
+        logger.debug(f"Debt table trimmed to {len(projected)}/{len(rows)} rows for token budget")
+    return table
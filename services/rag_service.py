@@ -1,11 +1,110 @@
 # Servicio para iniciar el flujo RAG, envía un esquema de payload a OpenAI para generar la respuesta al usuario
+import hashlib
 import json
-from typing import Optional, Dict, Any
-from clients.openai_client import openai_client
+import logging
+from typing import Optional, Dict, Any, List
+from clients.openai_client import async_openai_client, chat_completion
+from config.settings import settings
+from models.search_result import SearchResult
+from services.answer_templates import classify_debt_question, render_debt_answer
+from services.prompt_builder import build_debt_table, estimate_tokens, project_rows
+from utils import deadline, metrics
+from utils.cache import TieredCache
+from utils.circuit_breaker import CircuitOpenError
+from utils.parsing import normalize_message
 
-def build_personalized_answer(
+logger = logging.getLogger(__name__)
+
+# Marcador que el LLM usa en lugar del nombre; se sustituye al entregar la respuesta
+# para que el mismo cuerpo cacheado sirva aunque cambie el nombre preferido.
+NAME_PLACEHOLDER = "{{nombre}}"
+
+DEBT_ANSWER_SYSTEM_PROMPT = (
+    "Eres un asistente financiero amable. Usa SOLO los datos proporcionados para responder.\n"
+    "Si la pregunta es sobre monto total de deuda, responde con el monto y un mensaje claro.\n"
+    "Si es sobre fecha de vencimiento, responde con la fecha y un mensaje claro.\n"
+    f"Si te diriges al cliente por su nombre, escribe exactamente {NAME_PLACEHOLDER}.\n"
+    "No inventes datos."
+)
+
+# Cambia si cambia la configuración o el prompt: las respuestas previas dejan de usarse.
+ANSWER_PROMPT_VERSION = "{}-{}".format(
+    settings.ANSWER_PROMPT_VERSION,
+    hashlib.sha1(DEBT_ANSWER_SYSTEM_PROMPT.encode("utf-8")).hexdigest()[:8]
+)
+
+_answer_cache = TieredCache(
+    "answer",
+    max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+    ttl=settings.ANSWER_CACHE_TTL
+)
+
+def _debt_fingerprint(payload: List[Dict[str, Any]], question_class: Optional[str]) -> str:
+    """
+    Hash de los campos de deuda que usa el tipo de pregunta: cambia si Azure
+    cambia esos datos, pero no por cambios en campos que la respuesta no usa.
+    """
+    rows = project_rows(payload, question_class)
+    serialized = json.dumps(rows, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(serialized.encode("utf-8")).hexdigest()[:16]
+
+def _answer_cache_key(dni: str, payload: List[Dict[str, Any]], user_msg: str, question_class: Optional[str]) -> str:
+    """
+    Clave: versión del prompt + DNI (hasheado) + huella de los datos + clase de pregunta.
+    Las preguntas abiertas usan como clase el hash de su texto normalizado.
+    """
+    fingerprint = _debt_fingerprint(payload, question_class)
+    if not question_class:
+        question_class = "free-" + hashlib.sha1(normalize_message(user_msg).encode("utf-8")).hexdigest()[:12]
+    dni_hash = hashlib.sha1(dni.encode("utf-8")).hexdigest()[:16]
+    return f"{ANSWER_PROMPT_VERSION}:{dni_hash}:{fingerprint}:{question_class}"
+
+def _record_usage(kind: str, resp, prompt: str) -> None:
+    """Registra los tokens reales de la llamada (y la estimación local del prompt)."""
+    usage = getattr(resp, "usage", None)
+    if not usage:
+        return
+    metrics.increment(f"openai.{kind}.prompt_tokens", usage.prompt_tokens)
+    metrics.increment(f"openai.{kind}.completion_tokens", usage.completion_tokens)
+    logger.info(
+        f"OpenAI {kind} usage: prompt_tokens={usage.prompt_tokens} "
+        f"completion_tokens={usage.completion_tokens} (estimated data tokens={estimate_tokens(prompt)})"
+    )
+
+def _debt_summary(record: Dict[str, Any]) -> List[str]:
+    total = record.get("TotalDeuda") or record.get("TotalDebt")
+    due_date = record.get("Vencimiento") or record.get("actual_agreement_due_date")
+    status = record.get("Estado") or record.get("Status") or "desconocido"
+    pieces = [f"estado {status}"]
+    if due_date:
+        pieces.append(f"vence el {due_date}")
+    if total:
+        pieces.append(f"total S/ {total}")
+    return pieces
+
+def _data_only_answer(payload: List[Dict[str, Any]], display_name: str) -> str:
+    """
+    Respuesta armada solo con los datos cuando no se puede usar el LLM.
+    Con varias deudas se lista cada una y se suma el total.
+    """
+    if len(payload) == 1:
+        return f"{display_name}: " + ", ".join(_debt_summary(payload[0])) + "."
+
+    total = 0.0
+    for record in payload:
+        try:
+            total += float(record.get("TotalDeuda") or record.get("TotalDebt") or 0)
+        except (TypeError, ValueError):
+            pass
+    items = "; ".join(", ".join(_debt_summary(record)) for record in payload)
+    return f"{display_name}: tienes {len(payload)} deudas por un total de S/ {total:,.2f} ({items})."
+
+def _render_answer(body: str, display_name: str) -> str:
+    return body.replace(NAME_PLACEHOLDER, display_name)
+
+async def build_personalized_answer(
     user_msg: str,
-    df,
+    result: SearchResult,
     session: Dict[str, Any],  # Cambiar de user_name a session completa
     reason: str | None = None,
     intent: str = "debt",
@@ -17,7 +116,7 @@ def build_personalized_answer(
     Args:
         session: Sesión completa (contiene name y preferred_name)
     """
-    if df.empty:
+    if result.empty:
         display_name = session.get("preferred_name") or session.get("name") or "Cliente"
         if intent == "otp":
             return f"{display_name}, no encontré una clave OTP activa. ¿Podemos revisar el número?"
@@ -25,7 +124,7 @@ def build_personalized_answer(
     
     # Para OTP: usar nombre preferido
     if intent == "otp":
-        record = df.iloc[0]
+        record = result.first()
         code = record.get("Codigo")
         if not code:
             return "No pude recuperar la clave OTP en este momento."
@@ -38,51 +137,133 @@ def build_personalized_answer(
     
     # Para DEBT: usar nombre original (del perfil) para búsqueda en AI Search
     # pero nombre preferido para saludo
-    payload = df.to_dict(orient="records")
+    payload = result.to_records()
     record = payload[0]
     
-    search_name = session.get("name") or record.get("Firstname") or "Cliente"  # Para prompt de OpenAI
+    search_name = session.get("name") or record.get("Nombre") or record.get("Firstname") or "Cliente"  # Para prompt de OpenAI
     display_name = session.get("preferred_name") or search_name  # Para saludo
 
-    if not openai_client:
-        total = record.get("TotalDeuda") or record.get("TotalDebt")
-        due_date = record.get("Vencimiento") or record.get("actual_agreement_due_date")
-        status = record.get("Estado") or record.get("Status")
-        if reason in {"total_debt", "heuristic_debt"} and total is not None:
-            return f"{display_name}: tu deuda total es S/ {total}."
-        if reason in {"due_date", "heuristic_due_date"} and due_date:
-            return f"{display_name}: tu deuda vence el {due_date}."
-        return f"{display_name}: estado {status or 'desconocido'}, total pendiente S/ {total or '--'}."
+    # Preguntas estándar (total, vencimiento, desglose, estado): plantilla sin LLM.
+    # Las plantillas describen una sola deuda; con varias filas responde el LLM con la tabla completa.
+    with metrics.timer("answer.template_ms"):
+        question_class = classify_debt_question(user_msg, reason)
+        templated = (
+            render_debt_answer(question_class, record, display_name)
+            if question_class and len(payload) == 1 else None
+        )
+    if templated:
+        metrics.increment(f"answer.template.{question_class}")
+        return templated
+
+    if not async_openai_client:
+        metrics.increment("answer.fallback")
+        return _data_only_answer(payload, display_name)
+
+    # Respuesta ya generada para los mismos datos y el mismo tipo de pregunta
+    dni = session.get("dni")
+    cache_key = _answer_cache_key(dni, payload, user_msg, question_class) if dni else None
+    if cache_key and (cached := _answer_cache.get(cache_key)) is not None:
+        metrics.increment("answer_cache.hit")
+        return _render_answer(cached, display_name)
+    if cache_key:
+        metrics.increment("answer_cache.miss")
+
+    if not deadline.can_call_llm():
+        metrics.increment("deadline.degraded.answer")
+        metrics.increment("answer.fallback")
+        return _data_only_answer(payload, display_name)
+
+    # Solo los campos que necesita la pregunta, en tabla compacta y dentro del presupuesto.
+    # El nombre no viaja en los datos: el LLM usa el marcador y se sustituye al final.
+    table = build_debt_table(payload, question_class, settings.DEBT_PROMPT_TOKEN_BUDGET)
+    user = (
+        f"Pregunta: {user_msg}\n"
+        f"Datos:\n{table}\n"
+        f"Tipo de consulta: {reason}"
+    )
+
+    try:
+        with metrics.timer("answer.llm_ms"):
+            resp = await chat_completion(
+                settings.OPENAI_ANSWER_TIMEOUT,
+                model="gpt-4o-mini",
+                temperature=0.1,
+                max_tokens=settings.DEBT_ANSWER_MAX_TOKENS,
+                messages=[
+                    {"role": "system", "content": DEBT_ANSWER_SYSTEM_PROMPT},
+                    {"role": "user", "content": user}
+                ]
+            )
+        metrics.increment("answer.llm")
+        _record_usage("answer", resp, table)
+        body = resp.choices[0].message.content.strip()
+        if cache_key:
+            _answer_cache.set(cache_key, body)
+        return _render_answer(body, display_name)
+    except Exception:
+        metrics.increment("answer.fallback")
+        return _data_only_answer(payload, display_name)
+
+
+async def route_and_answer_debt(
+    user_msg: str,
+    result: SearchResult,
+    session: Dict[str, Any]
+) -> Optional[Dict[str, Any]]:
+    """
+    Enruta y responde en una sola llamada cuando ya tenemos los datos de deuda.
+    
+    Devuelve los mismos campos que route_message más "answer" (la respuesta
+    final si la intención es deuda). Si la intención resulta ser otra, el
+    llamador reutiliza la ruta y continúa con el flujo normal.
+    
+    Returns:
+        Diccionario con la ruta y la respuesta, o None si no se pudo obtener
+    """
+    if not async_openai_client or result.empty or not deadline.can_call_llm():
+        return None
+
+    table = build_debt_table(
+        result.to_records(),
+        classify_debt_question(user_msg),
+        settings.DEBT_PROMPT_TOKEN_BUDGET
+    )
 
     system_msg = (
-        "Eres un asistente financiero amable. Usa SOLO los datos proporcionados para responder.\n"
-        "Si la pregunta es sobre monto total de deuda, responde con el monto y un mensaje claro.\n"
-        "Si es sobre fecha de vencimiento, responde con la fecha y un mensaje claro.\n"
-        "No inventes datos."
+        "Eres un asistente financiero amable. Responde SOLO en JSON con los campos: "
+        "{intent, requires_identity, reason, concise_answer, followup_question, answer}.\n"
+        "intent puede ser: 'debt', 'otp', 'general'.\n"
+        "Si intent es 'debt', 'answer' debe responder la pregunta usando SOLO los datos de deuda "
+        "proporcionados: monto total y mensaje claro si pregunta por el total, fecha si pregunta "
+        "por el vencimiento. No inventes datos.\n"
+        "Si intent no es 'debt', deja 'answer' vacío y no menciones los datos de deuda."
     )
     user = (
         f"Pregunta: {user_msg}\n"
-        f"Datos: {json.dumps(payload, ensure_ascii=False)}\n"
-        f"Tipo de consulta: {reason}"
+        f"Datos de deuda:\n{table}"
     )
 
     try:
-        resp = openai_client.chat.completions.create(
+        resp = await chat_completion(
+            settings.OPENAI_ANSWER_TIMEOUT,
             model="gpt-4o-mini",
             temperature=0.1,
+            response_format={"type": "json_object"},
             messages=[
                 {"role": "system", "content": system_msg},
                 {"role": "user", "content": user}
             ]
         )
-        return resp.choices[0].message.content.strip()
-    except Exception:
-        total = record.get("TotalDeuda") or record.get("TotalDebt")
-        due_date = record.get("Vencimiento") or record.get("actual_agreement_due_date")
-        status = record.get("Estado") or record.get("Status") or "desconocido"
-        pieces = [f"{display_name}: estado {status}"]
-        if due_date:
-            pieces.append(f"vence el {due_date}")
-        if total:
-            pieces.append(f"total S/ {total}")
-        return ", ".join(pieces) + "."
+        data = json.loads(resp.choices[0].message.content)
+        _record_usage("combined", resp, table)
+    except CircuitOpenError:
+        return None
+    except Exception as e:
+        logger.warning(f"Combined route-and-answer call failed: {e}")
+        return None
+
+    if "intent" not in data:
+        return None
+    data.setdefault("requires_identity", data["intent"] in {"debt", "otp"})
+    data["answer"] = (data.get("answer") or "").strip()
+    return data
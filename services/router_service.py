@@ -1,8 +1,18 @@
+import asyncio
+import hashlib
 import json
 import logging
-from typing import Dict, Any
-from clients.openai_client import openai_client
+from typing import Dict, Any, List, Optional, Sequence
+from clients.openai_client import async_openai_client, chat_completion
+from clients.queue_client import get_redis_client
+from config.settings import settings
 from models.user_profile import UserProfile
+from services.intent_classifier import load_intent_classifier
+from utils import deadline, metrics
+from utils.cache import TieredCache
+from utils.circuit_breaker import CircuitOpenError
+from utils.parsing import normalize_message
+from utils.regex_utils import DNI_RE, PHONE_RE
 
 logger = logging.getLogger(__name__)
 
@@ -10,56 +20,184 @@ logger = logging.getLogger(__name__)
 OTP_KEYWORDS = ("clave", "otp", "código", "codigo", "no me llegó", "no me llego")
 DEBT_KEYWORDS = ("deuda", "saldo", "prestamo", "préstamo", "cuánto debo", "cuanto debo")
 DUE_DATE_KEYWORDS = ("vence", "fecha de vencimiento", "cuando vence", "cuándo vence")
+# Indicios de pregunta de deuda para decidir si vale la pena consultar Azure antes de enrutar
+DEBT_HINTS = DEBT_KEYWORDS + DUE_DATE_KEYWORDS + ("debo", "pagar", "pago", "cuota", "monto", "vencimiento", "atrasad")
 
-def route_message(user_msg: str) -> dict:
+ROUTER_MODEL = "gpt-4o-mini"
+ROUTER_SYSTEM_PROMPT = (
+    "Eres un asistente financiero. Responde SOLO en JSON con los campos: "
+    "{intent, requires_identity, reason, concise_answer, followup_question}.\n"
+    "intent puede ser: 'debt', 'otp', 'general'."
+)
+
+# La versión combina la configurada con un hash del prompt y el modelo:
+# cualquier cambio en ellos genera claves nuevas y deja obsoleta la caché anterior.
+ROUTER_PROMPT_VERSION = "{}-{}".format(
+    settings.ROUTER_PROMPT_VERSION,
+    hashlib.sha1(f"{ROUTER_MODEL}|{ROUTER_SYSTEM_PROMPT}".encode("utf-8")).hexdigest()[:8]
+)
+
+_route_cache = TieredCache(
+    "route",
+    max_entries=settings.ROUTE_CACHE_MAX_ENTRIES,
+    ttl=settings.ROUTE_CACHE_TTL
+)
+
+def _route_cache_key(user_msg: str) -> str:
+    """Clave de caché: versión del prompt + hash del texto normalizado."""
+    digest = hashlib.sha1(normalize_message(user_msg).encode("utf-8")).hexdigest()
+    return f"{ROUTER_PROMPT_VERSION}:{digest}"
+
+def _is_cacheable(route: dict) -> bool:
+    """
+    Evita compartir rutas cuyo texto incluya un DNI o teléfono: la clave
+    enmascara los dígitos, así que otra persona podría recibir datos ajenos.
+    """
+    for field in ("concise_answer", "followup_question"):
+        text = str(route.get(field) or "")
+        if DNI_RE.search(text) or PHONE_RE.search(text):
+            return False
+    return True
+
+# Modelo local opcional; se carga una vez al importar el módulo.
+_intent_classifier = load_intent_classifier(settings.INTENT_MODEL_PATH)
+
+def get_cached_route(user_msg: str) -> Optional[dict]:
+    """Devuelve la ruta cacheada para el mensaje o None."""
+    if not settings.ROUTE_CACHE_ENABLED:
+        return None
+    route = _route_cache.get(_route_cache_key(user_msg))
+    metrics.increment("route_cache.hit" if route is not None else "route_cache.miss")
+    return dict(route) if route is not None else None
+
+def cache_route(user_msg: str, route: dict) -> None:
+    """Guarda una ruta producida por el LLM si es segura de compartir."""
+    if settings.ROUTE_CACHE_ENABLED and _is_cacheable(route):
+        _route_cache.set(_route_cache_key(user_msg), route)
+
+def classify_locally(user_msg: str) -> Optional[dict]:
     """
-    Enruta mensaje usando OpenAI o fallback heurístico.
+    Ruta a partir del clasificador local si supera el umbral de confianza.
     
-    Args:
-        user_msg: Mensaje del usuario
-        
-    Returns:
-        Diccionario con intent, requires_identity, reason, etc.
+    Solo se aceptan intenciones que requieren identidad (debt/otp): para
+    'general' el usuario recibe la concise_answer, que solo genera el LLM.
     """
-    if not openai_client:
-        # Fallback heurístico básico
-        low = user_msg.lower()
-        needs_id = any(x in low for x in ["deuda", "saldo", "prestamo", "préstamo"])
-        return {
-            "intent": "debt" if needs_id else "general",
-            "requires_identity": needs_id,
-            "concise_answer": "" if needs_id else "¿En qué puedo ayudarte?",
-            "followup_question": "¿Me compartes tu DNI, teléfono o email?" if needs_id else "",
-            "reason": "heuristic"
-        }
+    if _intent_classifier is None:
+        return None
+    
+    intent, confidence = _intent_classifier.predict([user_msg])[0]
+    if intent not in {"debt", "otp"} or confidence < settings.INTENT_MODEL_THRESHOLD:
+        metrics.increment("route.local.miss")
+        return None
+    
+    metrics.increment("route.local.hit")
+    return _local_route(intent)
+
+def looks_like_debt_question(user_msg: str) -> bool:
+    """
+    Indica si el mensaje parece una consulta de deuda (palabras clave o
+    probabilidad de deuda del modelo local). Se usa para no consultar Azure
+    ni enviar los datos de deuda al LLM en saludos u otras intenciones.
+    """
+    low = user_msg.lower()
+    if any(hint in low for hint in DEBT_HINTS):
+        return True
+    if _intent_classifier is None or "debt" not in _intent_classifier.labels:
+        return False
+    probs = _intent_classifier.predict_proba([user_msg])[0]
+    return float(probs[_intent_classifier.labels.index("debt")]) >= settings.COMBINED_DEBT_MIN_SCORE
+
+def _local_route(intent: str) -> dict:
+    """Construye la ruta con los mismos campos que devuelve el LLM."""
+    missing = ["phone"] if intent == "otp" else ["dni"]
+    return {
+        "intent": intent,
+        "requires_identity": True,
+        "reason": f"local_{intent}",
+        "concise_answer": "",
+        "followup_question": _generate_followup(intent, missing)
+    }
+
+def resolve_route_without_llm(user_msg: str) -> Optional[dict]:
+    """Intenta resolver la ruta con la caché y luego con el modelo local."""
+    if (cached := get_cached_route(user_msg)) is not None:
+        return cached
+    return classify_locally(user_msg)
+
+async def resolve_route_without_llm_async(user_msg: str) -> Optional[dict]:
+    """resolve_route_without_llm fuera del event loop (la caché consulta Redis síncrono)."""
+    return await asyncio.to_thread(resolve_route_without_llm, user_msg)
+
+def record_routed_sample(user_msg: str, intent: str) -> None:
+    """
+    Guarda el par (mensaje normalizado, intent) que etiquetó el LLM para
+    reentrenar el clasificador local. El texto va enmascarado (sin DNI/teléfono).
+    """
+    if not settings.ROUTER_COLLECT_SAMPLES:
+        return
+    try:
+        sample = json.dumps({"text": normalize_message(user_msg), "intent": intent}, ensure_ascii=False)
+        client = get_redis_client()
+        pipe = client.pipeline()
+        pipe.lpush(settings.ROUTER_SAMPLES_KEY, sample)
+        pipe.ltrim(settings.ROUTER_SAMPLES_KEY, 0, settings.ROUTER_SAMPLES_MAX - 1)
+        pipe.execute()
+    except Exception as e:
+        logger.debug(f"Could not record routed sample: {e}")
+
+def _heuristic_route(user_msg: str) -> dict:
+    """Fallback heurístico básico cuando no hay cliente de OpenAI."""
+    low = user_msg.lower()
+    needs_id = any(x in low for x in ["deuda", "saldo", "prestamo", "préstamo"])
+    return {
+        "intent": "debt" if needs_id else "general",
+        "requires_identity": needs_id,
+        "concise_answer": "" if needs_id else "¿En qué puedo ayudarte?",
+        "followup_question": "¿Me compartes tu DNI, teléfono o email?" if needs_id else "",
+        "reason": "heuristic"
+    }
 
-    system_msg = (
-        "Eres un asistente financiero. Responde SOLO en JSON con los campos: "
-        "{intent, requires_identity, reason, concise_answer, followup_question}.\n"
-        "intent puede ser: 'debt', 'otp', 'general'."
+async def _classify_with_llm(user_msg: str) -> dict:
+    """
+    Clasifica el mensaje con OpenAI sin efectos secundarios (ni caché ni
+    muestras de entrenamiento). Propaga los errores.
+    """
+    resp = await chat_completion(
+        settings.OPENAI_ROUTER_TIMEOUT,
+        model=ROUTER_MODEL,
+        temperature=0.2,
+        response_format={"type": "json_object"},
+        messages=[
+            {"role": "system", "content": ROUTER_SYSTEM_PROMPT},
+            {"role": "user", "content": user_msg}
+        ]
     )
 
+    data = json.loads(resp.choices[0].message.content)
+    
+    # Validar que tenga campos requeridos
+    if "intent" not in data:
+        data["intent"] = "general"
+    if "requires_identity" not in data:
+        data["requires_identity"] = False
+    return data
+
+def _remember_route(user_msg: str, data: dict) -> None:
+    cache_route(user_msg, data)
+    record_routed_sample(user_msg, data["intent"])
+
+async def _route_with_llm(user_msg: str) -> dict:
+    """Clasifica el mensaje con OpenAI y guarda el resultado en caché."""
     try:
-        resp = openai_client.chat.completions.create(
-            model="gpt-4o-mini",
-            temperature=0.2,
-            response_format={"type": "json_object"},
-            messages=[
-                {"role": "system", "content": system_msg},
-                {"role": "user", "content": user_msg}
-            ]
-        )
-
-        data = json.loads(resp.choices[0].message.content)
-        
-        # Validar que tenga campos requeridos
-        if "intent" not in data:
-            data["intent"] = "general"
-        if "requires_identity" not in data:
-            data["requires_identity"] = False
-        
+        data = await _classify_with_llm(user_msg)
+        # Escrituras en Redis síncrono: en un hilo para no bloquear el event loop
+        await asyncio.to_thread(_remember_route, user_msg, data)
         return data
     
+    except CircuitOpenError:
+        # OpenAI caído: heurística inmediata en lugar de esperar el timeout
+        return _heuristic_route(user_msg)
+    
     except Exception as e:
         logger.exception(f"Error parsing JSON from OpenAI: {e}")
         return {
@@ -70,6 +208,132 @@ def route_message(user_msg: str) -> dict:
             "reason": "fallback_error"
         }
 
+async def route_message(user_msg: str, resolve: bool = True) -> dict:
+    """
+    Enruta mensaje usando la caché de rutas, el clasificador local,
+    OpenAI o fallback heurístico.
+    
+    Args:
+        user_msg: Mensaje del usuario
+        resolve: Consultar caché y clasificador local (False si el llamador
+            ya lo hizo, para no repetir la lectura ni contar dos veces el miss)
+        
+    Returns:
+        Diccionario con intent, requires_identity, reason, etc.
+    """
+    if not async_openai_client:
+        return _heuristic_route(user_msg)
+
+    if resolve and (resolved := await resolve_route_without_llm_async(user_msg)) is not None:
+        logger.debug(f"Route resolved without LLM: {resolved.get('intent')} ({resolved.get('reason')})")
+        return resolved
+
+    if not deadline.can_call_llm():
+        # Sin tiempo para OpenAI en este turno: heurística inmediata
+        metrics.increment("deadline.degraded.route")
+        return _heuristic_route(user_msg)
+
+    return await _route_with_llm(user_msg)
+
+# Reglas por palabras clave (normalizadas igual que los mensajes) para el modo en lote.
+_RULE_KEYWORDS = {
+    "otp": tuple({normalize_message(k) for k in OTP_KEYWORDS}),
+    "debt": tuple({normalize_message(k) for k in DEBT_KEYWORDS + DUE_DATE_KEYWORDS}),
+}
+
+def _rule_based_route(normalized_msg: str) -> Optional[dict]:
+    """Resuelve por palabras clave solo si coincide exactamente una intención."""
+    padded = f" {normalized_msg} "
+    matches = [
+        intent for intent, keywords in _RULE_KEYWORDS.items()
+        if any(f" {kw} " in padded for kw in keywords)
+    ]
+    if len(matches) != 1:
+        return None
+    route = _local_route(matches[0])
+    route["reason"] = f"rule_{matches[0]}"
+    return route
+
+async def route_messages_batch(
+    messages: Sequence[str],
+    *,
+    concurrency: int = 8,
+    use_cache: bool = True,
+    use_llm: bool = True,
+    known: Optional[Dict[str, dict]] = None
+) -> List[dict]:
+    """
+    Clasifica un lote de mensajes para replays y evaluación offline.
+    
+    Deduplica por texto normalizado y resuelve por etapas: caché, reglas,
+    clasificador local (inferencia vectorizada) y, para lo que queda, el LLM
+    con concurrencia acotada. Cada resultado incluye "source" con la etapa
+    que lo resolvió.
+    
+    Args:
+        messages: Mensajes a clasificar
+        concurrency: Llamadas simultáneas máximas al LLM
+        use_cache: Consultar y alimentar la caché de rutas y las muestras de
+            entrenamiento (desactivar para evaluar prompts: sin efectos)
+        use_llm: Si es False, lo no resuelto queda con intent None
+        known: Resultados previos por texto normalizado (se reutilizan y se
+            actualizan, para deduplicar entre lotes sucesivos)
+        
+    Returns:
+        Una ruta por mensaje, en el mismo orden. Si la llamada al LLM falla
+        la ruta queda sin intent y con source "error".
+    """
+    known = known if known is not None else {}
+    normalized = [normalize_message(m) for m in messages]
+
+    # Primer mensaje original por texto normalizado que aún no conocemos
+    pending: Dict[str, str] = {}
+    for norm, original in zip(normalized, messages):
+        if norm not in known:
+            pending.setdefault(norm, original)
+
+    unresolved = []
+    for norm, original in pending.items():
+        if use_cache and (cached := get_cached_route(original)) is not None:
+            known[norm] = {**cached, "source": "cache"}
+        elif (rule := _rule_based_route(norm)) is not None:
+            known[norm] = {**rule, "source": "rules"}
+        else:
+            unresolved.append(norm)
+
+    if unresolved and _intent_classifier is not None:
+        predictions = _intent_classifier.predict([pending[n] for n in unresolved])
+        remaining = []
+        for norm, (intent, confidence) in zip(unresolved, predictions):
+            if intent in {"debt", "otp"} and confidence >= settings.INTENT_MODEL_THRESHOLD:
+                known[norm] = {**_local_route(intent), "source": "local", "confidence": confidence}
+            else:
+                remaining.append(norm)
+        unresolved = remaining
+
+    if unresolved and use_llm and async_openai_client:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def _classify(norm: str) -> None:
+            async with semaphore:
+                try:
+                    data = await _classify_with_llm(pending[norm])
+                except Exception as e:
+                    logger.warning(f"Batch LLM routing failed: {e}")
+                    known[norm] = {"intent": None, "requires_identity": None, "reason": "llm_error", "source": "error"}
+                    return
+            if use_cache:
+                cache_route(pending[norm], data)
+                record_routed_sample(pending[norm], data["intent"])
+            known[norm] = {**data, "source": "llm"}
+
+        await asyncio.gather(*(_classify(norm) for norm in unresolved))
+    else:
+        for norm in unresolved:
+            known[norm] = {"intent": None, "requires_identity": None, "reason": "unresolved", "source": "none"}
+
+    return [known[norm] for norm in normalized]
+
 def route_message_with_profile(
     user_msg: str, 
     profile: UserProfile,
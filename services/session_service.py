@@ -96,34 +96,27 @@ def clear_session(contact_id: str) -> bool:
         logger.error(f"Error clearing session for {contact_id}: {e}")
         return False
 
-def set_pending_intent(contact_id: str, intent: str, reason: Optional[str], user_msg: str) -> None:
+def mark_pending_intent(session: Dict[str, Any], intent: str, reason: Optional[str], user_msg: str) -> None:
     """
-    Marca una intención como pendiente mientras esperamos más datos del usuario.
+    Marca la intención pendiente en la sesión en memoria (se persiste con save_session).
     
     Args:
-        contact_id: ID del contacto
+        session: Sesión del usuario
         intent: Intención pendiente (debt/otp)
         reason: Razón de la intención
         user_msg: Mensaje original del usuario
     """
-    updates = {
-        "pending_intent": intent,
-        "pending_reason": reason,
-        "pending_user_msg": user_msg
-    }
-    update_session(contact_id, updates)
-    logger.info(f"Pending intent set for {contact_id}: {intent}")
+    session["pending_intent"] = intent
+    session["pending_reason"] = reason
+    session["pending_user_msg"] = user_msg
 
-def clear_pending_intent(contact_id: str) -> None:
+def drop_pending_intent(session: Dict[str, Any]) -> None:
     """
-    Limpia la intención pendiente de la sesión.
+    Quita la intención pendiente de la sesión en memoria (se persiste con save_session).
     
     Args:
-        contact_id: ID del contacto
+        session: Sesión del usuario
     """
-    session = get_session(contact_id)
     session.pop("pending_intent", None)
     session.pop("pending_reason", None)
     session.pop("pending_user_msg", None)
-    save_session(contact_id, session)
-    logger.debug(f"Pending intent cleared for {contact_id}")
\ No newline at end of file
@@ -0,0 +1,108 @@
+# Cachés reutilizables: LRU en memoria y un segundo nivel compartido en Redis
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from clients.queue_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """Caché LRU en memoria del proceso con expiración por entrada."""
+
+    def __init__(self, max_entries: int, ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple[Optional[float], Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Devuelve el valor vigente o None si no existe o expiró."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Guarda un valor; `ttl` sobrescribe la expiración por defecto."""
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class TieredCache:
+    """
+    Caché de dos niveles: LRU local para entradas calientes y Redis con TTL
+    para compartirlas entre workers de gunicorn y réplicas del worker.
+
+    Los valores deben ser serializables a JSON. Si Redis falla, la caché
+    sigue funcionando solo con el nivel local.
+    """
+
+    def __init__(self, namespace: str, max_entries: int, ttl: int):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.local = LRUCache(max_entries, ttl)
+
+    def _redis_key(self, key: str) -> str:
+        return f"cache:{self.namespace}:{key}"
+
+    def get(self, key: str) -> Optional[Any]:
+        """Busca primero en memoria y luego en Redis (rehidratando el nivel local)."""
+        value = self.local.get(key)
+        if value is not None:
+            return value
+
+        try:
+            raw = get_redis_client().get(self._redis_key(key))
+        except Exception as e:
+            logger.warning(f"Redis cache read failed for {self.namespace}: {e}")
+            return None
+
+        if raw is None:
+            return None
+
+        value = json.loads(raw)
+        self.local.set(key, value)
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        """Guarda el valor en ambos niveles."""
+        ttl = ttl or self.ttl
+        self.local.set(key, value, ttl)
+        try:
+            get_redis_client().setex(self._redis_key(key), ttl, json.dumps(value, ensure_ascii=False))
+        except Exception as e:
+            logger.warning(f"Redis cache write failed for {self.namespace}: {e}")
+
+    def delete(self, key: str) -> None:
+        self.local.delete(key)
+        try:
+            get_redis_client().delete(self._redis_key(key))
+        except Exception as e:
+            logger.warning(f"Redis cache delete failed for {self.namespace}: {e}")
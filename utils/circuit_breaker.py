@@ -0,0 +1,175 @@
+# Circuit breaker compartido para las dependencias externas (Azure Search, OpenAI, Respond.io)
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Optional, Tuple, Type
+
+from config.settings import settings
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """La dependencia está marcada como caída: se usa el fallback sin llamarla."""
+
+    def __init__(self, name: str):
+        super().__init__(f"Circuit '{name}' is open")
+        self.name = name
+
+
+class CircuitBreaker:
+    """
+    Corta las llamadas a una dependencia cuando su tasa de fallos supera el
+    umbral dentro de una ventana de tiempo.
+
+    - closed: las llamadas pasan y se registran en la ventana.
+    - open: se rechazan de inmediato durante `open_seconds`.
+    - half_open: pasan hasta `half_open_probes` llamadas de prueba; si
+      salen bien el circuito se cierra, si alguna falla se vuelve a abrir.
+
+    El estado se publica como gauge `circuit.<nombre>.state`.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = settings.CIRCUIT_FAILURE_RATE,
+        min_calls: int = settings.CIRCUIT_MIN_CALLS,
+        window_seconds: float = settings.CIRCUIT_WINDOW_SECONDS,
+        open_seconds: float = settings.CIRCUIT_OPEN_SECONDS,
+        half_open_probes: int = 1
+    ):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self._calls: Deque[Tuple[float, bool]] = deque()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self._lock = threading.Lock()
+        metrics.set_gauge(f"circuit.{name}.state", CLOSED)
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _set_state(self, state: str) -> None:
+        if state == self._state:
+            return
+        logger.warning(f"Circuit '{self.name}' {self._state} -> {state}")
+        self._state = state
+        metrics.set_gauge(f"circuit.{self.name}.state", state)
+        metrics.increment(f"circuit.{self.name}.{state}")
+
+    def _maybe_half_open(self) -> None:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._set_state(HALF_OPEN)
+            self._probes_in_flight = 0
+            self._probe_successes = 0
+
+    def _trim(self, now: float) -> None:
+        while self._calls and now - self._calls[0][0] > self.window_seconds:
+            self._calls.popleft()
+
+    def _trip(self) -> None:
+        self._opened_at = time.monotonic()
+        self._calls.clear()
+        self._set_state(OPEN)
+
+    def allow(self) -> bool:
+        """Indica si la llamada puede hacerse (reserva un turno de prueba en half_open)."""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._probes_in_flight < self.half_open_probes:
+                self._probes_in_flight += 1
+                return True
+        metrics.increment(f"circuit.{self.name}.rejected")
+        return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_probes:
+                    self._calls.clear()
+                    self._set_state(CLOSED)
+                return
+            now = time.monotonic()
+            self._calls.append((now, True))
+            self._trim(now)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                self._trip()
+                return
+            if self._state == OPEN:
+                return
+            now = time.monotonic()
+            self._calls.append((now, False))
+            self._trim(now)
+            if len(self._calls) >= self.min_calls:
+                failures = sum(1 for _, ok in self._calls if not ok)
+                if failures / len(self._calls) >= self.failure_rate:
+                    self._trip()
+
+    @contextmanager
+    def guard(
+        self,
+        failures: Tuple[Type[BaseException], ...] = (Exception,),
+        uncounted: Tuple[Type[BaseException], ...] = (),
+        is_failure: Optional[Callable[[BaseException], bool]] = None
+    ):
+        """
+        Envuelve una llamada: lanza CircuitOpenError si el circuito no la
+        permite y registra el resultado. Solo las excepciones de `failures`
+        cuentan como fallo de la dependencia; las demás se propagan sin contar.
+
+        Args:
+            failures: Excepciones que cuentan como fallo de la dependencia
+            uncounted: Excepciones que no cuentan aunque estén en `failures`
+                (p. ej. un timeout acotado por el presupuesto del turno)
+            is_failure: Filtro adicional sobre las excepciones de `failures`
+                (p. ej. solo los 5xx de un error HTTP genérico)
+        """
+        if not self.allow():
+            raise CircuitOpenError(self.name)
+        try:
+            yield
+        except uncounted:
+            self._release_probe()
+            raise
+        except failures as e:
+            if is_failure is None or is_failure(e):
+                self.record_failure()
+            else:
+                self._release_probe()
+            raise
+        except BaseException:
+            # Cancelaciones y errores que no son de la dependencia: no cuentan
+            self._release_probe()
+            raise
+        else:
+            self.record_success()
+
+    def _release_probe(self) -> None:
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
@@ -0,0 +1,59 @@
+# Presupuesto de tiempo por turno de conversación, compartido por todas las etapas
+import math
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from config.settings import settings
+from utils import metrics
+
+# Instante (time.monotonic) en que vence el turno actual; None fuera de un turno.
+_turn_deadline: ContextVar[Optional[float]] = ContextVar("turn_deadline", default=None)
+
+
+@contextmanager
+def turn_deadline(seconds: float = settings.TURN_DEADLINE_SECONDS):
+    """
+    Abre el presupuesto del turno. Las tareas creadas dentro heredan el
+    mismo deadline (contextvars). Registra la duración total en `turn_ms`.
+    """
+    token = _turn_deadline.set(time.monotonic() + seconds)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _turn_deadline.reset(token)
+        metrics.observe("turn_ms", (time.perf_counter() - start) * 1000)
+
+
+def remaining() -> Optional[float]:
+    """Segundos que quedan del turno, o None si no hay deadline."""
+    deadline = _turn_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def stage_timeout(default: float) -> float:
+    """
+    Timeout para una etapa previa al envío (enrutamiento, Azure, LLM): el
+    propio de la etapa acotado a lo que queda, guardando la reserva de envío.
+    """
+    left = remaining()
+    if left is None:
+        return default
+    return max(0.0, min(default, left - settings.TURN_SEND_RESERVE_SECONDS))
+
+
+def send_timeout(default: float) -> float:
+    """Timeout para enviar la respuesta: nunca menos que la reserva de envío."""
+    left = remaining()
+    if left is None:
+        return default
+    return min(default, max(left, settings.TURN_SEND_RESERVE_SECONDS))
+
+
+def can_call_llm() -> bool:
+    """False si ya no queda tiempo para una llamada al LLM (usar heurística o plantilla)."""
+    return stage_timeout(math.inf) >= settings.DEADLINE_MIN_LLM_SECONDS
@@ -0,0 +1,78 @@
+# Métricas en memoria del proceso (contadores, gauges y latencias)
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict
+
+# Muestras recientes que se guardan por métrica para calcular percentiles.
+_SAMPLE_SIZE = 1024
+
+_lock = threading.Lock()
+_counters: Dict[str, float] = defaultdict(float)
+_gauges: Dict[str, Any] = {}
+_timings: Dict[str, Dict[str, float]] = {}
+_samples: Dict[str, Deque[float]] = {}
+
+
+def increment(name: str, value: float = 1) -> None:
+    """Incrementa un contador."""
+    with _lock:
+        _counters[name] += value
+
+
+def set_gauge(name: str, value: Any) -> None:
+    """Fija el valor actual de un gauge (estado, tamaño, etc.)."""
+    with _lock:
+        _gauges[name] = value
+
+
+def observe(name: str, value_ms: float) -> None:
+    """Registra una latencia en milisegundos."""
+    with _lock:
+        stats = _timings.setdefault(name, {"count": 0, "sum_ms": 0.0, "max_ms": 0.0})
+        stats["count"] += 1
+        stats["sum_ms"] += value_ms
+        stats["max_ms"] = max(stats["max_ms"], value_ms)
+        _samples.setdefault(name, deque(maxlen=_SAMPLE_SIZE)).append(value_ms)
+
+
+@contextmanager
+def timer(name: str):
+    """Mide el bloque y lo registra con `observe`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, (time.perf_counter() - start) * 1000)
+
+
+def _percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def snapshot() -> Dict[str, Any]:
+    """
+    Devuelve una copia de las métricas actuales.
+
+    Las métricas son por proceso: con varios workers de gunicorn cada uno
+    reporta las suyas.
+    """
+    with _lock:
+        timings = {}
+        for name, stats in _timings.items():
+            samples = list(_samples.get(name, ()))
+            timings[name] = {
+                "count": stats["count"],
+                "avg_ms": round(stats["sum_ms"] / stats["count"], 2) if stats["count"] else 0.0,
+                "max_ms": round(stats["max_ms"], 2),
+                "p50_ms": round(_percentile(samples, 0.5), 2) if samples else 0.0,
+                "p99_ms": round(_percentile(samples, 0.99), 2) if samples else 0.0,
+            }
+        return {
+            "counters": dict(_counters),
+            "gauges": dict(_gauges),
+            "timings": timings,
+        }
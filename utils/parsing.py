@@ -1,6 +1,7 @@
 # Funciones puras auxiliares reutilizables
 from .regex_utils import EMAIL_RE, PHONE_RE, DNI_RE
 import re
+import unicodedata
 
 def parse_identifier(text: str):
     if m := EMAIL_RE.search(text):
@@ -16,3 +17,27 @@ def capture_name(text: str):
     m = re.search(r"\bsoy\s+([A-Za-zÀ-ÿ][A-Za-zÀ-ÿ\s]+)", text, re.IGNORECASE)
     if m:
         return m.group(1).strip().split()[0].title()
+
+
+# Teléfono con código de país opcional, delimitado para no cortar números más largos.
+_MASK_PHONE_RE = re.compile(r"\b(?:51 ?)?9\d{8}\b")
+_NON_WORD_RE = re.compile(r"[^\w]+")
+# Guion bajo fuera de las máscaras: "dni_mask" sobrevive a una segunda normalización.
+_UNDERSCORE_RE = re.compile(r"_(?!mask\b)")
+
+
+def normalize_message(text: str) -> str:
+    """
+    Normaliza un mensaje para usarlo como clave de caché.
+
+    Pasa a minúsculas, elimina tildes y signos de puntuación y enmascara
+    DNI y teléfonos para que "mi dni es 12345678" y "mi DNI es 87654321"
+    compartan la misma clave. Es idempotente: los textos guardados ya
+    normalizados (muestras del router) no cambian al normalizarse otra vez.
+    """
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    plain = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    plain = _UNDERSCORE_RE.sub(" ", _NON_WORD_RE.sub(" ", plain))
+    plain = _MASK_PHONE_RE.sub(" telefono_mask ", plain)
+    plain = DNI_RE.sub(" dni_mask ", plain)
+    return " ".join(plain.split())
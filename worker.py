@@ -1,21 +1,28 @@
 import asyncio
 import json
 import logging
+import signal
 from utils.logging import setup_logging
 from clients.queue_client import dequeue_event
 from handler.event_handler import handle_event
+from clients.azure_client import close_search_clients
+from clients.cosmos_client import async_cosmos_client
+from clients.respondio_client import respondio_client
+from services.message_processor import drain_background_tasks
+from services.profile_writer import profile_writer
 
 setup_logging()
 logger = logging.getLogger(__name__)
 
-async def worker_loop():
-    """Loop principal del worker que procesa eventos de la cola."""
+async def worker_loop(stop: asyncio.Event):
+    """Loop principal del worker que procesa eventos de la cola hasta que se pide detenerlo."""
     logger.info("Worker started, waiting for events...")
     
-    while True:
+    while not stop.is_set():
         try:
-            # Desencolar evento (blocking con timeout)
-            event_data = dequeue_event(timeout=5)
+            # Desencolar evento (BLPOP con timeout) en un hilo: el event loop sigue
+            # atendiendo las tareas de fondo (vaciado de perfiles) mientras la cola está vacía
+            event_data = await asyncio.to_thread(dequeue_event, 5)
             
             if event_data:
                 logger.info("="*60)
@@ -34,5 +41,32 @@ async def worker_loop():
             logger.exception(f"Error processing event: {e}")
             await asyncio.sleep(1)  # Evitar loops intensos en caso de error
 
+def _request_stop(stop: asyncio.Event, sig: signal.Signals) -> None:
+    logger.info(f"Received {sig.name}, finishing current event and shutting down")
+    stop.set()
+
+async def main():
+    # SIGTERM (parada del contenedor) y SIGINT terminan el evento en curso y
+    # pasan por el mismo apagado ordenado que vacía el buffer de perfiles
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, _request_stop, stop, sig)
+        except NotImplementedError:
+            # Windows: sin manejadores de señales en el event loop
+            pass
+    
+    profile_writer.start()
+    respondio_client.start()
+    try:
+        await worker_loop(stop)
+    finally:
+        await drain_background_tasks()
+        await profile_writer.drain()
+        await respondio_client.close()
+        await close_search_clients()
+        await async_cosmos_client.close()
+
 if __name__ == "__main__":
-    asyncio.run(worker_loop())
\ No newline at end of file
+    asyncio.run(main())
\ No newline at end of file